@@ -0,0 +1,173 @@
+#!/usr/bin/python
+"""This script reports which batches of a batch manifest have run to
+completion, failed, or are stale because their input files changed since the
+job ran, and writes a submit script that submits only the jobs that need to
+run again"""
+from __future__ import print_function
+import os
+import sys
+import argparse
+from orsslib import batch_manifest as bm
+from orsslib import batch_status as bst
+from orsslib import submit_planning as sp
+from orsslib import batch_output as bo
+
+
+def main():
+    """Entry point for the script"""
+    opts = read_cmdline()
+    manifest_path = bm.get_manifest_path(opts.outdir, opts.batch_name)
+    if not os.path.isfile(manifest_path):
+        print("Could not find the manifest", manifest_path)
+        sys.exit()
+    manifest = bm.read_manifest(manifest_path)
+    statuses = bst.get_statuses(manifest, opts.walltime, opts.workers)
+    dirs = ([batch["dir"] for batch in manifest["batches"]] +
+            [merge["dir"] for merge in manifest["merges"]])
+    print_statuses(dirs, statuses, opts.verbose)
+    states = [bst.FAILED, bst.STALE]
+    if opts.unfinished:
+        states.extend([bst.UNFINISHED, bst.NOT_RUN])
+    only = bst.get_resubmit_dirs(statuses, states)
+    if not opts.resubmit:
+        if len(only) > 0:
+            print("Run again with --resubmit to write a script that submits",
+                  "the", " and ".join(states), "batches again")
+        return
+    if len(only) == 0:
+        print("No batch needs to be submitted again")
+        return
+    jobs = sp.plan_submission(
+        [batch["dir"] for batch in manifest["batches"]],
+        [batch["bytes"] for batch in manifest["batches"]],
+        [(merge["dir"], merge["chunks"]) for merge in manifest["merges"]],
+        opts.submit_order, get_build_dir(opts.outdir, opts.batch_name), only)
+    with open(opts.script, 'w') as out_file:
+        out_file.write("#!/usr/bin/bash\n")
+        out_file.write(sp.get_submit_lines(jobs))
+    os.chmod(opts.script, bo.OUTPUT_MODE)
+    print("Generated", opts.script)
+    print("  It submits the", len(jobs), "jobs that need to run again")
+
+
+def get_build_dir(outdir, batch_name):
+    """Gives the shared build directory of a batch if its build has to run
+    before the batches submitted again
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+    batch_name : str
+        Name of the overall batch (the name of the input directory)
+
+    Returns
+    -------
+    build_dir : str
+        The build directory, None if the batches build their own reader or
+        the shared reader is already built
+    """
+    build_dir = os.path.join(outdir, batch_name + "_reader_build")
+    if not os.path.isfile(os.path.join(build_dir, "build_script")) or\
+            os.path.isfile(os.path.join(build_dir, "ORCHIDReader",
+                                        "orchidReader")):
+        return None
+    return build_dir
+
+
+def print_statuses(dirs, statuses, verbose):
+    """Prints the number of batches in each state and the batches that are
+    not complete
+
+    Parameters
+    ----------
+    dirs : list
+        The batch and merge directories in the order to print them
+    statuses : dict
+        The state and reasons of each directory, from get_statuses
+    verbose : bool
+        True if the complete batches should be printed as well
+    """
+    counts = dict([(state, 0) for state in bst.STATES])
+    for batch_dir in dirs:
+        state, reasons = statuses[batch_dir]
+        counts[state] += 1
+        if state == bst.COMPLETE and not verbose:
+            continue
+        print(batch_dir)
+        print("    " + state)
+        for reason in reasons:
+            print("      " + reason)
+    print("Batches and merges:", ", ".join(
+        ["{0:d} {1:s}".format(counts[state], state) for state in bst.STATES
+         if counts[state] > 0]))
+
+
+def read_cmdline():
+    """Reads command line parameters and returns the status options
+
+    Returns
+    -------
+    opts : argparse.Namespace
+        The options given on the command line
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("outdir", nargs="?")
+    parser.add_argument("batch_name", nargs="?")
+    parser.add_argument("-h", "--help", action="store_true")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    parser.add_argument("--resubmit", action="store_true")
+    parser.add_argument("--script", default="./resubmit_script")
+    parser.add_argument("--unfinished", action="store_true")
+    parser.add_argument("--walltime", type=float, default=0.0)
+    parser.add_argument("--submit-order", default="timeline")
+    parser.add_argument("--workers", type=int, default=bst.DEFAULT_WORKERS)
+    try:
+        opts, unknown = parser.parse_known_args()
+    except SystemExit:
+        print(HELP_STR.format(sys.argv[0]))
+        sys.exit()
+    if opts.help or len(unknown) != 0 or opts.batch_name is None or\
+            opts.walltime < 0.0 or opts.workers < 1 or\
+            opts.submit_order not in sp.POLICIES:
+        print(HELP_STR.format(sys.argv[0]))
+        sys.exit()
+    return opts
+
+
+HELP_STR = """
+Usage:
+  {0:s} [Options] OutputDir BatchName
+  OutputDir is the base output directory given to
+  orchid_reader_simple_setup.py and BatchName is the name of the input
+  directory, the batches of OutputDir/BatchName_manifest.json are checked
+
+  Each batch is complete, failed (OrchidReader or the stage in exited with an
+  error, or the outputs are missing or incomplete), stale (the sizes or
+  modification times of its input files changed since the job started, or
+  its input_file_list, detector_setup or batch_cfg was written after the job
+  started), unfinished (the job started and has not finished) or not run.
+  The merge of a chunked sub batch waits until all of its chunks are complete
+
+ Options:
+  --resubmit          Write a submit script for the failed and stale batches,
+                      and the merges of their chunks
+  --script FILE       The submit script to write, defaults to
+                      ./resubmit_script
+  --unfinished        Also submit the unfinished batches and those not run,
+                      for once the queue no longer holds their jobs
+  --walltime HOURS    Jobs that started more than HOURS ago and have not
+                      finished were killed and have failed
+  --submit-order ORD  The order to submit the batches in, timeline (default),
+                      longest-first or shortest-first
+  --workers N         Check N batch directories at once, defaults to 8
+  -v, --verbose       List the complete batches too
+
+ Ex:
+  {0:s} --resubmit --walltime 48 /data/out Batch7
+   Writes ./resubmit_script to submit the batches of Batch7 that failed, were
+   killed after 48 hours or whose input files changed
+"""
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/python
+"""This script runs the catalog daemon for a base output directory, which
+keeps the header information of the input directories in memory so that
+orchid_reader_simple_setup does not start cold every time it is run over the
+same campaign directories"""
+from __future__ import print_function
+import sys
+import os
+import argparse
+from orsslib import catalog_service as cs
+from orsslib import io_budget as iob
+from orsslib import io_backends as iobk
+
+
+def main():
+    """Entry point for the script"""
+    outdir, opts = read_cmdline()
+    socket_path = opts.socket
+    if socket_path is None:
+        socket_path = cs.get_socket_path(outdir)
+    reply = cs.send_request(socket_path, {"op": "ping"}, timeout=5.0)
+    if opts.stop:
+        if reply is None:
+            print("No catalog daemon is running on", socket_path)
+        else:
+            cs.send_request(socket_path, {"op": "stop"}, timeout=5.0)
+            print("Stopped the catalog daemon on", socket_path)
+        return
+    if opts.status:
+        if reply is None:
+            print("No catalog daemon is running on", socket_path)
+        else:
+            print("Catalog daemon on", socket_path, "knows",
+                  len(reply["directories"]), "input directories")
+            for indir in reply["directories"]:
+                print("   ", indir)
+        return
+    if reply is not None:
+        print("A catalog daemon is already running on", socket_path)
+        sys.exit()
+    if os.path.exists(socket_path):
+        # left behind by a daemon that did not shut down cleanly
+        os.remove(socket_path)
+    print("Catalog daemon listening on", socket_path)
+    budget = iob.IoBudget(opts.io_rate, opts.io_ops, opts.drop_cache)
+    cs.CatalogDaemon(outdir, opts.refresh, budget,
+                     opts.io_backend).serve(socket_path)
+    print("Catalog daemon stopped")
+    if budget.num_files > 0:
+        print(budget.get_summary_str())
+
+
+def read_cmdline():
+    """Reads command line parameters and returns the base output directory and
+    the daemon options
+
+    Returns
+    -------
+    outdir : str
+        The base output directory
+    opts : argparse.Namespace
+        The options given on the command line
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("outdir", nargs="?")
+    parser.add_argument("-h", "--help", action="store_true")
+    parser.add_argument("--socket")
+    parser.add_argument("--refresh", type=float, default=cs.DEFAULT_REFRESH)
+    parser.add_argument("--stop", action="store_true")
+    parser.add_argument("--status", action="store_true")
+    parser.add_argument("--io-rate", type=float, default=0.0)
+    parser.add_argument("--io-ops", type=float, default=0.0)
+    parser.add_argument("--drop-cache", action="store_true")
+    parser.add_argument("--io-backend", default=iobk.DEFAULT_BACKEND)
+    try:
+        opts, unknown = parser.parse_known_args()
+    except SystemExit:
+        print(HELP_STR.format(sys.argv[0]))
+        sys.exit()
+    if opts.help or len(unknown) != 0 or opts.outdir is None or\
+            not os.path.isdir(opts.outdir) or opts.refresh <= 0.0 or\
+            opts.io_rate < 0.0 or opts.io_ops < 0.0 or\
+            not iobk.is_available(opts.io_backend) or\
+            (opts.stop and opts.status):
+        print(HELP_STR.format(sys.argv[0]))
+        sys.exit()
+    return opts.outdir, opts
+
+
+HELP_STR = """
+Usage:
+  {0:s} [Options] OutputDir
+  Runs the catalog daemon for the base output directory OutputDir until it is
+  stopped. While it runs orchid_reader_simple_setup.py gets the header
+  information of the input directories from the daemon instead of reading the
+  data files, and falls back to reading them itself if the daemon is not
+  running
+
+ Options:
+  --socket PATH      Unix socket to listen on (default:
+                     OutputDir/.orss_catalog.sock)
+  --refresh SEC      Seconds between checks of the known input directories for
+                     new or changed files (default: 30)
+  --io-rate MB/s     Largest rate to read file headers at, 0 for no limit
+                     (default: 0)
+  --io-ops N         Largest number of reads per second, 0 for no limit
+                     (default: 0)
+  --drop-cache       Drop each file from the page cache once its header has
+                     been read
+  --io-backend NAME  How the file headers are read, buffered, pread (Python 3
+                     only) or mmap (default: buffered)
+  --status           Report whether a daemon is running and the directories
+                     it knows
+  --stop             Stop the daemon that is running
+
+ Ex:
+  nohup {0:s} /data/out > catalog_daemon.log &
+   Starts the daemon for /data/out in the background
+"""
+
+if __name__ == "__main__":
+    main()
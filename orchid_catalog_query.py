@@ -0,0 +1,201 @@
+#!/usr/bin/python
+"""This script answers time questions from the run catalog written by
+orchid_reader_simple_setup, which files and batch directories cover a window
+of time and which detector setup and position applied at a given time, without
+opening any of the raw data files"""
+from __future__ import print_function
+import sys
+import datetime
+import argparse
+from orsslib import run_catalog as rc
+
+# the formats times can be given in on the command line
+TIME_FORMATS = ["%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S",
+                "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S",
+                "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M", "%Y-%m-%d"]
+
+
+def main():
+    """Entry point for the script"""
+    opts = read_cmdline()
+    if rc.np is None:
+        print("The run catalog can only be read with numpy installed")
+        sys.exit()
+    catalog = rc.load_catalog(opts.outdir)
+    if len(catalog["path"]) == 0:
+        print("No run catalog found in", opts.outdir)
+        sys.exit()
+    if opts.at is not None:
+        print_time_info(catalog, opts.at)
+        return
+    rows = rc.query_time_range(catalog, opts.start, opts.end)
+    print_range_info(catalog, rows, opts.start, opts.end, opts.verbose)
+    if opts.file_list is not None:
+        write_file_list(catalog, rows, opts.file_list)
+        print("Wrote the", len(rows), "files to", opts.file_list)
+
+
+def print_time_info(catalog, time):
+    """Prints the file, batch, setup and position that applied at a time
+
+    Parameters
+    ----------
+    catalog : dict
+        The catalog from load_catalog
+    time : datetime.datetime
+        The time to look up
+    """
+    row = rc.query_time(catalog, time)
+    if row is None:
+        print("No file was started at or before", time)
+        return
+    print("At", time)
+    print("    File:     ", catalog["path"][row])
+    print("    Runs:     ", rc.to_datetime(catalog["start"][row]), "to",
+          rc.to_datetime(catalog["end"][row]))
+    if catalog["end"][row] <= rc.to_datetime64(time):
+        print("    No file was being taken, this is the last file before it")
+    print("    Batch:    ", catalog["batch_dir"][row])
+    print("    Setup:    ", catalog["setup"][row])
+    print("    Position: ", catalog["position"][row],
+          "({0:.2f}, {1:.2f})".format(catalog["x"][row], catalog["y"][row]))
+
+
+def print_range_info(catalog, rows, start, end, verbose):
+    """Prints the batch directories, and optionally the files, that overlap a
+    time range
+
+    Parameters
+    ----------
+    catalog : dict
+        The catalog from load_catalog
+    rows : numpy.ndarray
+        The rows of the files that overlap the range, from query_time_range
+    start : datetime.datetime
+        The start of the time range
+    end : datetime.datetime
+        The end of the time range
+    verbose : bool
+        True if every file should be printed
+    """
+    batches = []
+    batch_rows = {}
+    for row in rows:
+        batch_dir = catalog["batch_dir"][row]
+        if batch_dir not in batch_rows:
+            batches.append(batch_dir)
+            batch_rows[batch_dir] = []
+        batch_rows[batch_dir].append(row)
+    print("Found", len(rows), "files in", len(batches),
+          "batches overlapping", start, "to", end)
+    for batch_dir in batches:
+        first = batch_rows[batch_dir][0]
+        print(batch_dir)
+        print("    Setup:", catalog["setup"][first], "  Position:",
+              catalog["position"][first], "  Files:",
+              len(batch_rows[batch_dir]))
+        if verbose:
+            for row in batch_rows[batch_dir]:
+                print("    ", rc.to_datetime(catalog["start"][row]),
+                      rc.to_datetime(catalog["end"][row]),
+                      catalog["path"][row])
+
+
+def write_file_list(catalog, rows, path):
+    """Writes the files that overlap a time range in the format of the
+    input_file_list of a batch directory
+
+    Parameters
+    ----------
+    catalog : dict
+        The catalog from load_catalog
+    rows : numpy.ndarray
+        The rows of the files, from query_time_range
+    path : str
+        Path to the file list to write
+    """
+    with open(path, 'wb') as out_file:
+        for row in rows:
+            out_file.write(catalog["path"][row].encode("utf-8") + b"\n")
+
+
+def parse_time(value):
+    """Converts a time given on the command line for argparse
+
+    Parameters
+    ----------
+    value : str
+        The string from the command line, in one of TIME_FORMATS
+
+    Returns
+    -------
+    time : datetime.datetime
+        The time
+    """
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError("Unknown time format: " + value)
+
+
+def read_cmdline():
+    """Reads command line parameters and returns the query options
+
+    Returns
+    -------
+    opts : argparse.Namespace
+        The options given on the command line
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("outdir", nargs="?")
+    parser.add_argument("start", nargs="?", type=parse_time)
+    parser.add_argument("end", nargs="?", type=parse_time)
+    parser.add_argument("-h", "--help", action="store_true")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    parser.add_argument("--at", type=parse_time)
+    parser.add_argument("--file-list")
+    try:
+        opts, unknown = parser.parse_known_args()
+    except SystemExit:
+        print(HELP_STR.format(sys.argv[0]))
+        sys.exit()
+    if opts.at is not None:
+        is_valid = opts.start is None and opts.file_list is None
+    else:
+        is_valid = opts.end is not None and opts.start < opts.end
+    if opts.help or len(unknown) != 0 or opts.outdir is None or not is_valid:
+        print(HELP_STR.format(sys.argv[0]))
+        sys.exit()
+    return opts
+
+
+HELP_STR = """
+Usage:
+  {0:s} [Options] OutputDir Start End
+  {0:s} --at Time OutputDir
+  OutputDir is the base output directory given to
+  orchid_reader_simple_setup.py, its run catalog (orss_catalog) holds every
+  input directory processed into it. Times are local data acquisition times
+  given as YYYY-MM-DD[THH:MM[:SS[.ffffff]]]
+
+  The first form lists the batch directories and files that overlap the time
+  range from Start up to (not including) End, a file that ends exactly at
+  Start is not included. The second form gives the file, batch directory,
+  detector setup and position that applied at a time
+
+ Options:
+  --file-list FILE   Write the files that overlap the range to FILE in the
+                     format of input_file_list, to re-process just that range
+  --at TIME          Look up what applied at TIME instead of a range
+  -v, --verbose      List every file of each batch directory
+
+ Ex:
+  {0:s} -v /data/out 2017-03-02T14:00 2017-03-02T16:30
+   Lists the files taken between 14:00 and 16:30 on March 2nd 2017 and the
+   batch directories they were processed in
+"""
+
+if __name__ == "__main__":
+    main()
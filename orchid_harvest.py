@@ -0,0 +1,154 @@
+#!/usr/bin/python
+"""This script collects the outputs of the batches of one or more batch
+manifests once the batch jobs have run, the batch_data.csv, det_meta_data.csv
+and run_data.csv of every batch directory are read into one columnar table of
+each for the whole campaign, and the batch directories with missing or
+incomplete outputs are reported"""
+from __future__ import print_function
+import os
+import sys
+import glob
+import argparse
+from orsslib import batch_manifest as bm
+from orsslib import result_harvest as rh
+from orsslib import run_catalog as rc
+from orsslib import scan_cache as sc
+
+
+def main():
+    """Entry point for the script"""
+    opts = read_cmdline()
+    if rh.np is None:
+        print("The harvested tables can only be written with numpy installed")
+        sys.exit()
+    manifest_paths = get_manifest_paths(opts.outdir, opts.batch_names)
+    if len(manifest_paths) == 0:
+        print("No batch manifest found in", opts.outdir)
+        sys.exit()
+    manifests = [bm.read_manifest(path) for path in manifest_paths]
+    batches = rh.get_output_batches(manifests)
+    cache = sc.ScanCache(rh.get_cache_path(opts.outdir))
+    results, problems, num_read = rh.harvest(batches, cache, opts.workers)
+    print("Harvested", len(batches), "batch directories from",
+          len(manifests), "manifests, read", num_read, "csv files that were",
+          "new or changed since the last harvest")
+    for kind in rh.CSV_KINDS:
+        columns = rh.build_table(batches, results, kind)
+        table_path = rh.get_table_path(opts.outdir, kind)
+        rc.write_part(table_path, columns)
+        print("Wrote", len(columns["batch_name"]), "rows to", table_path)
+    if opts.verbose:
+        for batch in batches:
+            parsed = results[batch["batch_dir"]]
+            print(batch["batch_dir"])
+            print("    Setup:", batch["setup"], "  Position:",
+                  batch["position"], "  Rows:", "  ".join(
+                      ["{0:s} {1:d}".format(kind, (
+                          0 if parsed[kind] is None
+                          else len(parsed[kind]["rows"])))
+                       for kind in rh.CSV_KINDS]))
+    print_problems(batches, problems)
+
+
+def get_manifest_paths(outdir, batch_names):
+    """Gives the manifests to harvest
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+    batch_names : list
+        Names of the overall batches to harvest, every batch with a manifest
+        in outdir if empty
+
+    Returns
+    -------
+    manifest_paths : list
+        Paths to the manifest files
+    """
+    if len(batch_names) == 0:
+        return sorted(glob.glob(bm.get_manifest_path(outdir, "*")))
+    manifest_paths = []
+    for batch_name in batch_names:
+        manifest_path = bm.get_manifest_path(outdir, batch_name)
+        if not os.path.isfile(manifest_path):
+            print("Could not find the manifest", manifest_path)
+            sys.exit()
+        manifest_paths.append(manifest_path)
+    return manifest_paths
+
+
+def print_problems(batches, problems):
+    """Prints the batch directories with missing or incomplete outputs
+
+    Parameters
+    ----------
+    batches : list
+        The batches from get_output_batches
+    problems : dict
+        The problems of each batch directory, from harvest
+    """
+    if len(problems) == 0:
+        print("Every batch directory has all of its outputs")
+        return
+    print(len(problems), "batch directories have missing or incomplete",
+          "outputs:")
+    for batch in batches:
+        if batch["batch_dir"] in problems:
+            print(batch["batch_dir"])
+            for problem in problems[batch["batch_dir"]]:
+                print("    " + problem)
+
+
+def read_cmdline():
+    """Reads command line parameters and returns the harvest options
+
+    Returns
+    -------
+    opts : argparse.Namespace
+        The options given on the command line
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("outdir", nargs="?")
+    parser.add_argument("batch_names", nargs="*")
+    parser.add_argument("-h", "--help", action="store_true")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    parser.add_argument("--workers", type=int, default=rh.DEFAULT_WORKERS)
+    try:
+        opts, unknown = parser.parse_known_args()
+    except SystemExit:
+        print(HELP_STR.format(sys.argv[0]))
+        sys.exit()
+    if opts.help or len(unknown) != 0 or opts.outdir is None or\
+            opts.workers < 1:
+        print(HELP_STR.format(sys.argv[0]))
+        sys.exit()
+    return opts
+
+
+HELP_STR = """
+Usage:
+  {0:s} [Options] OutputDir [BatchName ...]
+  OutputDir is the base output directory given to
+  orchid_reader_simple_setup.py. The outputs of the batches of every
+  <BatchName>_manifest.json in it are harvested, or of only the batches named
+
+  The batch_data.csv, det_meta_data.csv and run_data.csv of every batch
+  directory (the merged outputs for batches cut into chunks) are collected into
+  orss_results/batch_data.npz, det_meta_data.npz and run_data.npz in
+  OutputDir, each row tagged with the batch_name, batch_dir, setup, position,
+  x and y of its batch. Batch directories whose csv files or batch_hists.root
+  are missing or incomplete are listed. Only the csv files that changed since
+  the last harvest are read again
+
+ Options:
+  --workers N        Read N batch directories at once, defaults to 8
+  -v, --verbose      List every batch directory with its number of rows
+
+ Ex:
+  {0:s} /data/out
+   Harvests every batch processed into /data/out
+"""
+
+if __name__ == "__main__":
+    main()
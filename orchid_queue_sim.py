@@ -0,0 +1,154 @@
+#!/usr/bin/python
+"""This script reads the batch manifests written by orchid_reader_simple_setup
+and simulates the queue running their jobs for a range of node counts and
+queue limits, so the time a campaign will take can be estimated before it is
+submitted"""
+from __future__ import print_function
+import sys
+import argparse
+from orsslib import batch_manifest as bm
+from orsslib import queue_simulation as qs
+from orsslib import submit_planning as sp
+
+
+def main():
+    """Entry point for the script"""
+    manifest_paths, opts = read_cmdline()
+    manifests = [bm.read_manifest(path) for path in manifest_paths]
+    jobs = qs.get_plan_jobs(manifests, opts.rate, opts.overhead,
+                            opts.merge_time, opts.submit_order)
+    total_bytes = sum([job["bytes"] for job in jobs])
+    print("Simulating", len(jobs), "jobs reading",
+          "{0:.1f} GB".format(total_bytes / 1.0e9))
+    print(RESULT_HEADER)
+    for nodes in opts.nodes:
+        for jobs_per_node in opts.jobs_per_node:
+            for max_running in opts.max_running:
+                result = qs.simulate_queue(jobs, nodes, jobs_per_node,
+                                           max_running)
+                print_result(jobs, result, nodes, jobs_per_node, max_running,
+                             opts.verbose)
+
+
+def print_result(jobs, result, nodes, jobs_per_node, max_running, verbose):
+    """Prints the result of one simulation
+
+    Parameters
+    ----------
+    jobs : list
+        List of jobs as returned by get_plan_jobs
+    result : dict
+        The result of simulate_queue
+    nodes : int
+        Number of nodes simulated
+    jobs_per_node : int
+        Number of jobs per node simulated
+    max_running : int
+        Queue limit on running jobs simulated, 0 for no limit
+    verbose : bool
+        True if the full critical path should be printed
+    """
+    if len(result["critical"]) == 0:
+        print(RESULT_FMT.format(nodes, jobs_per_node, max_running, 0.0, 0.0,
+                                ""))
+        return
+    # the longest job on the critical path is the one worth splitting up
+    longest = max(result["critical"], key=lambda x: jobs[x]["runtime"])
+    print(RESULT_FMT.format(nodes, jobs_per_node, max_running,
+                            result["makespan"] / 3600.0,
+                            100.0 * result["utilization"],
+                            jobs[longest]["name"]))
+    if verbose:
+        for ind in result["critical"]:
+            print("      {0:10.2f} {1:10.2f}  {2:s}".format(
+                result["start"][ind] / 3600.0, result["end"][ind] / 3600.0,
+                jobs[ind]["name"]))
+
+
+def int_list(value):
+    """Converts a comma separated list of integers for argparse
+
+    Parameters
+    ----------
+    value : str
+        The string from the command line
+
+    Returns
+    -------
+    values : list
+        The list of integers
+    """
+    return [int(val) for val in value.split(",")]
+
+
+def read_cmdline():
+    """Reads command line parameters and returns the manifest paths and the
+    simulation options
+
+    Returns
+    -------
+    manifest_paths : list
+        List of paths to the manifests to simulate
+    opts : argparse.Namespace
+        The options given on the command line
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("-h", "--help", action="store_true")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    parser.add_argument("--nodes", type=int_list, default=[1])
+    parser.add_argument("--jobs-per-node", type=int_list, default=[1])
+    parser.add_argument("--max-running", type=int_list, default=[0])
+    parser.add_argument("--rate", type=float, default=qs.DEFAULT_RATE)
+    parser.add_argument("--overhead", type=float, default=qs.DEFAULT_OVERHEAD)
+    parser.add_argument("--merge-time", type=float,
+                        default=qs.DEFAULT_MERGE_TIME)
+    parser.add_argument("--submit-order", default="timeline")
+    try:
+        opts, unknown = parser.parse_known_args()
+    except SystemExit:
+        print(HELP_STR.format(sys.argv[0]))
+        sys.exit()
+    if opts.help or len(unknown) != 0 or len(opts.paths) == 0 or\
+            min(opts.nodes) < 1 or min(opts.jobs_per_node) < 1 or\
+            min(opts.max_running) < 0 or opts.rate <= 0.0 or\
+            opts.submit_order not in sp.POLICIES:
+        print(HELP_STR.format(sys.argv[0]))
+        sys.exit()
+    return opts.paths, opts
+
+
+RESULT_HEADER = """Nodes Jobs/Node MaxRunning Makespan(h) Utilization Critical Batch
+----- --------- ---------- ----------- ----------- --------------"""
+
+RESULT_FMT = "{0:5d} {1:9d} {2:10d} {3:11.2f} {4:10.1f}% {5:s}"
+
+
+HELP_STR = """
+Usage:
+  {0:s} [Options] Manifest [Manifest ...]
+  Manifests are written to the base output directory by
+  orchid_reader_simple_setup.py as BatchName_manifest.json
+
+ Options:
+  --nodes N[,N...]          Node counts to simulate (default: 1)
+  --jobs-per-node N[,N...]  Jobs that run at once on a node (default: 1)
+  --max-running N[,N...]    Queue limits on the number of running jobs, 0 for
+                            no limit (default: 0)
+  --rate MB/s               Rate a job reads raw data at (default: 20)
+  --overhead SEC            Time a job spends building OrchidReader
+                            (default: 300)
+  --merge-time SEC          Time a chunk merge job takes (default: 60)
+  --submit-order POLICY     Order the batches are submitted in, timeline,
+                            longest-first or shortest-first (default:
+                            timeline)
+  -v, --verbose             Print the critical path of every simulation
+
+ Ex:
+  {0:s} --nodes 4,8,16 --max-running 0,10 Batch7_manifest.json
+   Simulates every combination of 4, 8 and 16 nodes with and without a limit
+   of 10 running jobs
+"""
+
+if __name__ == "__main__":
+    main()
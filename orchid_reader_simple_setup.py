@@ -1,62 +1,616 @@
 #!/usr/bin/python
 """This script takes some basic input and asks the user some questions before
 generating configuration files for OrchidReader and a queue script to run it"""
+from __future__ import print_function
 import sys
 import os
-import datetime
-import struct
+import argparse
+import itertools
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 from orsslib import sub_batch_handling as sb_hnd
 from orsslib import input_sanitizer as inp
-
-FILE_HEADER_SIZE = 4096
-BUFFER_SIZE = 2097152
+from orsslib import scan_cache as sc
+from orsslib import file_verification as fv
+from orsslib import channel_census as cc
+from orsslib import batch_chunking as bc
+from orsslib import batch_manifest as bm
+from orsslib import submit_planning as sp
+from orsslib import run_journal as rj
+from orsslib import batch_output as bo
+from orsslib import background_scan as bs
+from orsslib import run_catalog as rc
+from orsslib import catalog_service as cs
+from orsslib import io_budget as iob
+from orsslib import io_backends as iobk
+from orsslib import io_autotune as iot
+from orsslib import compressed_files as cf
+from orsslib import external_plan as ep
+from orsslib import batch_status as bst
+from orsslib import buffer_timeline as bt
+from orsslib import duplicate_files as dup
+from orsslib import sharded_scan as ss
 
 DEFAULT_OUTDIR = "/data1/prospect/ProcessedData/OrchidAnalysis/TimeSeries_2017"
 
 BATCH_SPLIT_TIME_DIFF = 120.0
 
+HIST_INTEGRATION_TIME = 600.0
+
+PROCESS_FIRST_BUFFER = True
+
 
 def main():
     """Entry point for the script"""
-    indir, outdir = read_cmdline()
+    indir, outdir, opts = read_cmdline()
     _, batch_name = os.path.split(indir)
-    print "Input Directory is:", indir
-    print "Base Output Directory is:", outdir
-    print "\nIf this is incorrect use 'Ctrl+C' to stop execution"
-    raw_input("Press Enter to continue...")
-    # get the list of files and their header info
-    print "Getting header & timestamp info"
-    file_list = get_and_sort_file_list(indir)
-    # now try to figure out where splits need to happen
-    sub_batches = split_into_subbatches(file_list)
-    # now ask users if they agree with the detector setups configured
-    # for each sub batch
-    check_sub_batch_info(sub_batches)
-    sub_batches = get_proc_folders(outdir, sub_batches, batch_name)
-    # now, for each sub batch, create the folder and the files to run the job
-    batch_files = build_batch_scripts(sub_batches)
+    print("Input Directory is:", indir)
+    print("Base Output Directory is:", outdir)
+    print("\nIf this is incorrect use 'Ctrl+C' to stop execution")
+    inp.read_input("Press Enter to continue...")
+    journal = rj.RunJournal(rj.get_journal_path(outdir, batch_name),
+                            opts.resume)
+    stage_in = None
+    if cf.lzma is None and has_compressed_files(indir, "xz"):
+        print("Some input files are compressed with xz, reading them needs "
+              "the lzma module of")
+        print("Python 3.3 or later")
+        sys.exit(1)
+    # OrchidReader cannot read compressed files, they have to be staged in,
+    # which decompresses them
+    if not opts.stage_in and has_compressed_files(indir):
+        print("Some input files are compressed, OrchidReader can only read "
+              "them once they are")
+        print("staged in and decompressed, so --stage-in is turned on")
+        opts.stage_in = True
+    if opts.stage_in:
+        stage_in = (opts.stage_in_copies, opts.stage_in_slots,
+                    os.path.join(outdir, ".orss_stage_slots"))
+    build_dir = None
+    if opts.shared_build:
+        build_dir = os.path.join(outdir, batch_name + "_reader_build")
+    budget = iob.IoBudget(opts.io_rate, opts.io_ops, opts.drop_cache)
+    tuner = iot.AutoTuner(opts.io_backend, opts.io_workers)
+    manifest = None
+    catalog_name = None
+    if opts.memory_budget > 0.0:
+        # sort the files on disk and write each sub batch once it is split
+        manifest, merge_groups, batch_files, changed, catalog_name =\
+            run_external(indir, outdir, batch_name, opts, stage_in, build_dir,
+                         budget, tuner)
+    elif opts.pipeline and not journal.has_step("scan"):
+        # review and write the sub batches while the scan goes on
+        sub_batches, merge_groups, batch_files, changed = run_pipelined(
+            indir, outdir, batch_name, opts, journal, stage_in, build_dir,
+            budget)
+    else:
+        if journal.has_step("scan"):
+            print("Resuming with the file list recorded in the run journal")
+            file_list, inferred = journal.get_scan()
+            # the chunks are cut by the uncompressed sizes, which the seek
+            # indexes in the scan cache give without decompressing the files
+            if any([cf.is_compressed(fdat[0]) for fdat in file_list]):
+                cf.load_indexes(sc.ScanCache(sc.get_cache_path(
+                    outdir, batch_name)), [fdat[0] for fdat in file_list])
+        else:
+            file_list, inferred = scan_files(indir, outdir, batch_name, opts,
+                                             budget, tuner)
+            journal.record_scan(file_list, inferred)
+        # now try to figure out where splits need to happen
+        if journal.has_step("split"):
+            sub_batches = journal.get_split(file_list)
+        else:
+            sub_batches = split_into_subbatches(file_list, inferred,
+                                                get_thresholds(opts))
+            journal.record_split(sub_batches)
+        # now ask users if they agree with the detector setups configured
+        # for each sub batch
+        check_sub_batch_info(sub_batches, journal)
+        sub_batches = get_proc_folders(outdir, sub_batches, batch_name)
+        # cut the large sub batches into chunks that can run at the same time
+        sub_batches, merge_groups = bc.chunk_sub_batches(
+            sub_batches, opts.chunks, int(opts.chunk_threshold * 1e9),
+            HIST_INTEGRATION_TIME)
+        # now, for each sub batch, create the folder and the files to run the
+        # job
+        batch_files, changed = build_batch_scripts(
+            sub_batches, merge_groups, stage_in, build_dir, journal,
+            opts.writers)
+    # record what was generated for the tools that work from the batch plan
+    manifest_name = bm.get_manifest_path(outdir, batch_name)
+    if manifest is None:
+        manifest = bm.build_manifest(batch_name, indir, sub_batches,
+                                     merge_groups)
+        # keep the scanned file table with the analysis outputs
+        if rc.np is not None:
+            catalog_name = rc.get_part_path(outdir, batch_name)
+            rc.write_part(catalog_name, rc.build_columns(sub_batches),
+                          batch_name)
+            rc.remove_stale_parts(outdir, batch_name, [catalog_name])
+    bm.write_manifest(manifest_name, manifest)
     # now create a small script that submits each of the queue scripts created
-    sub_script_name = generate_sub_script(batch_files)
-    os.system("chmod -R 774 {0:s}".format(sub_script_name))
+    sub_script_name = generate_sub_script(
+        batch_files, merge_groups,
+        [batch["bytes"] for batch in manifest["batches"]], opts.submit_order,
+        build_dir, (changed if opts.submit_changed else None))
+    os.chmod(sub_script_name, bo.OUTPUT_MODE)
     out_str = ("batches to run" if len(batch_files) == 0 else "batch to run")
-    print "Created", len(batch_files), out_str
+    print("Created", len(batch_files), out_str)
     for number, batch in enumerate(batch_files):
-        print "Batch #{0:d}".format(number)
-        print "    Output directory:", batch[4]
-        print "  Reader Config File:", batch[0]
-        print "     Input List File:", batch[2]
-        print " Detector Setup File:", batch[1]
-        print "   Queue Script File:", batch[3]
-        os.system("chmod -R 774 {0:s}".format(batch[4]))
-    print ""
-    print "Generated", sub_script_name
-    print "  It will automatically submit the generated batch scripts"
-
-
-def generate_sub_script(batch_files):
+        print("Batch #{0:d}".format(number))
+        print("    Output directory:", batch[4])
+        print("  Reader Config File:", batch[0])
+        print("     Input List File:", batch[2])
+        print(" Detector Setup File:", batch[1])
+        print("   Queue Script File:", batch[3])
+    for batch_dir, chunk_dirs in merge_groups:
+        print("Merge of", len(chunk_dirs), "chunks")
+        print("    Output directory:", batch_dir)
+        print("   Merge Script File:", os.path.join(batch_dir, "merge_script"))
+    if build_dir is not None:
+        print("Shared build of OrchidReader")
+        print("    Output directory:", build_dir)
+        print("   Build Script File:", os.path.join(build_dir, "build_script"))
+    print("")
+    print_changed_batches(batch_files, merge_groups, changed)
+    if budget.num_files > 0:
+        print("")
+        print(budget.get_summary_str())
+    if tuner.num_files > 0:
+        print("")
+        print(tuner.get_summary_str())
+    print("")
+    print("Generated", sub_script_name)
+    print("  It will automatically submit the generated batch scripts")
+    print("Generated", manifest_name)
+    print("  It records the generated batches, orchid_queue_sim.py can use it")
+    print("  to estimate how long the batches will take to run")
+    if catalog_name is not None:
+        print("Generated", catalog_name)
+        print("  It holds the header information and batch of every file")
+    else:
+        print("The run catalog was not written, it needs numpy")
+
+
+def print_changed_batches(batch_files, merge_groups, changed):
+    """Prints which of the batch directories were written or changed by this
+    run, these are the ones that need to be (re)submitted
+
+    Parameters
+    ----------
+    batch_files : list
+        A list of the files generated for batch processing, as returned by
+        build_batch_scripts
+    merge_groups : list
+        list of (sub batch folder, list of chunk folders) pairs
+    changed : set
+        The directories with files that were written or changed
+    """
+    folders = [batch[4] for batch in batch_files] +\
+        [batch_dir for batch_dir, _ in merge_groups]
+    to_submit = [folder for folder in folders if folder in changed]
+    if len(to_submit) == 0:
+        print("No batch directories changed, nothing needs to be resubmitted")
+        return
+    print(len(to_submit), "of", len(folders), "batch directories are new or",
+          "changed and need to be (re)submitted:")
+    for folder in to_submit:
+        print("   ", folder)
+
+
+def run_pipelined(indir, outdir, batch_name, opts, journal, stage_in,
+                  build_dir, budget=None):
+    """Reads the file headers in a background thread and asks the user about
+    each sub batch as soon as the files read so far show it is final, each
+    reviewed sub batch is then written by a background thread while the user
+    moves on. A reviewed sub batch that turns out to be different once more
+    files are read is asked about and written again
+
+    Parameters
+    ----------
+    indir : str
+        The directory given as an input directory for the raw data
+    outdir : str
+        Name of the base output directory
+    batch_name : str
+        Name of the overall batch
+    opts : argparse.Namespace
+        The options given on the command line
+    journal : RunJournal
+        The run journal, the finished run is recorded in it
+    stage_in : tuple
+        The stage in settings passed to build_batch_scripts, or None
+    build_dir : str
+        The shared build directory passed to build_batch_scripts, or None
+    budget : IoBudget
+        If not None, the I/O budget the header reads wait for
+
+    Returns
+    -------
+    sub_batches : list
+        list of sub batch tuples (with chunks) as passed to build_batch_scripts
+    merge_groups : list
+        list of (sub batch folder, list of chunk folders) pairs
+    file_information : list of tuples
+        The generated files of each batch as returned by build_batch_scripts
+    changed : set
+        The directories that had files written or changed
+    """
+    email = inp.get_str("What email should failures be sent to")
+    backend = opts.io_backend
+    if backend == "auto":
+        # the background scan reads one file at a time in order, there is
+        # nothing to tune
+        backend = iobk.DEFAULT_BACKEND
+    scanner = bs.BackgroundScanner(indir, sc.ScanCache(
+        sc.get_cache_path(outdir, batch_name)), budget, backend)
+    print("Getting header & timestamp info in the background")
+    scanner.start()
+    writer = ThreadPool(1)
+    written = {}
+    reviewed = []
+    reported = set()
+    while True:
+        scanned, safe_time, num_files = scanner.get_snapshot()
+        if safe_time is not None and scanner.is_done():
+            print("Reading the file headers failed:", scanner.error)
+            sys.exit()
+        done = safe_time is None
+        file_list = scanned
+        if not done:
+            file_list = [fdat for fdat in scanned if fdat[1][0] < safe_time]
+        # copies of the same data would be processed twice, a copy read late
+        # changes a sub batch that is then reviewed again
+        dropped, duplicates = dup.find_duplicates(
+            file_list, opts.duplicates, opts.drop_overlaps)
+        new_copies = [copy for copy in duplicates if copy[0] not in reported]
+        if len(new_copies) > 0:
+            dup.report_duplicates(new_copies, opts.duplicates)
+            reported.update([copy[0] for copy in new_copies])
+        if len(dropped) > 0:
+            names = set([fname for fname, _, _ in dropped])
+            file_list = [fdat for fdat in file_list if fdat[0] not in names]
+        sub_batches = []
+        if len(file_list) > 0:
+            sub_batches = split_into_subbatches(
+                file_list, thresholds=get_thresholds(opts))
+        # every sub batch but the last is final until the whole scan is done
+        num_final = (len(sub_batches) if done else len(sub_batches) - 1)
+        for ind in range(min(len(reviewed), num_final)):
+            if [fdat[0] for fdat in reviewed[ind][0]] !=\
+                    [fdat[0] for fdat in sub_batches[ind][0]]:
+                print("Sub batch {0:d} changed as more files were read, it "
+                      "will be reviewed again".format(ind))
+                del reviewed[ind:]
+                break
+        if len(reviewed) < num_final:
+            ind = len(reviewed)
+            batch = sub_batches[ind]
+            print(PIPELINE_REVIEW_STR.format(ind, len(scanned), num_files))
+            check_sub_batch(*batch)
+            reviewed.append(batch)
+            folder = get_proc_folder(outdir, batch_name, ind,
+                                     done and len(sub_batches) == 1)
+            if os.path.exists(folder[1]) and not os.path.isdir(folder[1]):
+                print("Output Path Exists and is NOT a Directory")
+                print("  Unrecoverable error, run setup again with "
+                      "different base dir")
+                sys.exit()
+            written[ind] = writer.apply_async(
+                write_sub_batch, (batch + (folder,), opts, stage_in,
+                                  build_dir, email))
+            continue
+        if done:
+            break
+        scanner.wait(1.0)
+    writer.close()
+    writer.join()
+    # put the results of the reviewed sub batches together
+    out_batches = []
+    merge_groups = []
+    batch_files = []
+    changed = set()
+    for ind in range(len(reviewed)):
+        chunks, merges, files, is_changed = written[ind].get()
+        out_batches.extend(chunks)
+        merge_groups.extend(merges)
+        batch_files.extend(files)
+        changed.update(is_changed)
+    if len(written) > len(reviewed):
+        print("Directories written for sub batches after", len(reviewed) - 1,
+              "no longer belong to any sub batch and can be removed")
+    # record the finished run so that it can be resumed like any other
+    journal.record_scan(file_list, None)
+    journal.record_split(reviewed)
+    for ind, batch in enumerate(reviewed):
+        journal.record_review(ind, batch[1], batch[3])
+    journal.start_writing(email, {"stage_in": stage_in,
+                                  "build_dir": build_dir,
+                                  "merge_groups": merge_groups})
+    for batch in batch_files:
+        journal.record_written(batch[4], batch[4] in changed)
+    return out_batches, merge_groups, batch_files, changed
+
+
+def run_external(indir, outdir, batch_name, opts, stage_in, build_dir,
+                 budget=None, tuner=None):
+    """Plans the batches with memory use bounded by the memory budget instead
+    of the number of files. The scanned files are sorted on disk, merged back
+    one at a time into the splitting, and each sub batch is reviewed and
+    written as soon as the file after it shows it is complete. Only the
+    current sub batch and the one before it are held in memory
+
+    Parameters
+    ----------
+    indir : str
+        The directory given as an input directory for the raw data
+    outdir : str
+        Name of the base output directory
+    batch_name : str
+        Name of the overall batch
+    opts : argparse.Namespace
+        The options given on the command line
+    stage_in : tuple
+        The stage in settings passed to build_batch_scripts, or None
+    build_dir : str
+        The shared build directory passed to build_batch_scripts, or None
+    budget : IoBudget
+        If not None, the I/O budget the header reads wait for
+    tuner : AutoTuner
+        If not None, the autotuner that reads the file headers
+
+    Returns
+    -------
+    manifest : dict
+        The manifest of the batches written, as from build_manifest
+    merge_groups : list
+        list of (sub batch folder, list of chunk folders) pairs
+    file_information : list of tuples
+        The generated files of each batch as returned by build_batch_scripts
+    changed : set
+        The directories that had files written or changed
+    catalog_name : str
+        The directory the catalog parts were written to, None if they were
+        not written
+    """
+    email = inp.get_str("What email should failures be sent to")
+    cache = sc.ScanDatabase(sc.get_database_path(outdir, batch_name))
+    sorter = ep.SpillSorter(ep.get_spill_dir(outdir, batch_name),
+                            ep.get_run_files(opts.memory_budget))
+    print("Getting header & timestamp info, sorting it in runs of",
+          sorter.run_files, "files on disk")
+    scan_to_runs(indir, cache, sorter, budget, tuner)
+    cache.close()
+    print("Sorted", sorter.num_files, "files in", len(sorter.runs), "runs")
+    manifest = bm.build_manifest(batch_name, indir, [], [])
+    merge_groups = []
+    batch_files = []
+    changed = set()
+    catalog_parts = []
+    catalog_rows = []
+    part_files = ep.get_run_files(opts.memory_budget)
+    # copies of the same data sit next to each other in the merge and are
+    # dropped as they pass
+    sub_batches = iter_sub_batches(
+        dup.iter_unique_files(sorter.merge(), opts.duplicates),
+        thresholds=get_thresholds(opts))
+    # a sub batch is held back until the next one is split, the folder of
+    # the only sub batch of a directory is named differently
+    held = next(sub_batches, None)
+    ind = 0
+    while held is not None:
+        batch = next(sub_batches, None)
+        print(EXTERNAL_REVIEW_STR.format(ind))
+        check_sub_batch(*held)
+        folder = get_proc_folder(outdir, batch_name, ind,
+                                 ind == 0 and batch is None)
+        if os.path.exists(folder[1]) and not os.path.isdir(folder[1]):
+            print("Output Path Exists and is NOT a Directory")
+            print("  Unrecoverable error, run setup again with "
+                  "different base dir")
+            sys.exit()
+        chunks, merges, files, is_changed = write_sub_batch(
+            held + (folder,), opts, stage_in, build_dir, email)
+        manifest["batches"].extend(bm.build_manifest(
+            batch_name, indir, chunks, merges)["batches"])
+        merge_groups.extend(merges)
+        batch_files.extend(files)
+        changed.update(is_changed)
+        # write the catalog in parts of about as many files as a run
+        if rc.np is not None:
+            catalog_rows.extend(chunks)
+            if sum([len(chunk[0]) for chunk in catalog_rows]) >= part_files:
+                catalog_parts.append(rc.get_part_path(
+                    outdir, batch_name, len(catalog_parts)))
+                rc.write_part(catalog_parts[-1],
+                              rc.build_columns(catalog_rows), batch_name)
+                catalog_rows = []
+        held = batch
+        ind += 1
+    sorter.cleanup()
+    catalog_name = None
+    if rc.np is not None:
+        if len(catalog_rows) > 0 or len(catalog_parts) == 0:
+            catalog_parts.append(rc.get_part_path(outdir, batch_name,
+                                                  len(catalog_parts)))
+            rc.write_part(catalog_parts[-1], rc.build_columns(catalog_rows),
+                          batch_name)
+        rc.remove_stale_parts(outdir, batch_name, catalog_parts)
+        catalog_name = rc.get_catalog_dir(outdir)
+    manifest["merges"] = [{"dir": batch_dir, "chunks": chunk_dirs}
+                          for batch_dir, chunk_dirs in merge_groups]
+    peak_rss = ep.get_peak_rss()
+    if peak_rss is not None:
+        print("Peak memory use {0:.0f} MB, the budget is {1:.0f} MB".format(
+            peak_rss, opts.memory_budget))
+    return manifest, merge_groups, batch_files, changed, catalog_name
+
+
+def scan_to_runs(indir, cache, sorter, budget=None, tuner=None):
+    """Reads the header information of the files in the input directory a
+    run of files at a time, adding it to the sorter
+
+    Parameters
+    ----------
+    indir : str
+        The directory given as an input directory for the raw data
+    cache : ScanDatabase
+        The on disk scan cache, files that are unchanged since they were
+        cached are not read again
+    sorter : SpillSorter
+        The sorter the files are added to
+    budget : IoBudget
+        If not None, the I/O budget the header reads wait for
+    tuner : AutoTuner
+        If not None, the autotuner that reads the headers of the files that
+        are not cached
+    """
+    if tuner is None:
+        tuner = iot.AutoTuner(iobk.DEFAULT_BACKEND, 1)
+    fnames = []
+    for fname in itertools.chain(ep.iter_data_files(indir), [None]):
+        if fname is not None:
+            fnames.append(fname)
+            if len(fnames) < sorter.run_files:
+                continue
+        headers = [cache.lookup(fname, "header") for fname in fnames]
+        to_read = [fname for fname, header in zip(fnames, headers)
+                   if header is None]
+        cf.load_indexes(cache, fnames)
+        read = dict(zip(to_read, tuner.read_headers(to_read, budget)))
+        cf.save_indexes(cache, to_read)
+        for fname, header in zip(fnames, headers):
+            if header is None:
+                # files too short or too damaged to read have no header
+                if read[fname] is None:
+                    continue
+                header = sc.header_to_json(read[fname])
+                cache.store(fname, "header", header)
+            sorter.add(fname, header)
+        cache.save()
+        fnames = []
+
+
+def write_sub_batch(sub_batch, opts, stage_in, build_dir, email):
+    """Cuts a reviewed sub batch into chunks and writes its directories, this
+    is run by the background writer of the pipelined mode
+
+    Parameters
+    ----------
+    sub_batch : tuple
+        The sub batch tuple, with its name and folder
+    opts : argparse.Namespace
+        The options given on the command line
+    stage_in : tuple
+        The stage in settings passed to build_batch_scripts, or None
+    build_dir : str
+        The shared build directory passed to build_batch_scripts, or None
+    email : str
+        The email address to supply to the batch script(s)
+
+    Returns
+    -------
+    sub_batches : list
+        The chunks of the sub batch, or the sub batch if it was not cut
+    merge_groups : list
+        The merge group of the sub batch if it was cut
+    file_information : list of tuples
+        The generated files as returned by build_batch_scripts
+    changed : set
+        The directories that had files written or changed
+    """
+    sub_batches, merge_groups = bc.chunk_sub_batches(
+        [sub_batch], opts.chunks, int(opts.chunk_threshold * 1e9),
+        HIST_INTEGRATION_TIME)
+    batch_files, changed = build_batch_scripts(
+        sub_batches, merge_groups, stage_in, build_dir, None, opts.writers,
+        email)
+    return sub_batches, merge_groups, batch_files, changed
+
+
+def scan_files(indir, outdir, batch_name, opts, budget=None, tuner=None):
+    """Reads the header information of the files in the input directory,
+    verifies them and takes their channel census if the options ask for it
+
+    Parameters
+    ----------
+    indir : str
+        The directory given as an input directory for the raw data
+    outdir : str
+        Name of the base output directory, which holds the scan cache
+    batch_name : str
+        Name of the overall batch
+    opts : argparse.Namespace
+        The options given on the command line
+    budget : IoBudget
+        If not None, the I/O budget the header reads wait for
+    tuner : AutoTuner
+        If not None, the autotuner that reads the file headers, it picks the
+        I/O backend and number of threads
+
+    Returns
+    -------
+    file_list : list
+        List of file names and file header info pairs, sorted by start time
+    inferred : dict
+        Dictionary mapping file names to the indices of the detector setups
+        that best match the channel census of the file's run, or None
+    """
+    cache = sc.ScanCache(sc.get_cache_path(outdir, batch_name))
+    # get the list of files and their header info, from the catalog daemon if
+    # one is running
+    file_list = None
+    if not opts.no_daemon:
+        socket_path = opts.catalog_socket
+        if socket_path is None:
+            socket_path = cs.get_socket_path(outdir)
+        file_list = cs.get_file_list(socket_path, indir, cache)
+    if file_list is None:
+        print("Getting header & timestamp info")
+        # read the headers of the files that are not cached in scan jobs
+        # spread over the cluster, the list is then built from the cache
+        if opts.scan_shards > 0:
+            ss.scan_sharded(get_data_files(indir), cache,
+                            ss.get_shard_dir(outdir, batch_name),
+                            opts.scan_shards,
+                            ss.get_executor(opts.scan_executor, opts.workers,
+                                            opts.scan_timeout))
+        file_list = get_and_sort_file_list(indir, cache, budget, tuner)
+    else:
+        print("Got header & timestamp info from the catalog daemon")
+    # copies of the same data left by re-copies or re-syncs would be
+    # processed twice
+    file_list = dup.drop_duplicate_files(file_list, opts.duplicates,
+                                         opts.drop_overlaps)
+    # walk every buffer of every file if asked to so that corrupt files are
+    # caught before the jobs are built
+    if opts.verify:
+        file_list = fv.filter_verified_files(file_list, cache, opts.checksum,
+                                             opts.workers)
+    # read the end time of every buffer to find the stalls and gaps inside
+    # files, which the split between files cannot see
+    if opts.buffer_timeline:
+        bt.report_buffer_timelines(
+            file_list, cache, opts.workers,
+            (BATCH_SPLIT_TIME_DIFF if opts.split_time is None
+             else opts.split_time))
+    # sample buffers of every file to see which channels are live and guess
+    # the detector setups from that if asked to
+    inferred = None
+    if opts.infer_setup:
+        censuses = cc.get_file_censuses(file_list, cache, opts.census_samples,
+                                        opts.workers)
+        inferred = cc.infer_setups(file_list, censuses)
+    return file_list, inferred
+
+
+def generate_sub_script(batch_files, merge_groups=(), batch_bytes=None,
+                        policy="timeline", build_dir=None, only=None):
     """This function takes the list of batch files and makes a simple batch
     script that jumps into each directory it generated, and submits the output
-    script
+    script. Jobs that depend on other jobs are submitted with the ids of those
+    jobs so the queue holds them until the jobs they need finish successfully.
+    The qsub used can be replaced by setting QSUB when running the script
 
     Parameters
     ----------
@@ -64,6 +618,21 @@ def generate_sub_script(batch_files):
         A list of the files generated for batch processing, in order they are
         Reader config file, Detector Setup File, Input List File, Queue Script
         File, and finally, the Output Directory
+    merge_groups : list
+        list of (sub batch folder, list of chunk folders) pairs, the merge
+        script of each sub batch folder is submitted to run after all of its
+        chunks finish successfully
+    batch_bytes : list
+        The number of bytes of raw data in each batch, used to order the
+        batches by the submission policy
+    policy : str
+        The order to submit the batches in, one of submit_planning.POLICIES
+    build_dir : str
+        If not None, the directory of the build job that is submitted before,
+        and waited for by, every batch
+    only : set
+        If not None, only the jobs of these directories are submitted, along
+        with the build job if any batch is submitted
 
     Returns
     -------
@@ -77,18 +646,23 @@ def generate_sub_script(batch_files):
     else:
         outfile = open("./submit_script", 'w')
         outfile.write("#!/usr/bin/bash\n")
-    for num, batch in enumerate(batch_files):
-        outfile.write("# Batch number: {0:d}\n".format(num))
-        outfile.write("cd {0:s}\n".format(batch[4]))
-        outfile.write("qsub ./batch_script\n")
+    if batch_bytes is None:
+        batch_bytes = [0] * len(batch_files)
+    jobs = sp.plan_submission([batch[4] for batch in batch_files],
+                              batch_bytes, merge_groups, policy, build_dir,
+                              only)
+    outfile.write(sp.get_submit_lines(jobs))
     outfile.close()
     return "./submit_script"
 
 
-def build_batch_scripts(sub_batches):
+def build_batch_scripts(sub_batches, merge_groups=(), stage_in=None,
+                        build_dir=None, journal=None,
+                        writers=bo.DEFAULT_WRITERS, email=None):
     """This function takes the list of sub batch data and uses it to create
     folders, orchid reader config files, and other material necessary to run
-    the first step of the analysis chain.
+    the first step of the analysis chain. The contents of every file are
+    rendered first and the directories are then written by a pool of threads
 
     Parameters
     ----------
@@ -98,6 +672,27 @@ def build_batch_scripts(sub_batches):
             ArraySetup name and object
             Run start and stop time
             Batch name and folder name
+    merge_groups : list
+        list of (sub batch folder, list of chunk folders) pairs, a merge script
+        is written in each sub batch folder
+    stage_in : tuple
+        If not None the batch scripts copy their input files to node local
+        scratch before running, the tuple holds the number of files each job
+        copies at once, the maximum number of jobs that stage at once (0 for
+        no limit) and the directory that holds the stage in slots
+    build_dir : str
+        If not None, a build script that builds a single copy of OrchidReader
+        is written to this directory and the batch scripts use that copy
+        instead of building their own
+    journal : RunJournal
+        If not None, each batch directory is recorded in the journal once it
+        is fully written and directories it already records are not written
+        again
+    writers : int
+        Number of threads used to write the directories
+    email : str
+        The email address to supply to the batch scripts, if None it is taken
+        from the journal or asked for
 
     Returns
     -------
@@ -105,77 +700,213 @@ def build_batch_scripts(sub_batches):
         A list of the tuples of the information of generated files for each
         sub_batch, including: orchid cfg file path, detector setup file path,
         orchid raw data file list, queue sub script, and output directory
+    changed : set
+        The batch, merge and build directories that had files written or
+        changed, files that already had the right contents are left untouched
     """
     out_data = []
-    email = inp.get_str("What email should failures be sent to")
+    changed = set()
+    if email is None and journal is not None:
+        email = journal.get_email()
+    if email is None:
+        email = inp.get_str("What email should failures be sent to")
+    if journal is not None:
+        journal.start_writing(email, {"stage_in": stage_in,
+                                      "build_dir": build_dir,
+                                      "merge_groups": merge_groups})
+    # the list of directories to write and the contents of their files
+    to_write = []
+    reader_bin = None
+    if build_dir is not None:
+        to_write.append((build_dir, [("build_script",
+                                      get_build_script_str(build_dir,
+                                                           email))]))
+        reader_bin = os.path.join(build_dir, "ORCHIDReader", "orchidReader")
+    # chunks after the first start part way through a run, so the first
+    # buffer of their first file is real data that must be processed
+    continued = set()
+    for _, chunk_dirs in merge_groups:
+        continued.update(chunk_dirs[1:])
     # iterate through the list of sub batches, handling each individually
     for files, setup, _, pos, folder in sub_batches:
-        # first ensure that the folder for the output exists
-        if not os.path.exists(folder[1]):
-            os.makedirs(folder[1])
-        elif not os.path.isdir(folder[1]):
-            print "Output Path Exists and is NOT a Directory"
-            print "  Unrecoverable error, run setup again with "\
-                "different base dir"
-            sys.exit()
-        # now write the raw data list file
         file_list_name = os.path.join(folder[1], "input_file_list")
-        write_file_list(file_list_name, files)
-        # now write the detector setup file
         det_setup_name = os.path.join(folder[1], "detector_setup")
-        setup[1].write_array_setup(det_setup_name)
-        # now write the config file
         cfg_name = os.path.join(folder[1], "batch_cfg")
-        write_cfg_file(cfg_name, file_list_name, det_setup_name, folder[1],
-                       pos)
         script_name = os.path.join(folder[1], "batch_script")
-        write_qsub_script(script_name, folder[1], email)
         out_data.append((cfg_name, det_setup_name, file_list_name, script_name,
                          folder[1]))
-    return out_data
+        if journal is not None and journal.is_written(folder[1]):
+            if journal.was_changed(folder[1]):
+                changed.add(folder[1])
+            continue
+        # first ensure that the folder for the output can be made
+        if os.path.exists(folder[1]) and not os.path.isdir(folder[1]):
+            print("Output Path Exists and is NOT a Directory")
+            print("  Unrecoverable error, run setup again with "
+                  "different base dir")
+            sys.exit()
+        # the raw data list file, the detector setup file, the config file
+        # and the queue script
+        contents = [
+            ("input_file_list", get_file_list_str(files)),
+            ("detector_setup", setup[1].get_array_setup_str()),
+            ("batch_cfg", get_cfg_str(
+                file_list_name, det_setup_name, folder[1], pos,
+                process_first=(True if folder[1] in continued
+                               else PROCESS_FIRST_BUFFER))),
+            ("batch_script", get_qsub_script_str(
+                folder[1], email, staged=(stage_in is not None),
+                reader_bin=reader_bin))]
+        if stage_in is not None:
+            contents.append(("stage_in",
+                             get_stage_in_script_str(folder[1], stage_in)))
+        to_write.append((folder[1], contents))
+    for batch_dir, chunk_dirs in merge_groups:
+        to_write.append((batch_dir, [("merge_script", get_merge_script_str(
+            batch_dir, chunk_dirs, email))]))
+    # the journal records the directories as the threads finish them
+    changed.update(bo.write_batch_dirs(
+        to_write, writers, (None if journal is None
+                            else journal.record_written)))
+    return out_data, changed
+
+
+def get_merge_script_str(folder, chunk_dirs, email):
+    """Gives the qsub script that combines the outputs of the chunks of a sub
+    batch into the files a single job for the sub batch would have written
+
+    Parameters
+    ----------
+    folder : str
+        The path to the sub batch directory
+    chunk_dirs : list
+        The paths to the chunk directories in order
+    email : str
+        The email address to supply to the batch script(s)
+
+    Returns
+    -------
+    script : str
+        The contents of the merge script
+    """
+    fmt_dict = {}
+    fmt_dict["email"] = email
+    fmt_dict["batch_dir"] = folder
+    fmt_dict["chunk_dirs"] = " ".join(chunk_dirs)
+    return MERGE_TMPL.format(**fmt_dict)
+
+
+def get_build_script_str(folder, email):
+    """Gives the qsub script that builds the copy of OrchidReader shared by
+    all the batch jobs
+
+    Parameters
+    ----------
+    folder : str
+        The path to the build directory
+    email : str
+        The email address to supply to the batch script(s)
+
+    Returns
+    -------
+    script : str
+        The contents of the build script
+    """
+    fmt_dict = {}
+    fmt_dict["email"] = email
+    fmt_dict["reader_dest"] = os.path.join(folder, "ORCHIDReader")
+    return BUILD_TMPL.format(**fmt_dict)
 
 
-def write_qsub_script(script_name, folder, email):
-    """Takes the name of the output script and the batch directory and writes
-    the qsub script there after asking the user for their email address
+def get_qsub_script_str(folder, email, staged=False, reader_bin=None):
+    """Takes the batch directory and gives the qsub script that runs
+    OrchidReader there
 
     Parameters
     ----------
-    script_name : str
-        The path to the file the script will be written to
     folder : str
         The path to the batch directory
     email : str
         The email address to supply to the batch script(s)
+    staged : bool
+        True if the script should run the batch's stage_in script and read the
+        local copies of the input files
+    reader_bin : str
+        If not None, the path to the OrchidReader built by the shared build
+        job, which the script copies instead of building its own
+
+    Returns
+    -------
+    script : str
+        The contents of the qsub script
     """
     fmt_dict = {}
     fmt_dict["email"] = email
     fmt_dict["reader_dest"] = os.path.join(folder, "ORCHIDReader")
     fmt_dict["batch_dir"] = folder
-    outfile = open(script_name, 'w')
-    outfile.write(SCRIPT_TMPL.format(**fmt_dict))
-    outfile.close()
+    markers = {"exit_marker": bst.EXIT_MARKER,
+               "started_marker": bst.STARTED_MARKER}
+    fmt_dict["run_reader"] = (STAGED_RUN_READER.format(**markers) if staged
+                              else RUN_READER)
+    fmt_dict["mark_started"] = MARK_STARTED.format(**markers)
+    fmt_dict["exit_marker"] = bst.EXIT_MARKER
+    fmt_dict["reader_bin"] = reader_bin
+    if reader_bin is None:
+        return SCRIPT_TMPL.format(**fmt_dict)
+    return PREBUILT_SCRIPT_TMPL.format(**fmt_dict)
+
+
+def get_stage_in_script_str(folder, stage_in):
+    """Gives the script that copies the input files of a batch to a scratch
+    directory, it can be run by hand with any directory standing in for the
+    node local scratch directory
+
+    Parameters
+    ----------
+    folder : str
+        The path to the batch directory
+    stage_in : tuple
+        The number of files to copy at once, the maximum number of jobs that
+        stage at once (0 for no limit) and the directory that holds the stage
+        in slots
+
+    Returns
+    -------
+    script : str
+        The contents of the stage in script
+    """
+    fmt_dict = {}
+    fmt_dict["batch_dir"] = folder
+    fmt_dict["copies"] = stage_in[0]
+    fmt_dict["slots"] = stage_in[1]
+    fmt_dict["slot_dir"] = stage_in[2]
+    return STAGE_IN_TMPL.format(**fmt_dict)
 
 
-def write_cfg_file(cfg_name, file_list_name, det_setup_name, folder, pos):
-    """This function takes the path of the output file, list file, det setup
-    file, and the output folder, asks the user for the position of the array
-    in this run and then writes the OrchidReader config file
+def get_cfg_str(file_list_name, det_setup_name, folder, pos,
+                process_first=True):
+    """This function takes the path of the list file, det setup file, the
+    output folder, and the position of the array in this run and gives the
+    OrchidReader config file
 
     Parameters
     ----------
-    cfg_name : str
-        The path to the config file to be written
     file_list_name : str
-        The path to the list of input files that was written
+        The path to the list of input files
     det_setup_name : str
-        The path to the detector setup file that was written
+        The path to the detector setup file
     folder : str
         the output folder for the run
     pos : tuple
         The X and Y position pair
+    process_first : bool
+        False if OrchidReader should skip the first buffer of the first file
+
+    Returns
+    -------
+    cfg : str
+        The contents of the config file
     """
-    # first get the user input for array position and integration time
     fmt_dict = {}
     fmt_dict["root_file"] = os.path.join(folder, "batch_hists.root")
     fmt_dict["batch_data_csv"] = os.path.join(folder, "batch_data.csv")
@@ -185,25 +916,26 @@ def write_cfg_file(cfg_name, file_list_name, det_setup_name, folder, pos):
     fmt_dict["array_data_in"] = det_setup_name
     fmt_dict["array_x_pos"] = pos[1][0]
     fmt_dict["array_y_pos"] = pos[1][1]
-    cfile = open(cfg_name, 'w')
-    cfile.write(CONFIG_TMPL.format(**fmt_dict))
-    cfile.close()
+    fmt_dict["process_first"] = str(process_first)
+    fmt_dict["hist_time"] = HIST_INTEGRATION_TIME
+    return CONFIG_TMPL.format(**fmt_dict)
 
 
-def write_file_list(out_name, files):
-    """This function takes an output file name and a list of files and writes
-    a list of file names to the output file name
+def get_file_list_str(files):
+    """This function takes a list of files and gives the list of file names
+    that OrchidReader reads
 
     Parameters
     ----------
-    out_name : str
-        The name of the file that will contain the list of files
+    files : list
+        list of file data tuples
+
+    Returns
+    -------
+    file_list : str
+        The contents of the input file list, one name per line
     """
-    outfile = open(out_name, 'w')
-    outfile.write("{0:s}".format(files[0][0]))
-    for fdat in files[1:]:
-        outfile.write("\n{0:s}".format(fdat[0]))
-    outfile.write("\n")
+    return "".join(["{0:s}\n".format(fdat[0]) for fdat in files])
 
 
 def get_proc_folders(outdir, sub_batches, batch_name):
@@ -226,22 +958,42 @@ def get_proc_folders(outdir, sub_batches, batch_name):
         setup for that sub batch, a begin and end time for that sub batch,
         and a sub_batch_name and sub_batch folder for that sub batch
     """
-    # short circuit for the special case of only one sub batch
-    if len(sub_batches) == 1:
-        temp = sub_batches[0]
-        return [(temp[0], temp[1], temp[2], temp[3],
-                 (batch_name, os.path.join(outdir, batch_name)))]
-    # otherwise there is more than one batch, name them
     out_batches = []
     for ind, batch in enumerate(sub_batches):
-        sub_name = "{0:s}_{1:d}".format(batch_name, ind)
-        out_path = os.path.join(outdir, sub_name)
-        out_batches.append((batch[0], batch[1], batch[2],
-                            batch[3], (sub_name, out_path)))
+        out_batches.append((batch[0], batch[1], batch[2], batch[3],
+                            get_proc_folder(outdir, batch_name, ind,
+                                            len(sub_batches) == 1)))
     return out_batches
 
 
-def check_sub_batch_info(sub_batches):
+def get_proc_folder(outdir, batch_name, ind, single):
+    """Gives the name and folder of a sub batch
+
+    Parameters
+    ----------
+    outdir : std
+        Name of the base output directory
+    batch_name : str
+        string containing the batch name of the overall batch
+    ind : int
+        The index of the sub batch
+    single : bool
+        True if the sub batch is the only one, it then gets the batch name
+
+    Returns
+    -------
+    folder : tuple
+        The sub batch name and the sub batch folder
+    """
+    # short circuit for the special case of only one sub batch
+    if single:
+        return (batch_name, os.path.join(outdir, batch_name))
+    # otherwise there is more than one batch, name them
+    sub_name = "{0:s}_{1:d}".format(batch_name, ind)
+    return (sub_name, os.path.join(outdir, sub_name))
+
+
+def check_sub_batch_info(sub_batches, journal=None):
     """Takes a list of sub batches, asks the user about them, and if the user
     desires this will allow them to modify the detector setup for that batch
 
@@ -249,11 +1001,22 @@ def check_sub_batch_info(sub_batches):
     ----------
     sub_batches : list
         list of lists where each list is a sub-batch of file data
+    journal : RunJournal
+        If not None, each review is recorded in the journal when it is
+        finished and sub batches the journal has reviews for are not asked
+        about again
     """
     count = len(sub_batches)
-    for batch, setup, times, position in sub_batches:
-        print DET_MOD_STR.format(count)
+    for index, (batch, setup, times, position) in enumerate(sub_batches):
+        if journal is not None and journal.apply_review(index, setup,
+                                                        position):
+            print("Sub batch {0:d} was reviewed in the resumed run".format(
+                index))
+            continue
+        print(DET_MOD_STR.format(count))
         check_sub_batch(batch, setup, times, position)
+        if journal is not None:
+            journal.record_review(index, setup, position)
 
 
 def check_sub_batch(batch, setup, times, pos):
@@ -274,11 +1037,11 @@ def check_sub_batch(batch, setup, times, pos):
     """
     start_time = times[0].strftime("%Y-%m-%d %H:%M:%S.%f")
     stop_time = times[1].strftime("%Y-%m-%d %H:%M:%S.%f")
-    print SUB_BATCH_INFO.format(batch[0][0], batch[-1][0], start_time,
+    print(SUB_BATCH_INFO.format(batch[0][0], batch[-1][0], start_time,
                                 stop_time, setup[0], pos[0],
-                                pos[1][0], pos[1][1])
+                                pos[1][0], pos[1][1]))
     setup[1].print_array_setup()
-    print ""
+    print("")
     ans = inp.get_yes_no("Do you wish to edit the array position",
                          default_value=False)
     while ans:
@@ -286,9 +1049,9 @@ def check_sub_batch(batch, setup, times, pos):
         ypos = inp.get_float("New Y Position")
         pos[1][0] = xpos
         pos[1][1] = ypos
-        print SUB_BATCH_INFO.format(batch[0][0], batch[-1][0], start_time,
+        print(SUB_BATCH_INFO.format(batch[0][0], batch[-1][0], start_time,
                                     stop_time, setup[0], pos[0], pos[1][0],
-                                    pos[1][1])
+                                    pos[1][1]))
         setup[1].print_array_setup()
         ans = inp.get_yes_no("Do you wish to edit the array position",
                              default_value=False)
@@ -296,234 +1059,180 @@ def check_sub_batch(batch, setup, times, pos):
                          default_value=False)
     while ans:
         setup[1].get_array_changes()
-        print SUB_BATCH_INFO.format(batch[0][0], batch[-1][0], start_time,
+        print(SUB_BATCH_INFO.format(batch[0][0], batch[-1][0], start_time,
                                     stop_time, setup[0], pos[0], pos[1][0],
-                                    pos[1][1])
+                                    pos[1][1]))
         setup[1].print_array_setup()
         ans = inp.get_yes_no("Do you wish to edit the detector setup",
                              default_value=False)
 
 
-def split_into_subbatches(file_list):
-    """Takes a list of files and the special handling data and figures out how
-    to split the files into sub-batches due to time differences or special
-    handling cases
+def get_thresholds(opts):
+    """Gives the split thresholds given on the command line
 
     Parameters
     ----------
-    file_list : list
-        List of file names and file header info pairs
+    opts : argparse.Namespace
+        The options given on the command line
 
     Returns
     -------
-    sub_batches : list
-        List where each sub_list is a set of files and file header info that
-        belongs together in a single list
+    thresholds : tuple
+        The split time, timestamp misorder, minimum timestamp and maximum
+        timestamp thresholds, None for any that were not given
     """
-    sub_batches = sb_hnd.split_sub_batches_det_setup(file_list)
-    sub_batches = sb_hnd.split_sub_batches_time(sub_batches,
-                                                BATCH_SPLIT_TIME_DIFF)
-    sub_batches = sb_hnd.split_sub_batches_position(sub_batches)
-    return sub_batches
+    return (opts.split_time, opts.ts_misorder, opts.ts_min, opts.ts_max)
 
 
-def get_and_sort_file_list(indir):
-    """Retrieves the list of files in the input directory and gather statistics
-    on them
+def split_into_subbatches(file_list, inferred=None, thresholds=None):
+    """Takes a list of files and the special handling data and figures out how
+    to split the files into sub-batches due to time differences or special
+    handling cases
 
     Parameters
     ----------
-    indir : str
-        The directory given as an input directory for the raw data
+    file_list : list
+        List of file names and file header info pairs
+    inferred : dict
+        Optional dictionary mapping file names to the indices of the detector
+        setups that best match the channel census of the file's run
+    thresholds : tuple
+        Optional split time (in place of BATCH_SPLIT_TIME_DIFF) and timestamp
+        misorder, minimum and maximum thresholds (in place of the constants
+        of sub_batch_handling), None for any that should keep its default
 
     Returns
     -------
-    file_list : list
-        A list where each sublist contains file information
+    sub_batches : list
+        List where each sub_list is a set of files and file header info that
+        belongs together in a single list
     """
-    data_files = [os.path.join(indir, fn) for fn in os.listdir(indir)
-                  if os.path.isfile(os.path.join(indir, fn))]
-    files = [[fn, get_file_header_data(fn)] for fn in data_files]
-    files.sort(key=lambda x: x[1][0])
-    return files
+    return list(iter_sub_batches(file_list, inferred, thresholds))
 
 
-def get_file_header_data(fname):
-    """Takes a file name, reads the file header data and returns date time data
+def iter_sub_batches(file_list, inferred=None, thresholds=None):
+    """Splits the files into sub batches as split_into_subbatches does, giving
+    each sub batch as soon as the files after it show it is complete, so the
+    files can be streamed through without holding more than a sub batch
 
     Parameters
     ----------
-    fname : str
-        Full path to the file
-
-    Returns
-    -------
-    date : datetime.datetime object
-        The date as stated by the file header
-    run_name: str
-        The run name as stated by the file header
-    run_num: int
-        The run number as stated by the file header
-    seq_num: int
-        The file sequence number as stated by the file header
-    mod_time: datetime.datetime object
-        The date of last modification given by the OS
-    first_ts : int
-        The timestamp of the first event in the first buffer of the file
-    last_ts : int
-        The timestamp of the last event in the last buffer of the file
+    file_list : iterable
+        File names and file header info pairs in order of start time, it is
+        only iterated over once
+    inferred : dict
+        Optional dictionary mapping file names to the indices of the detector
+        setups that best match the channel census of the file's run
+    thresholds : tuple
+        Optional split time and timestamp misorder, minimum and maximum
+        thresholds, None for any that should keep its default
+
+    Yields
+    ------
+    sub_batch : tuple
+        The files of the sub batch and its detector setup, times and position
     """
-    # first figure out what the file size is
-    size = os.path.getsize(fname)
-    if size < 2101248:
-        print "Invalid file, it has a size < 1 Buffer plus a file header"
-        print fname
-    # open as binary
-    in_file = open(fname, 'rb')
-    # check for that strange buffer header at beginning of file bug
-    remainder = ((size - FILE_HEADER_SIZE) % BUFFER_SIZE)
-    last_buf_offset = 0
-    # check for strange buffer header at beginning of file
-    if remainder >= 8192:
-        rawdata = in_file.read(4)
-        start_int = struct.unpack("<I", rawdata[0:])[0]
-        in_file.seek(0, 0)
-        if start_int == 0xf0f0f0f0:
-            last_buf_offset += 8192
-            in_file.seek(8192, 0)
-    # check if the excess size has been accounted for, if not, assume that
-    # there is also a broken buffer at the end
-    num_buffers = ((size - FILE_HEADER_SIZE - remainder) / BUFFER_SIZE)
-    last_buf_offset += FILE_HEADER_SIZE
-    last_buf_offset += (BUFFER_SIZE * (num_buffers-1))
-    # now last_buf_offset should point to the start of the last buffer
-    # now read the information from the file header
-    date, run_name, run_num, seq_num = read_file_header_info(in_file)
-    # now read the first DppPsd event of the first buffer and get its timestamp
-    first_ts = read_first_time_stamp(in_file)
-    # get the last buffer end time
-    mod_time = read_last_buffer_end(in_file, last_buf_offset)
-    # read the last DppPsd event of the last buffer and get its timestamp
-    last_ts = read_last_time_stamp(in_file)
-    in_file.close()
-    # return everything
-    return (date, run_name, run_num, seq_num, mod_time, first_ts, last_ts)
-
-
-def read_last_time_stamp(in_file):
-    """Reads the last digitizer event's timestamp in the last buffer of the
-    file
+    if thresholds is None:
+        thresholds = (None, None, None, None)
+    split_time = thresholds[0]
+    if split_time is None:
+        split_time = BATCH_SPLIT_TIME_DIFF
+    files = sb_hnd.iter_det_setup_files(file_list, inferred)
+    sub_batches = sb_hnd.iter_sub_batches_time(files, split_time,
+                                               *thresholds[1:])
+    for sub_batch in sb_hnd.iter_sub_batches_position(sub_batches):
+        yield sub_batch
 
-    Parameters
-    ----------
-    in_file : file object
-        The file object for the opened data file
 
-    Returns
-    -------
-    last_ts : int
-        the time stamp associated with the last event of the last file buffer
-    """
-    in_file.seek(8160, 1)
-    rawdata = in_file.read(2088960)
-    ind = 0
-    last_ts = -1
-    end = False
-    while not end and ind < 2088958:
-        first, second = struct.unpack("<BB", rawdata[ind:ind+2])
-        if first == 0x0f and second == 0x02:
-            lotime, hitime = struct.unpack("<IH", rawdata[ind+4:ind+10])
-            last_ts = ((hitime << 31) + lotime)
-        elif first == 0 and second == 0:
-            end = True
-            break
-        else:
-            first += (second << 8)
-        ind += first
-    return last_ts
+def get_data_files(indir):
+    """Gives the files in the input directory
 
-
-def read_last_buffer_end(in_file, last_buf_offset):
-    """Reads the final modification time of the last buffer in the file
-
-     Parameters
+    Parameters
     ----------
-    in_file : file object
-        The file object for the opened data file
-    last_buf_offset : int
-        The offset in bytes of the start of the last buffer in the file
+    indir : str
+        The directory given as an input directory for the raw data
 
     Returns
     -------
-    mod_time : datetime.datetime
-        the last modification time of the file by ORCHID
+    data_files : list
+        Full paths to the files in the input directory
     """
-    # seek to last buffer start + 24 bytes (so we point at last end buff time)
-    in_file.seek((last_buf_offset), 0)
-    rawdata = in_file.read(32)
-    # first calculate the location of the last buffer
-    timestamp = float(struct.unpack("<q", rawdata[24:])[0])/1000000.0
-    return datetime.datetime.fromtimestamp(timestamp)
+    return [os.path.join(indir, fn) for fn in os.listdir(indir)
+            if os.path.isfile(os.path.join(indir, fn))]
 
 
-def read_first_time_stamp(in_file):
-    """Reads the first digitizer event's timestamp in the first buffer of the
-    file
+def has_compressed_files(indir, codec=None):
+    """Checks if any file in the input directory is compressed, from the file
+    names alone
 
     Parameters
     ----------
-    in_file : file object
-        The file object for the opened data file
+    indir : str
+        The directory given as an input directory for the raw data
+    codec : str
+        If not None, only files compressed with this codec count
 
     Returns
     -------
-    first_ts : int
-        the time stamp associated with the first event of the first file buffer
+    compressed : bool
+        True if at least one file has the extension of a compression codec
     """
-    in_file.seek(12124, 1)  # skip remainder of file header and buffer header
-    rawdata = in_file.read(16384)
-    first_ts = -1
-    ind = 0
-    while first_ts == -1:
-        first = struct.unpack("<H", rawdata[ind:ind+2])[0]
-        if first == 527:
-            # get the timestamp
-            lotime, hitime = struct.unpack("<IH", rawdata[ind+4:ind+10])
-            first_ts = ((hitime << 31) + lotime)
-        else:
-            ind += first
-    return first_ts
+    if codec is None:
+        return any(cf.is_compressed(fname)
+                   for fname in ep.iter_data_files(indir))
+    return any(cf.get_codec(fname) == codec
+               for fname in ep.iter_data_files(indir))
 
 
-def read_file_header_info(in_file):
-    """Reads the relevant information from the file header
+def get_and_sort_file_list(indir, cache, budget=None, tuner=None):
+    """Retrieves the list of files in the input directory and gather statistics
+    on them
 
     Parameters
     ----------
-    in_file : file object
-        The file object for the opened data file
+    indir : str
+        The directory given as an input directory for the raw data
+    cache : ScanCache
+        The scan cache, files that are unchanged since they were cached are not
+        read again
+    budget : IoBudget
+        If not None, the I/O budget the header reads wait for
+    tuner : AutoTuner
+        If not None, the autotuner that reads the headers of the files that
+        are not cached, otherwise they are read one at a time with buffered
+        reads
 
     Returns
     -------
-    date : datetime.datetime
-        The datetime object representing the start of file writing
-    run_name : str
-        The name of the run
-    run_num : int
-        The number of the run
-    seq_num : int
-        The sequence number of the file
+    file_list : list
+        A list where each sublist contains file information
     """
-    # read the first 164 bytes
-    rawdata = in_file.read(164)
-    # convert the raw date string in the header
-    date = datetime.datetime.strptime(rawdata[26:56].strip('\x00'),
-                                      "%Y-%m-%dT%H:%M:%S.%f")
-    # convert the raw run name in the header
-    run_name = rawdata[56:156].strip('\x00')
-    # convert the raw run and seq numbers in the header
-    run_num, seq_num = struct.unpack("<II", rawdata[156:])
-    return (date, run_name, run_num, seq_num)
+    data_files = get_data_files(indir)
+    headers = {}
+    to_read = []
+    for fname in data_files:
+        header = cache.lookup(fname, "header")
+        if header is None:
+            to_read.append(fname)
+        else:
+            headers[fname] = sc.header_from_json(header)
+    if tuner is None:
+        tuner = iot.AutoTuner(iobk.DEFAULT_BACKEND, 1)
+    # compressed files indexed by an earlier run are not walked again, when
+    # their headers are read or when the chunks are cut by their sizes
+    cf.load_indexes(cache, data_files)
+    for fname, header in zip(to_read, tuner.read_headers(to_read, budget)):
+        # files too short or too damaged to read have no header and are left
+        # out
+        if header is not None:
+            cache.store(fname, "header", sc.header_to_json(header))
+            headers[fname] = header
+    cf.save_indexes(cache, to_read)
+    files = [[fname, headers[fname]] for fname in data_files
+             if fname in headers]
+    cache.save()
+    files.sort(key=lambda x: x[1][0])
+    return files
 
 
 def read_cmdline():
@@ -536,38 +1245,105 @@ def read_cmdline():
         String with the path of the batch input directory
     outdir : std
         String with the path of the batch processed output directory
+    opts : argparse.Namespace
+        The options given on the command line
     """
     outdir = ""
     indir = ""
-    if not len(sys.argv) in [2, 3]:  # not enough or too much input
-        print HELP_STR.format(sys.argv[0], DEFAULT_OUTDIR)
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("-h", "--help", action="store_true")
+    parser.add_argument("--verify", action="store_true")
+    parser.add_argument("--checksum", action="store_true")
+    parser.add_argument("--buffer-timeline", action="store_true")
+    parser.add_argument("--duplicates", default="largest")
+    parser.add_argument("--drop-overlaps", action="store_true")
+    parser.add_argument("--workers", type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument("--infer-setup", action="store_true")
+    parser.add_argument("--census-samples", type=int,
+                        default=cc.DEFAULT_SAMPLES)
+    parser.add_argument("--chunks", type=int, default=1)
+    parser.add_argument("--chunk-threshold", type=float, default=0.0)
+    parser.add_argument("--stage-in", action="store_true")
+    parser.add_argument("--stage-in-copies", type=int, default=4)
+    parser.add_argument("--stage-in-slots", type=int, default=0)
+    parser.add_argument("--submit-order", default="timeline")
+    parser.add_argument("--shared-build", action="store_true")
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--pipeline", action="store_true")
+    parser.add_argument("--submit-changed", action="store_true")
+    parser.add_argument("--writers", type=int, default=bo.DEFAULT_WRITERS)
+    parser.add_argument("--catalog-socket")
+    parser.add_argument("--no-daemon", action="store_true")
+    parser.add_argument("--io-rate", type=float, default=0.0)
+    parser.add_argument("--io-ops", type=float, default=0.0)
+    parser.add_argument("--drop-cache", action="store_true")
+    parser.add_argument("--io-backend", default="auto")
+    parser.add_argument("--io-workers", type=int, default=0)
+    parser.add_argument("--split-time", type=float)
+    parser.add_argument("--ts-misorder", type=int)
+    parser.add_argument("--ts-min", type=int)
+    parser.add_argument("--ts-max", type=int)
+    parser.add_argument("--memory-budget", type=float, default=0.0)
+    parser.add_argument("--scan-shards", type=int, default=0)
+    parser.add_argument("--scan-executor", default="local")
+    parser.add_argument("--scan-timeout", type=float, default=0.0)
+    opts, unknown = parser.parse_known_args()
+    if opts.help or len(unknown) != 0 or not len(opts.paths) in [1, 2] or\
+            opts.workers < 1 or opts.census_samples < 1 or opts.chunks < 1 or\
+            opts.stage_in_copies < 1 or opts.stage_in_slots < 0 or\
+            opts.submit_order not in sp.POLICIES or opts.writers < 1 or\
+            opts.duplicates not in dup.POLICIES or\
+            opts.scan_shards < 0 or opts.scan_executor not in ss.EXECUTORS or\
+            opts.scan_timeout < 0.0 or\
+            (opts.scan_shards > 0 and (opts.pipeline or
+                                       opts.memory_budget > 0.0)) or\
+            opts.io_rate < 0.0 or opts.io_ops < 0.0 or opts.io_workers < 0 or\
+            (opts.io_backend != "auto" and
+             not iobk.is_available(opts.io_backend)) or\
+            (opts.split_time is not None and opts.split_time < 0.0) or\
+            (opts.pipeline and (opts.verify or opts.infer_setup or
+                                opts.buffer_timeline)) or\
+            opts.memory_budget < 0.0 or\
+            (opts.memory_budget > 0.0 and
+             (opts.pipeline or opts.resume or opts.verify or
+              opts.infer_setup or opts.buffer_timeline or
+              opts.drop_overlaps)):
+        # not enough or too much input
+        print(HELP_STR.format(sys.argv[0], DEFAULT_OUTDIR))
         sys.exit()
     else:  # right number of arguments
         # grab the input path
-        indir = grab_and_test_input_dir()
+        indir = grab_and_test_input_dir(opts.paths[0])
         # check if we need to calculate the output path
-        if len(sys.argv) == 2:
+        if len(opts.paths) == 1:
             # use default output base directory
             outdir = DEFAULT_OUTDIR
-        elif len(sys.argv) == 3:
+        elif len(opts.paths) == 2:
             # grab the output directory
-            outdir = trim_trailing_slash(sys.argv[2])
+            outdir = trim_trailing_slash(opts.paths[1])
         # test the output directory
         if not os.path.exists(outdir):
-            print "Creating output directory:", outdir
+            print("Creating output directory:", outdir)
             os.makedirs(outdir)
         elif not os.path.isdir(outdir):
-            print "\n  BatchOutputBaseDirectory should be a directory or"\
-                  "nonexistent"
-            print HELP_STR.format(sys.argv[0], DEFAULT_OUTDIR)
+            print("\n  BatchOutputBaseDirectory should be a directory or"
+                  "nonexistent")
+            print(HELP_STR.format(sys.argv[0], DEFAULT_OUTDIR))
             sys.exit()
     # return the input directory and output directory
-    return indir, outdir
+    return indir, outdir, opts
 
 
-def grab_and_test_input_dir():
+def grab_and_test_input_dir(indir):
     """Reads and tests the input directory
 
+    Parameters
+    ----------
+    indir : str
+        String with the input directory given on the command line
+
     Returns
     -------
     indir : str
@@ -575,12 +1351,11 @@ def grab_and_test_input_dir():
     tail : str
         String with the last part of the indir path
     """
-    indir = sys.argv[1]
     indir = trim_trailing_slash(indir)
     # test if the directory exists
     if not os.path.isdir(indir):
-        print "\n  BatchInputDirectory needs to be a directory\n"
-        print HELP_STR.format(sys.argv[0], DEFAULT_OUTDIR)
+        print("\n  BatchInputDirectory needs to be a directory\n")
+        print(HELP_STR.format(sys.argv[0], DEFAULT_OUTDIR))
         sys.exit()
     return indir
 
@@ -610,6 +1385,7 @@ SCRIPT_TMPL = """
 #PBS -M {email:s}
 READER_DEST={reader_dest:s}
 BATCH_DIR={batch_dir:s}
+{mark_started:s}
 # copy the source code for orchid reader
 cp -r $ORCHID_READER_SRC $READER_DEST
 cd $READER_DEST
@@ -618,7 +1394,8 @@ make release
 cd $BATCH_DIR
 cp $READER_DEST/orchidReader ./orchidReader
 # after moving our copy to the primary dir, run it
-./orchidReader batch_cfg
+{run_reader:s}
+echo $? > $BATCH_DIR/{exit_marker:s}
 chmod -R 774 $BATCH_DIR
 # delete our copy of ORCHID Reader
 rm -rf $READER_DEST
@@ -626,6 +1403,177 @@ rm orchidReader
 """
 
 
+PREBUILT_SCRIPT_TMPL = """
+#!/bin/bash
+#PBS -M {email:s}
+BATCH_DIR={batch_dir:s}
+{mark_started:s}
+cd $BATCH_DIR
+# copy the orchid reader built by the shared build job
+cp {reader_bin:s} ./orchidReader
+{run_reader:s}
+echo $? > $BATCH_DIR/{exit_marker:s}
+chmod -R 774 $BATCH_DIR
+# delete our copy of ORCHID Reader
+rm orchidReader
+"""
+
+
+BUILD_TMPL = """
+#!/bin/bash
+#PBS -M {email:s}
+READER_DEST={reader_dest:s}
+# copy the source code for orchid reader and build the copy every batch uses
+rm -rf $READER_DEST
+cp -r $ORCHID_READER_SRC $READER_DEST
+cd $READER_DEST
+make release
+"""
+
+
+RUN_READER = "./orchidReader batch_cfg"
+
+
+STAGED_RUN_READER = """# copy the input files to node local scratch and read them from
+# there
+SCRATCH_DIR=${{ORSS_SCRATCH:-$TMPDIR}}/orss_stage_$$
+trap "$BATCH_DIR/stage_in --cleanup $SCRATCH_DIR" EXIT
+if ! $BATCH_DIR/stage_in $SCRATCH_DIR
+then
+    echo stage_in > $BATCH_DIR/{exit_marker:s}
+    exit 1
+fi
+./orchidReader $SCRATCH_DIR/batch_cfg"""
+
+
+# the job records that it started and a hash of the sizes and modification
+# times of its input files, which orchid_batch_status.py compares with the
+# files as they are now
+MARK_STARTED = """rm -f $BATCH_DIR/{exit_marker:s}
+while IFS= read -r IN_FILE
+do
+    stat -c '%n %s %Y' "$IN_FILE" 2> /dev/null
+done < $BATCH_DIR/input_file_list | md5sum | cut -d ' ' -f 1 \\
+    > $BATCH_DIR/{started_marker:s}"""
+
+
+STAGE_IN_TMPL = """#!/bin/bash
+# Copies the input files of this batch to a scratch directory, decompressing
+# compressed files, checks the sizes of the copies, and writes an input file
+# list and config file that use them
+#   stage_in SCRATCH_DIR            stage the files into SCRATCH_DIR
+#   stage_in --cleanup SCRATCH_DIR  remove SCRATCH_DIR
+BATCH_DIR={batch_dir:s}
+COPIES={copies:d}
+SLOTS={slots:d}
+SLOT_DIR={slot_dir:s}
+if [ "$1" == "--cleanup" ]
+then
+    rm -rf "$2"
+    exit 0
+fi
+SCRATCH_DIR=$1
+mkdir -p $SCRATCH_DIR || exit 1
+# wait for one of the stage in slots shared by all the jobs, slots left behind
+# by killed jobs are freed after two hours
+SLOT=""
+if [ $SLOTS -gt 0 ]
+then
+    mkdir -p $SLOT_DIR
+    while [ -z "$SLOT" ]
+    do
+        find $SLOT_DIR -maxdepth 1 -name 'slot_*' -mmin +120 \\
+            -exec rmdir {{}} \\; 2> /dev/null
+        for NUM in $(seq 0 $(($SLOTS - 1)))
+        do
+            if mkdir $SLOT_DIR/slot_$NUM 2> /dev/null
+            then
+                SLOT=$SLOT_DIR/slot_$NUM
+                trap "rmdir $SLOT" EXIT
+                break
+            fi
+        done
+        if [ -z "$SLOT" ]
+        then
+            sleep 15
+        fi
+    done
+fi
+# copy the files, COPIES at a time, decompressing the compressed files since
+# the reader only reads raw files
+stage_file() {{
+    case "$1" in
+        *.gz) gzip -dc "$1" > "$2/$(basename "$1" .gz)" ;;
+        *.bz2) bzip2 -dc "$1" > "$2/$(basename "$1" .bz2)" ;;
+        *.xz) xz -dc "$1" > "$2/$(basename "$1" .xz)" ;;
+        *) cp "$1" "$2/" ;;
+    esac
+}}
+export -f stage_file
+xargs -P $COPIES -I {{}} bash -c 'stage_file "$1" "$2"' stage_file {{}} \\
+    $SCRATCH_DIR < $BATCH_DIR/input_file_list || exit 1
+if [ -n "$SLOT" ]
+then
+    rmdir $SLOT
+    trap - EXIT
+fi
+# check the copies and write the list of local files, the decompressed files
+# were checked by the decompressors
+rm -f $SCRATCH_DIR/input_file_list
+while read IN_FILE
+do
+    case "$IN_FILE" in
+        *.gz|*.bz2|*.xz)
+            echo $SCRATCH_DIR/$(basename ${{IN_FILE%.*}}) \\
+                >> $SCRATCH_DIR/input_file_list
+            continue ;;
+    esac
+    LOCAL_FILE=$SCRATCH_DIR/$(basename $IN_FILE)
+    if [ "$(stat -c %s $IN_FILE)" != "$(stat -c %s $LOCAL_FILE)" ]
+    then
+        echo "Staged copy of $IN_FILE has the wrong size" >&2
+        exit 1
+    fi
+    echo $LOCAL_FILE >> $SCRATCH_DIR/input_file_list
+done < $BATCH_DIR/input_file_list
+# point a copy of the config file at the local list
+sed "s#^ListFilePath=.*#ListFilePath=\\"$SCRATCH_DIR/input_file_list\\"#" \\
+    $BATCH_DIR/batch_cfg > $SCRATCH_DIR/batch_cfg
+"""
+
+
+MERGE_TMPL = """
+#!/bin/bash
+#PBS -M {email:s}
+BATCH_DIR={batch_dir:s}
+CHUNK_DIRS="{chunk_dirs:s}"
+cd $BATCH_DIR
+# concatenate the csv files of the chunks in order, dropping the repeats of the
+# first chunk's header line
+for CSV in batch_data.csv det_meta_data.csv run_data.csv
+do
+    CSV_FILES=""
+    for CHUNK_DIR in $CHUNK_DIRS
+    do
+        CSV_FILES="$CSV_FILES $CHUNK_DIR/$CSV"
+    done
+    awk 'NR==1 {{hdr=$0}} FNR==1 && NR!=1 && $0==hdr {{next}} {{print}}' \\
+        $CSV_FILES > $BATCH_DIR/$CSV
+done
+# add the histograms of the chunks together if root's hadd is available
+if command -v hadd > /dev/null 2>&1
+then
+    ROOT_FILES=""
+    for CHUNK_DIR in $CHUNK_DIRS
+    do
+        ROOT_FILES="$ROOT_FILES $CHUNK_DIR/batch_hists.root"
+    done
+    hadd -f $BATCH_DIR/batch_hists.root $ROOT_FILES
+fi
+chmod -R 774 $BATCH_DIR
+"""
+
+
 CONFIG_TMPL = """[StartConfig]
 # This area has the list of files that will have data output to them or
 # the option to activate and deactivate certain outputs
@@ -683,10 +1631,10 @@ ArrayYPosition={array_y_pos:4.1f} #Normal=74.0  Out of the way=279.0 or -124.0
 # exclusively anyways, this variable allows the system to skip the first buffer
 # of the first file in its scan, if it is true, the buffer is processed, if it
 # is false, the buffer is skipped
-ProcessFirstBuffer = True
+ProcessFirstBuffer = {process_first:s}
 
 # this is the nominal number of seconds to integrate files for
-HistIntegrationTime=600.0
+HistIntegrationTime={hist_time:.1f}
 
 # The channel buffer length needs to be long enough that the number of events
 # that are produced by the detector across the length of time that it takes for
@@ -716,6 +1664,21 @@ Det Setup Name: {4:s}
 Detector Setup:"""
 
 
+PIPELINE_REVIEW_STR = """
+Sub batch {0:d} is ready to review, {1:d} of {2:d} files have been read
+  Information about the batches will be displayed one by one while the rest of
+  the files are read. You will be able to see more complete information and
+  modify detector setups per batch"""
+
+
+EXTERNAL_REVIEW_STR = """
+Sub batch {0:d} is ready to review
+  Information about the batches will be displayed one by one as they are
+  split from the files sorted on disk, each is written once it is reviewed.
+  You will be able to see more complete information and modify detector setups
+  per batch"""
+
+
 DET_MOD_STR = """
 Found {0:d} batches in the folder
   Information about the batches will be displayed one by one. You will be
@@ -724,9 +1687,118 @@ Found {0:d} batches in the folder
 
 HELP_STR = """
 Usage:
-  {0:s} BatchInputDirectory [BatchOutputDirectory]
+  {0:s} [Options] BatchInputDirectory [BatchOutputDirectory]
   The default output root directory is: {1:s}
 
+ Options:
+  --verify       Walk every buffer of every file, checking buffer headers and
+                 event chains, before any jobs are generated
+  --checksum     With --verify, also calculate a checksum of every file
+  --buffer-timeline
+                 Read the end time of every buffer of every file and report
+                 the stalls and gaps inside files
+  --infer-setup  Sample buffers of every file to see which digitizer
+                 channels have events and use that to guess the detector setup
+                 of files that are not listed in setup_changes.py
+  --census-samples N
+                 Number of buffers sampled per file by --infer-setup
+                 (default: 4)
+  --duplicates POLICY
+                 Which copy to keep of files with the same run name, run
+                 number and sequence number: largest, newest, or keep to
+                 keep every copy (default: largest). With --memory-budget
+                 only files with the same start time are compared, which
+                 every copy of a file shares
+  --drop-overlaps
+                 Also treat files of the same run whose timestamps and times
+                 largely coincide as copies, to catch copies renamed with
+                 another sequence number (cannot be used with
+                 --memory-budget)
+  --workers N    Number of processes used by --verify, --buffer-timeline
+                 and --infer-setup (default: CPU count)
+  --writers N    Number of threads that write the batch directories
+                 (default: 8)
+  --chunks N     Cut each sub batch into N chunk jobs that run at the same
+                 time, with a merge job that runs after them (default: 1)
+  --chunk-threshold GB
+                 Only cut sub batches with more than this many GB of data
+                 (default: 0)
+  --stage-in     Have each job copy its input files to node local scratch
+                 ($ORSS_SCRATCH or $TMPDIR) before running OrchidReader,
+                 compressed files (.gz, .bz2, .xz) are decompressed there,
+                 turned on if any input file is compressed
+  --stage-in-copies N
+                 Number of files each job copies at once (default: 4)
+  --stage-in-slots N
+                 Maximum number of jobs copying files at once, 0 for no limit
+                 (default: 0)
+  --submit-order POLICY
+                 Order submit_script submits the batches in, timeline (the
+                 order of the data), longest-first or shortest-first by the
+                 bytes of data in each batch (default: timeline)
+  --shared-build Build OrchidReader once in a build job that every batch job
+                 waits for, instead of building it in every batch job
+  --submit-changed
+                 Only put the batches that are new or changed since the last
+                 run in submit_script
+  --pipeline     Read the file headers in the background and ask about each
+                 sub batch, and write it, as soon as it is known to be final
+                 (cannot be used with --verify, --buffer-timeline or
+                 --infer-setup)
+  --resume       Continue an interrupted run from the run journal in the
+                 output directory, without reading the data files again or
+                 repeating the sub batch reviews already answered
+  --catalog-socket PATH
+                 Socket of the catalog daemon to get the file headers from
+                 (default: BatchOutputDirectory/.orss_catalog.sock), the files
+                 are read directly if no daemon is running
+  --no-daemon    Read the file headers directly even if a catalog daemon is
+                 running
+  --io-rate MB/s Largest rate to read the file headers at, so that scanning a
+                 directory the DAQ is writing to leaves it the disk bandwidth
+                 it needs, 0 for no limit (default: 0)
+  --io-ops N     Largest number of reads per second when reading the file
+                 headers, 0 for no limit (default: 0)
+  --drop-cache   Drop each file from the page cache once its header has been
+                 read
+  --io-backend NAME
+                 How the file headers are read, buffered (file reads), pread
+                 (os.pread, Python 3 only), mmap (memory map) or auto to pick
+                 the fastest on the first files read (default: auto)
+  --io-workers N Number of threads reading file headers at once, 0 to pick
+                 the fastest on the first files read (default: 0)
+  --split-time SEC
+                 Split the files into sub batches at gaps longer than this
+                 (default: 120)
+  --ts-misorder N, --ts-min N, --ts-max N
+                 Timestamp thresholds used to find timestamp resets, in place
+                 of those in sub_batch_handling.py, orchid_split_sweep.py
+                 shows the effect of changing them and --split-time
+  --memory-budget MB
+                 Plan with memory use bounded by about MB megabytes instead
+                 of the number of files, for campaigns too large to hold in
+                 memory. The file headers are sorted on disk and each sub
+                 batch is reviewed and written as soon as it is split. Cannot
+                 be used with --pipeline, --resume, --verify,
+                 --buffer-timeline, --infer-setup or --drop-overlaps
+                 (default: 0, plan in memory)
+  --scan-shards N
+                 Read the headers of the files that are not in the scan cache
+                 in N scan jobs, each writing a fragment that is merged into
+                 the scan cache here, instead of reading them all here
+                 (default: 0, cannot be used with --pipeline or
+                 --memory-budget)
+  --scan-executor NAME
+                 Where the --scan-shards jobs run, pbs to submit them as a
+                 PBS job array or local to run them as processes on this
+                 machine, --workers at once (default: local)
+  --scan-timeout HOURS
+                 Delete the PBS job array of --scan-shards if it has not
+                 finished after HOURS and read the files of the unfinished
+                 shards here, 0 for no limit (default: 0). Shards left
+                 without an exit status once the array leaves the queue are
+                 read here too
+
  Ex:
   {0:s} /data1/prospect/Data/ORCHID_Data/Batch7
    Calculates BatchOutputDirectory to be: {1:s}/Batch7
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+"""This script reads the headers of the files of one shard of a sharded
+header scan and writes them to the shard's fragment, it is what each scan job
+started by orchid_reader_simple_setup.py --scan-shards runs"""
+from __future__ import print_function
+import os
+import sys
+import argparse
+from orsslib import sharded_scan as ss
+
+
+def main():
+    """Entry point for the script"""
+    opts = read_cmdline()
+    if not os.path.isfile(ss.get_list_path(opts.shard_dir, opts.index)):
+        print("Could not find the file list of shard", opts.index, "in",
+              opts.shard_dir)
+        sys.exit(1)
+    num_files = ss.scan_shard(opts.shard_dir, opts.index)
+    print("Read the headers of", num_files, "files of shard", opts.index)
+
+
+def read_cmdline():
+    """Reads command line parameters and returns the shard to scan
+
+    Returns
+    -------
+    opts : argparse.Namespace
+        The options given on the command line
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("shard_dir", nargs="?")
+    parser.add_argument("index", nargs="?", type=int)
+    parser.add_argument("-h", "--help", action="store_true")
+    try:
+        opts, unknown = parser.parse_known_args()
+    except SystemExit:
+        print(HELP_STR.format(sys.argv[0]))
+        sys.exit(1)
+    if opts.help or len(unknown) != 0 or opts.index is None or\
+            opts.index < 0:
+        print(HELP_STR.format(sys.argv[0]))
+        sys.exit(1)
+    return opts
+
+
+HELP_STR = """
+Usage:
+  {0:s} ShardDir Index
+  ShardDir is the shard directory of a sharded header scan and Index the
+  number of the shard, the headers of the files in ShardDir/shard_Index.list
+  are read and written to ShardDir/shard_Index.json
+
+  This is run by the scan jobs of orchid_reader_simple_setup.py --scan-shards
+  and is not usually run by hand
+
+ Ex:
+  {0:s} /data/out/.orss_cache/Batch7_shards 3
+   Reads the headers of the files of shard 3 of the scan of Batch7
+"""
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/python
+"""This script loads the scanned file list of a batch written by
+orchid_reader_simple_setup and shows how the files would be split into sub
+batches for a grid of split thresholds, so the thresholds can be tuned
+without running the setup again for each setting"""
+from __future__ import print_function
+import sys
+import time
+import itertools
+import argparse
+import orchid_reader_simple_setup as orss
+from orsslib import split_sweep as ss
+
+
+def main():
+    """Entry point for the script"""
+    outdir, batch_name, opts = read_cmdline()
+    file_list, inferred, source = ss.load_file_list(outdir, batch_name)
+    if file_list is None or len(file_list) == 0:
+        print("No scanned files found for", batch_name, "in", outdir)
+        sys.exit()
+    print("Loaded", len(file_list), "files from", source)
+    start = time.time()
+    # the splits by detector setup and position do not change with the
+    # thresholds, a split that never splits on time gives just those
+    fixed = ss.get_boundaries(orss.split_into_subbatches(
+        file_list, inferred, (float("inf"), float("inf"), None, None)))
+    sweep = ss.SplitSweep(file_list, fixed)
+    current = ss.get_default_thresholds(orss.BATCH_SPLIT_TIME_DIFF)
+    current_bounds = sweep.evaluate(*current)
+    grid = list(itertools.product(
+        (opts.split_time if opts.split_time is not None else [current[0]]),
+        (opts.ts_misorder if opts.ts_misorder is not None else [current[1]]),
+        (opts.ts_min if opts.ts_min is not None else [current[2]]),
+        (opts.ts_max if opts.ts_max is not None else [current[3]])))
+    results = [(thresholds, sweep.evaluate(*thresholds))
+               for thresholds in grid]
+    elapsed = time.time() - start
+    print("Current settings:", SETTING_FMT.format(*current))
+    print(RESULT_HEADER)
+    for thresholds, bounds in results:
+        print_result(sweep, thresholds, bounds, current, current_bounds,
+                     opts.verbose)
+    print("Evaluated {0:d} settings in {1:.2f} s".format(len(grid), elapsed))
+
+
+def print_result(sweep, thresholds, bounds, current, current_bounds,
+                 verbose):
+    """Prints the split given by one setting of the thresholds
+
+    Parameters
+    ----------
+    sweep : SplitSweep
+        The sweep the setting was evaluated with
+    thresholds : tuple
+        The split time, misorder, minimum and maximum timestamp thresholds
+    bounds : set
+        The boundaries of the split with the thresholds
+    current : tuple
+        The thresholds of the current settings
+    current_bounds : set
+        The boundaries of the split with the current settings
+    verbose : bool
+        True if the boundaries that differ from the current split should be
+        printed
+    """
+    sizes = sweep.get_batch_sizes(bounds)
+    files = ss.get_distribution([size[0] for size in sizes])
+    hours = ss.get_distribution([size[1] for size in sizes])
+    added = sorted(bounds - current_bounds)
+    removed = sorted(current_bounds - bounds)
+    print(RESULT_FMT.format(
+        ("*" if tuple(thresholds) == tuple(current) else " "),
+        SETTING_FMT.format(*thresholds), len(sizes),
+        "{0:d}/{1:d}/{2:d}".format(*files),
+        "{0:.1f}/{1:.1f}/{2:.1f}".format(*hours), len(added), len(removed)))
+    if verbose:
+        for ind in added:
+            print("      + split before", sweep.file_list[ind][0])
+        for ind in removed:
+            print("      - no split before", sweep.file_list[ind][0])
+
+
+def float_list(value):
+    """Converts a comma separated list of numbers for argparse
+
+    Parameters
+    ----------
+    value : str
+        The string from the command line
+
+    Returns
+    -------
+    values : list
+        The list of floats
+    """
+    return [float(val) for val in value.split(",")]
+
+
+def ts_list(value):
+    """Converts a comma separated list of timestamp thresholds for argparse,
+    the thresholds can be written like 5e9
+
+    Parameters
+    ----------
+    value : str
+        The string from the command line
+
+    Returns
+    -------
+    values : list
+        The list of integers
+    """
+    return [int(float(val)) for val in value.split(",")]
+
+
+def read_cmdline():
+    """Reads command line parameters and returns the output directory, the
+    batch name and the sweep options
+
+    Returns
+    -------
+    outdir : str
+        The base output directory
+    batch_name : str
+        The name of the batch (the name of its input directory)
+    opts : argparse.Namespace
+        The options given on the command line
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("-h", "--help", action="store_true")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    parser.add_argument("--split-time", type=float_list)
+    parser.add_argument("--ts-misorder", type=ts_list)
+    parser.add_argument("--ts-min", type=ts_list)
+    parser.add_argument("--ts-max", type=ts_list)
+    try:
+        opts, unknown = parser.parse_known_args()
+    except SystemExit:
+        print(HELP_STR.format(sys.argv[0]))
+        sys.exit()
+    if opts.help or len(unknown) != 0 or len(opts.paths) != 2 or\
+            (opts.split_time is not None and min(opts.split_time) < 0.0):
+        print(HELP_STR.format(sys.argv[0]))
+        sys.exit()
+    return orss.trim_trailing_slash(opts.paths[0]), opts.paths[1], opts
+
+
+SETTING_FMT = "{0:8.1f} {1:15d} {2:15d} {3:15d}"
+
+RESULT_HEADER = """  SplitTime     Misorder(ts)       MinTs(ts)       MaxTs(ts) Batches Files min/med/max Hours min/med/max Added Removed
+  --------- --------------- --------------- --------------- ------- ----------------- ----------------- ----- -------"""
+
+RESULT_FMT = "{0:s} {1:s} {2:7d} {3:>17s} {4:>17s} {5:5d} {6:7d}"
+
+
+HELP_STR = """
+Usage:
+  {0:s} [Options] OutputDir BatchName
+  OutputDir is the base output directory given to
+  orchid_reader_simple_setup.py and BatchName the name of the input directory.
+  The scanned files are loaded from its run journal, or its scan cache, and
+  split into sub batches for every combination of the thresholds given. The
+  number of batches, the smallest, median and largest batch in files and in
+  hours, and the number of splits added and removed compared to the current
+  settings (marked with *) are printed for each combination
+
+ Options:
+  --split-time SEC[,SEC...]  Gaps between files, in seconds, that split the
+                             files (default: the current setting, 120)
+  --ts-misorder N[,N...]     Timestamp misorder thresholds (default:
+                             TS_MISORDER_THRESH)
+  --ts-min N[,N...]          Minimum timestamp thresholds of a rollover
+                             (default: MIN_TS_THRESH)
+  --ts-max N[,N...]          Maximum timestamp thresholds of a rollover
+                             (default: MAX_TS_THRESH)
+  -v, --verbose              List the files where the splits differ from the
+                             current settings
+
+ Ex:
+  {0:s} --split-time 60,120,300,600 --ts-misorder 1e9,5e9 /data/out Batch7
+   Shows the splits of Batch7 for 8 combinations of the thresholds, any of
+   them can then be used with the same options of
+   orchid_reader_simple_setup.py
+"""
+
+if __name__ == "__main__":
+    main()
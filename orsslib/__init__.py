@@ -5,3 +5,28 @@ import orsslib.setup_changes as setup_changes
 import orsslib.position_changes as position_changes
 import orsslib.sub_batch_handling as sub_batch_handling
 import orsslib.input_sanitizer as input_sanitizer
+import orsslib.header_readers as header_readers
+import orsslib.scan_cache as scan_cache
+import orsslib.file_verification as file_verification
+import orsslib.channel_census as channel_census
+import orsslib.batch_chunking as batch_chunking
+import orsslib.batch_manifest as batch_manifest
+import orsslib.queue_simulation as queue_simulation
+import orsslib.submit_planning as submit_planning
+import orsslib.run_journal as run_journal
+import orsslib.batch_output as batch_output
+import orsslib.background_scan as background_scan
+import orsslib.run_catalog as run_catalog
+import orsslib.catalog_service as catalog_service
+import orsslib.io_budget as io_budget
+import orsslib.split_sweep as split_sweep
+import orsslib.io_backends as io_backends
+import orsslib.io_autotune as io_autotune
+import orsslib.orchid_format as orchid_format
+import orsslib.compressed_files as compressed_files
+import orsslib.external_plan as external_plan
+import orsslib.result_harvest as result_harvest
+import orsslib.batch_status as batch_status
+import orsslib.buffer_timeline as buffer_timeline
+import orsslib.duplicate_files as duplicate_files
+import orsslib.sharded_scan as sharded_scan
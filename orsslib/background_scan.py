@@ -0,0 +1,140 @@
+"""This file contains the background scanner used by the pipelined mode, it
+reads the file headers in a separate thread, in the order the files were last
+modified, so that the sub batches at the start of the data can be reviewed
+while the rest of the files are still being read"""
+import os
+import datetime
+import threading
+import orsslib.compressed_files as cf
+import orsslib.header_readers as hr
+import orsslib.io_backends as iobk
+import orsslib.scan_cache as sc
+
+# a file that has not been read yet is assumed to start no earlier than its
+# modification time minus this many times the longest time any file read so
+# far took to write
+DURATION_MARGIN = 2.0
+
+
+class BackgroundScanner(object):
+    """This class reads the headers of the files of an input directory in a
+    background thread and gives snapshots of the files read so far"""
+    def __init__(self, indir, cache, budget=None,
+                 backend=iobk.DEFAULT_BACKEND):
+        """Lists the files of the input directory and orders them by their
+        modification times
+
+        Parameters
+        ----------
+        indir : str
+            The directory given as an input directory for the raw data
+        cache : ScanCache
+            The scan cache, only the background thread uses it once the scan
+            has started
+        budget : IoBudget
+            If not None, the I/O budget the header reads wait for
+        backend : str
+            The name of the I/O backend the headers are read with
+        """
+        self.cache = cache
+        self.budget = budget
+        self.backend = backend
+        self.files = []
+        for fname in os.listdir(indir):
+            path = os.path.join(indir, fname)
+            if os.path.isfile(path):
+                self.files.append((datetime.datetime.fromtimestamp(
+                    os.path.getmtime(path)), path))
+        self.files.sort()
+        self.scanned = []
+        # the number of files read, including those left out of scanned
+        self.num_read = 0
+        self.max_duration = datetime.timedelta(0)
+        self.error = None
+        self.lock = threading.Lock()
+        self.updated = threading.Event()
+        self.thread = threading.Thread(target=self.scan_files)
+        self.thread.daemon = True
+
+    def start(self):
+        """Starts reading the files in the background"""
+        self.thread.start()
+
+    def scan_files(self):
+        """Reads the header of every file, this is run by the background
+        thread"""
+        try:
+            for mtime, fname in self.files:
+                # the seek index of a compressed file is needed to read its
+                # header and to cut the chunks by its size
+                cf.load_indexes(self.cache, [fname])
+                header = self.cache.lookup(fname, "header")
+                if header is None:
+                    header = hr.get_file_header_data(fname, self.budget,
+                                                     self.backend)
+                    if header is not None:
+                        self.cache.store(fname, "header",
+                                         sc.header_to_json(header))
+                    cf.save_indexes(self.cache, [fname])
+                else:
+                    header = sc.header_from_json(header)
+                with self.lock:
+                    self.num_read += 1
+                    # files too short or too damaged to read are left out
+                    if header is not None:
+                        self.scanned.append([fname, header])
+                        self.max_duration = max(self.max_duration,
+                                                mtime - header[0])
+                self.updated.set()
+            self.cache.save()
+        except Exception as err:
+            self.error = err
+        self.updated.set()
+
+    def get_snapshot(self):
+        """Gives the files read so far and the earliest start time that any
+        file that has not been read yet is expected to have
+
+        Returns
+        -------
+        file_list : list
+            List of file names and file header info pairs read so far, sorted
+            by start time
+        safe_time : datetime.datetime
+            Files that start before this time are expected to be a complete
+            prefix of the sorted file list, None once every file is read
+        num_files : int
+            The total number of files being read
+        """
+        self.updated.clear()
+        with self.lock:
+            file_list = list(self.scanned)
+            next_file = self.num_read
+            margin = self.max_duration
+        file_list.sort(key=lambda x: x[1][0])
+        if next_file == len(self.files):
+            return file_list, None, len(self.files)
+        safe_time = self.files[next_file][0] -\
+            datetime.timedelta(seconds=(DURATION_MARGIN *
+                                        margin.total_seconds()))
+        return file_list, safe_time, len(self.files)
+
+    def wait(self, timeout):
+        """Waits until another file has been read or the timeout passes
+
+        Parameters
+        ----------
+        timeout : float
+            Maximum number of seconds to wait
+        """
+        self.updated.wait(timeout)
+
+    def is_done(self):
+        """Checks if the background thread has finished
+
+        Returns
+        -------
+        done : bool
+            True if every file has been read or reading failed
+        """
+        return not self.thread.is_alive()
@@ -0,0 +1,123 @@
+"""This file contains the functions that cut large sub batches into several
+chunks that can be processed by separate OrchidReader jobs at the same time"""
+import os
+import orsslib.compressed_files as cf
+
+
+def get_batch_bytes(files):
+    """Gives the total size of the files in a sub batch
+
+    Parameters
+    ----------
+    files : list
+        list of file data tuples
+
+    Returns
+    -------
+    total : int
+        Total size in bytes of the files, uncompressed
+    """
+    return sum([cf.get_data_size(fdat[0]) for fdat in files])
+
+
+def find_chunk_starts(files, num_chunks, integration_time):
+    """Picks the files that each chunk after the first starts with. The cuts
+    are placed near equal shares of the sub batch's bytes, at the file whose
+    start time is closest to a whole number of histogram integration periods
+    after the start of the sub batch, so that the integration periods of the
+    chunks line up with the ones a single job would have used
+
+    Parameters
+    ----------
+    files : list
+        list of file data tuples
+    num_chunks : int
+        The number of chunks to cut the sub batch into
+    integration_time : float
+        The HistIntegrationTime in seconds that OrchidReader is configured with
+
+    Returns
+    -------
+    starts : list
+        Sorted list of the indices of the first file of each chunk, the first
+        chunk (index 0) included
+    """
+    num_chunks = min(num_chunks, len(files))
+    # compressed files are weighed by the data the reader will go through
+    sizes = [cf.get_data_size(fdat[0]) for fdat in files]
+    total = float(sum(sizes))
+    # cumulative bytes before each file
+    before = []
+    running = 0
+    for size in sizes:
+        before.append(running)
+        running += size
+    batch_start = files[0][1]
+    window = max(1, len(files) // (4 * num_chunks))
+    starts = [0]
+    for cut in range(1, num_chunks):
+        target = total * cut / num_chunks
+        ideal = min(range(len(files)), key=lambda x: abs(before[x] - target))
+        # keep at least one file in every chunk
+        low = max(starts[-1] + 1, ideal - window)
+        high = min(len(files) - (num_chunks - cut), ideal + window)
+        if low > high:
+            low = high = max(starts[-1] + 1, min(ideal, high))
+        best = None
+        best_key = None
+        for ind in range(low, high + 1):
+            phase = (files[ind][1] - batch_start).total_seconds() %\
+                integration_time
+            key = (min(phase, integration_time - phase), abs(ind - ideal))
+            if best_key is None or key < best_key:
+                best = ind
+                best_key = key
+        starts.append(best)
+    return starts
+
+
+def chunk_sub_batches(sub_batches, num_chunks, min_bytes, integration_time):
+    """Cuts every sub batch with more than min_bytes of data (and enough files)
+    into num_chunks chunks, each of which gets its own folder inside the sub
+    batch's folder
+
+    Parameters
+    ----------
+    sub_batches : list
+        list of sub batch tuples as returned by get_proc_folders
+    num_chunks : int
+        The number of chunks to cut each large sub batch into
+    min_bytes : int
+        Sub batches with this many bytes or fewer are not cut
+    integration_time : float
+        The HistIntegrationTime in seconds that OrchidReader is configured with
+
+    Returns
+    -------
+    out_batches : list
+        list of sub batch tuples with the chunks in place of the sub batches
+        that were cut
+    merge_groups : list
+        list of (sub batch folder, list of chunk folders) pairs, one for each
+        sub batch that was cut
+    """
+    out_batches = []
+    merge_groups = []
+    for files, setup, times, pos, folder in sub_batches:
+        if num_chunks < 2 or len(files) < 2 or\
+                get_batch_bytes(files) <= min_bytes:
+            out_batches.append((files, setup, times, pos, folder))
+            continue
+        starts = find_chunk_starts(files, num_chunks, integration_time)
+        starts.append(len(files))
+        chunk_folders = []
+        for chunk in range(len(starts) - 1):
+            chunk_files = files[starts[chunk]:starts[chunk + 1]]
+            chunk_name = "{0:s}_chunk{1:d}".format(folder[0], chunk)
+            chunk_path = os.path.join(folder[1], "chunk_{0:d}".format(chunk))
+            chunk_times = (chunk_files[0][1], chunk_files[-1][5])
+            out_batches.append((chunk_files, setup, chunk_times, pos,
+                                (chunk_name, chunk_path)))
+            chunk_folders.append(chunk_path)
+        merge_groups.append((folder[1], chunk_folders))
+    return out_batches, merge_groups
@@ -0,0 +1,100 @@
+"""This file contains the functions that write and read the batch manifest, a
+record of the batches generated by a run of the setup script that the other
+tools (like the queue simulator) work from"""
+import os
+import json
+import datetime
+import orsslib.batch_chunking as bc
+import orsslib.scan_cache as sc
+
+
+def get_manifest_path(outdir, batch_name):
+    """Gives the path of the manifest for a batch in a base output directory
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+    batch_name : str
+        Name of the overall batch (the name of the input directory)
+
+    Returns
+    -------
+    manifest_path : str
+        Path to the manifest file for the batch
+    """
+    return os.path.join(outdir, batch_name + "_manifest.json")
+
+
+def build_manifest(batch_name, indir, sub_batches, merge_groups):
+    """Builds the manifest of the batches generated for an input directory
+
+    Parameters
+    ----------
+    batch_name : str
+        Name of the overall batch
+    indir : str
+        The input directory the batches were generated from
+    sub_batches : list
+        list of sub batch tuples (with chunks) as passed to build_batch_scripts
+    merge_groups : list
+        list of (sub batch folder, list of chunk folders) pairs
+
+    Returns
+    -------
+    manifest : dict
+        Dictionary that can be written with json
+    """
+    chunk_of = {}
+    for batch_dir, chunk_dirs in merge_groups:
+        for chunk_dir in chunk_dirs:
+            chunk_of[chunk_dir] = batch_dir
+    batches = []
+    for files, setup, times, pos, folder in sub_batches:
+        batches.append({"name": folder[0], "dir": folder[1],
+                        "setup": setup[0], "position": pos[0],
+                        "x": pos[1][0], "y": pos[1][1],
+                        "start": times[0].strftime(sc.DATE_FMT),
+                        "end": times[1].strftime(sc.DATE_FMT),
+                        "num_files": len(files),
+                        "bytes": bc.get_batch_bytes(files),
+                        "chunk_of": chunk_of.get(folder[1])})
+    merges = [{"dir": batch_dir, "chunks": chunk_dirs}
+              for batch_dir, chunk_dirs in merge_groups]
+    return {"batch_name": batch_name, "input_dir": indir,
+            "created": datetime.datetime.now().strftime(sc.DATE_FMT),
+            "batches": batches, "merges": merges}
+
+
+def write_manifest(manifest_path, manifest):
+    """Writes a manifest to disk
+
+    Parameters
+    ----------
+    manifest_path : str
+        Path to the manifest file
+    manifest : dict
+        The manifest from build_manifest
+    """
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w') as out_file:
+        json.dump(manifest, out_file, indent=1, sort_keys=True,
+                  separators=(", ", ": "))
+    os.rename(tmp_path, manifest_path)
+
+
+def read_manifest(manifest_path):
+    """Reads a manifest from disk
+
+    Parameters
+    ----------
+    manifest_path : str
+        Path to the manifest file
+
+    Returns
+    -------
+    manifest : dict
+        The manifest as written by write_manifest
+    """
+    with open(manifest_path, 'r') as in_file:
+        return json.load(in_file)
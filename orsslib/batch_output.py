@@ -0,0 +1,149 @@
+"""This file contains the functions that write the files of the batch
+directories, files whose contents are unchanged are left alone so that a
+rerun over an extended input directory only touches the batches that changed"""
+import os
+import hashlib
+from multiprocessing.pool import ThreadPool
+
+# permissions given to the batch directories and the files written in them
+OUTPUT_MODE = 0o774
+
+# number of threads used to write batch directories
+DEFAULT_WRITERS = 8
+
+
+def get_content_hash(content):
+    """Gives the hash used to compare file contents
+
+    Parameters
+    ----------
+    content : str
+        The contents of a file
+
+    Returns
+    -------
+    digest : str
+        The hex digest of the contents
+    """
+    return hashlib.sha1(content).hexdigest()
+
+
+def get_file_hash(path):
+    """Gives the hash of the contents of a file on disk
+
+    Parameters
+    ----------
+    path : str
+        Path to the file
+
+    Returns
+    -------
+    digest : str
+        The hex digest of the contents, None if the file does not exist
+    """
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as in_file:
+        return get_content_hash(in_file.read())
+
+
+def write_if_changed(path, content, mode=None):
+    """Writes a file if its contents on disk differ from the given contents,
+    the new contents are written to a temporary file that is then renamed
+    over the old file so the file is never left partly written
+
+    Parameters
+    ----------
+    path : str
+        Path to the file
+    content : str
+        The contents the file should have, text is written as UTF-8
+    mode : int
+        If not None, the permissions the file is given when it is written
+
+    Returns
+    -------
+    changed : bool
+        True if the file was written, False if it already had the contents
+    """
+    if not isinstance(content, bytes):
+        content = content.encode("utf-8")
+    if get_file_hash(path) == get_content_hash(content):
+        return False
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as out_file:
+        out_file.write(content)
+    if mode is not None:
+        os.chmod(tmp_path, mode)
+    os.rename(tmp_path, path)
+    return True
+
+
+def write_batch_dir(batch):
+    """Creates a batch directory if needed and writes its files, the directory
+    and the files written get OUTPUT_MODE permissions
+
+    Parameters
+    ----------
+    batch : tuple
+        The path to the directory and a list of (file name, contents) pairs
+
+    Returns
+    -------
+    folder : str
+        The path to the directory
+    changed : bool
+        True if the directory was created or any of its files were written
+    """
+    folder, contents = batch
+    changed = False
+    if not os.path.isdir(folder):
+        try:
+            os.makedirs(folder)
+        except OSError:
+            # another thread may have made it as the parent of a chunk
+            if not os.path.isdir(folder):
+                raise
+        changed = True
+    for name, content in contents:
+        changed |= write_if_changed(os.path.join(folder, name), content,
+                                    OUTPUT_MODE)
+    if changed:
+        os.chmod(folder, OUTPUT_MODE)
+    return folder, changed
+
+
+def write_batch_dirs(batches, workers, callback=None):
+    """Writes a list of batch directories using a pool of threads
+
+    Parameters
+    ----------
+    batches : list
+        List of (directory, list of (file name, contents) pairs) tuples
+    workers : int
+        Number of threads to write directories with
+    callback : function
+        If not None, called with the directory and whether it changed as each
+        directory is finished, from the calling thread
+
+    Returns
+    -------
+    changed : set
+        The directories that were created or had files written
+    """
+    changed = set()
+    if len(batches) == 0:
+        return changed
+    pool = ThreadPool(min(workers, len(batches)))
+    try:
+        for folder, is_changed in pool.imap_unordered(write_batch_dir,
+                                                      batches):
+            if is_changed:
+                changed.add(folder)
+            if callback is not None:
+                callback(folder, is_changed)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return changed
@@ -0,0 +1,276 @@
+"""This file contains the functions that decide which batches of a manifest
+have run to completion, from the outputs in each batch directory, the markers
+the batch scripts leave when they start and finish, and a hash of the sizes
+and modification times of the input files taken when the job started, so
+that only the batches that failed or whose inputs changed are submitted
+again"""
+import os
+import time
+import hashlib
+from multiprocessing.pool import ThreadPool
+import orsslib.result_harvest as rh
+import orsslib.scan_cache as sc
+
+# the marker a batch script writes when it starts, holding the provenance hash
+# of its input files, and the marker with the exit status of the reader that
+# it writes when it finishes
+STARTED_MARKER = "job_started"
+EXIT_MARKER = "job_exit"
+
+# what the exit marker holds if the input files could not be staged in
+STAGE_IN_FAILED = "stage_in"
+
+# the files of a batch directory that decide what the job does, if they are
+# written after the job started its outputs are out of date
+BATCH_FILES = ["input_file_list", "detector_setup", "batch_cfg"]
+
+COMPLETE = "complete"
+FAILED = "failed"
+STALE = "stale"
+UNFINISHED = "unfinished"
+NOT_RUN = "not run"
+# a merge whose chunks have not all completed
+WAITING = "waiting"
+STATES = [COMPLETE, FAILED, STALE, UNFINISHED, NOT_RUN, WAITING]
+
+DEFAULT_WORKERS = 8
+
+
+def get_provenance_hash(file_list_path):
+    """Gives the hash of the names, sizes and modification times of the files
+    of an input file list, the same hash the batch scripts write with stat
+    and md5sum when they start
+
+    Parameters
+    ----------
+    file_list_path : str
+        Path to the input_file_list of a batch
+
+    Returns
+    -------
+    digest : str
+        The hex digest, files that do not exist are left out
+    """
+    digest = hashlib.md5()
+    with open(file_list_path, 'rb') as in_file:
+        for line in in_file:
+            fname = line.rstrip(b"\n")
+            if len(fname) == 0:
+                continue
+            try:
+                stat = os.stat(fname)
+            except OSError:
+                continue
+            digest.update(fname + " {0:d} {1:d}\n".format(
+                stat.st_size, int(stat.st_mtime)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def read_marker(path):
+    """Reads a marker left by a batch script
+
+    Parameters
+    ----------
+    path : str
+        Path to the marker
+
+    Returns
+    -------
+    value : str
+        The contents of the marker without surrounding whitespace, None if
+        there is no marker
+    """
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'r') as in_file:
+        return in_file.read().strip()
+
+
+def get_output_paths(batch_dir):
+    """Gives the paths of the outputs OrchidReader writes in a batch directory
+
+    Parameters
+    ----------
+    batch_dir : str
+        The batch directory
+
+    Returns
+    -------
+    paths : list
+        The paths of the csv files and the root file
+    """
+    return ([os.path.join(batch_dir, kind + ".csv") for kind in rh.CSV_KINDS]
+            + [os.path.join(batch_dir, rh.ROOT_FILE_NAME)])
+
+
+def get_output_problems(batch_dir):
+    """Gives the problems with the outputs of a batch directory
+
+    Parameters
+    ----------
+    batch_dir : str
+        The batch directory
+
+    Returns
+    -------
+    problems : list
+        Descriptions of the outputs that are missing or incomplete
+    """
+    return rh.harvest_batch(batch_dir, sc.ScanCache(None))[3]
+
+
+def get_batch_status(batch_dir, walltime=0.0):
+    """Decides the state of the job of a batch directory
+
+    Parameters
+    ----------
+    batch_dir : str
+        The batch directory
+    walltime : float
+        If more than zero, a job that started more than this many hours ago
+        and has not finished was killed and has failed
+
+    Returns
+    -------
+    state : str
+        One of STATES other than WAITING
+    reasons : list
+        Descriptions of why the batch is in that state
+    """
+    started_path = os.path.join(batch_dir, STARTED_MARKER)
+    started = read_marker(started_path)
+    exit_status = read_marker(os.path.join(batch_dir, EXIT_MARKER))
+    problems = get_output_problems(batch_dir)
+    if started is None:
+        if not any([os.path.exists(path)
+                    for path in get_output_paths(batch_dir)]):
+            return NOT_RUN, ["no job has run in the directory"]
+        # the outputs of a job from a batch script without markers
+        if len(problems) > 0:
+            return FAILED, problems
+        return COMPLETE, []
+    if exit_status is None:
+        hours = (time.time() - os.path.getmtime(started_path)) / 3600.0
+        if walltime > 0.0 and hours > walltime:
+            return FAILED, ["the job started {0:.1f} hours ago and never "
+                            "finished, it was killed".format(hours)]
+        return UNFINISHED, ["the job started {0:.1f} hours ago and has not "
+                            "finished, it is still running or was "
+                            "killed".format(hours)]
+    if exit_status == STAGE_IN_FAILED:
+        return FAILED, ["the input files could not be staged in"]
+    if exit_status != "0":
+        return FAILED, ["OrchidReader exited with status " + exit_status]
+    if len(problems) > 0:
+        return FAILED, problems
+    reasons = []
+    file_list_path = os.path.join(batch_dir, "input_file_list")
+    if get_provenance_hash(file_list_path) != started:
+        reasons.append("input files changed size or modification time since "
+                       "the job ran")
+    started_time = os.path.getmtime(started_path)
+    for name in BATCH_FILES:
+        path = os.path.join(batch_dir, name)
+        if os.path.isfile(path) and os.path.getmtime(path) > started_time:
+            reasons.append(name + " was written after the job started")
+    if len(reasons) > 0:
+        return STALE, reasons
+    return COMPLETE, []
+
+
+def get_merge_status(batch_dir, chunk_dirs, statuses):
+    """Decides the state of the merge of the chunks of a sub batch
+
+    Parameters
+    ----------
+    batch_dir : str
+        The sub batch directory the merge writes to
+    chunk_dirs : list
+        The chunk directories
+    statuses : dict
+        The state and reasons of each chunk directory, from get_batch_status
+
+    Returns
+    -------
+    state : str
+        One of STATES
+    reasons : list
+        Descriptions of why the merge is in that state
+    """
+    waiting = [os.path.basename(chunk_dir) for chunk_dir in chunk_dirs
+               if statuses[chunk_dir][0] != COMPLETE]
+    if len(waiting) > 0:
+        return WAITING, ["waits for " + ", ".join(waiting)]
+    csv_paths = get_output_paths(batch_dir)[:-1]
+    if not any([os.path.exists(path) for path in csv_paths]):
+        return NOT_RUN, ["the chunks have not been merged"]
+    # the root files are only added together where hadd is installed, so a
+    # missing root file is not a failed merge
+    problems = [problem for problem in get_output_problems(batch_dir)
+                if not problem.startswith(rh.ROOT_FILE_NAME)]
+    if len(problems) > 0:
+        return FAILED, problems
+    chunk_time = max([os.path.getmtime(path) for chunk_dir in chunk_dirs
+                      for path in get_output_paths(chunk_dir)[:-1]])
+    if chunk_time > min([os.path.getmtime(path) for path in csv_paths]):
+        return STALE, ["the chunk outputs are newer than the merged outputs"]
+    return COMPLETE, []
+
+
+def get_statuses(manifest, walltime=0.0, workers=DEFAULT_WORKERS):
+    """Decides the state of every batch and merge of a manifest, checking
+    the batch directories with a pool of threads
+
+    Parameters
+    ----------
+    manifest : dict
+        The manifest, as from read_manifest
+    walltime : float
+        If more than zero, a job that started more than this many hours ago
+        and has not finished was killed and has failed
+    workers : int
+        Number of threads checking batch directories at once
+
+    Returns
+    -------
+    statuses : dict
+        Dictionary mapping each batch and merge directory to its state and
+        the reasons for it
+    """
+    dirs = [batch["dir"] for batch in manifest["batches"]]
+    statuses = {}
+    if len(dirs) > 0:
+        pool = ThreadPool(min(workers, len(dirs)))
+        try:
+            for batch_dir, status in zip(dirs, pool.map(
+                    lambda batch_dir: get_batch_status(batch_dir, walltime),
+                    dirs)):
+                statuses[batch_dir] = status
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+    for merge in manifest["merges"]:
+        statuses[merge["dir"]] = get_merge_status(merge["dir"],
+                                                  merge["chunks"], statuses)
+    return statuses
+
+
+def get_resubmit_dirs(statuses, states):
+    """Gives the directories whose jobs should be submitted again
+
+    Parameters
+    ----------
+    statuses : dict
+        The state and reasons of each directory, from get_statuses
+    states : list
+        The states whose jobs are submitted again
+
+    Returns
+    -------
+    dirs : set
+        The directories, for the only argument of plan_submission, which also
+        submits the merge of any chunk submitted again
+    """
+    return set([batch_dir for batch_dir in statuses
+                if statuses[batch_dir][0] in states])
@@ -0,0 +1,258 @@
+"""This file contains the buffer timeline scan, which reads the end time of
+every buffer of the raw data files to find the stalls of the DAQ and the gaps
+inside files that the split between files cannot see. Only the buffer headers
+are read, through a strided NumPy view of the memory mapped file, so the scan
+touches one page per buffer instead of reading the whole file"""
+from __future__ import print_function
+import mmap
+import multiprocessing
+import orsslib.compressed_files as cf
+import orsslib.header_readers as hr
+import orsslib.orchid_format as ofmt
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# intervals between buffer end times shorter than this (in seconds) are not
+# kept, the DAQ fills a buffer in well under this when it is taking data
+MIN_STALL_TIME = 1.0
+
+# an interval between buffers this many times the median of the file is a
+# stall
+STALL_FACTOR = 10.0
+
+# the buffer headers of a file as one record per buffer
+BUFFER_TIMES = ofmt.BUFFER_HEADER.get_dtype(ofmt.BUFFER_SIZE)
+
+
+def read_end_times(fname):
+    """Reads the end time of every complete buffer of a file
+
+    Parameters
+    ----------
+    fname : str
+        Full path to the file
+
+    Returns
+    -------
+    end_times : list
+        The buffer end times in microseconds since the epoch, in file order
+    """
+    size = cf.get_data_size(fname)
+    if size < ofmt.MIN_FILE_SIZE:
+        return []
+    if cf.is_compressed(fname):
+        # compressed files cannot be mapped, read the buffer headers instead
+        in_file = cf.open_data_file(fname)
+        try:
+            header_offset, num_buffers, _ = hr.get_buffer_layout(in_file,
+                                                                 size)
+            end_times = []
+            for buf_num in range(num_buffers):
+                in_file.seek(header_offset + ofmt.FILE_HEADER_SIZE +
+                             buf_num * ofmt.BUFFER_SIZE + ofmt.END_TIME.offset,
+                             0)
+                end_times.append(ofmt.END_TIME.unpack(
+                    in_file.read(ofmt.END_TIME.size))[0])
+        finally:
+            in_file.close()
+        return end_times
+    with open(fname, 'rb') as in_file:
+        data = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        # only the pages of the buffer headers are wanted, not read ahead
+        if hasattr(data, "madvise") and hasattr(mmap, "MADV_RANDOM"):
+            data.madvise(mmap.MADV_RANDOM)
+        header_offset, num_buffers, _ = hr.parse_buffer_layout(
+            data[:ofmt.MARKER.size], size)
+        first = header_offset + ofmt.FILE_HEADER_SIZE
+        if np is None:
+            return [ofmt.END_TIME.unpack_from(
+                data, first + buf_num * ofmt.BUFFER_SIZE +
+                ofmt.END_TIME.offset)[0] for buf_num in range(num_buffers)]
+        view = np.ndarray((num_buffers,), BUFFER_TIMES, data, first)
+        end_times = view["end_time"].tolist()
+        # the map cannot be closed while the view holds it
+        del view
+        return end_times
+    finally:
+        data.close()
+
+
+def get_intervals(end_times):
+    """Gives the time between the ends of neighbouring buffers
+
+    Parameters
+    ----------
+    end_times : list
+        The buffer end times in microseconds
+
+    Returns
+    -------
+    intervals : list
+        The seconds from the end of each buffer to the end of the next, one
+        fewer than the buffers
+    """
+    if np is not None:
+        return (np.diff(np.array(end_times, dtype=np.int64)) /
+                1000000.0).tolist()
+    return [(end_times[ind + 1] - end_times[ind]) / 1000000.0
+            for ind in range(len(end_times) - 1)]
+
+
+def timeline_file(fname):
+    """Reads the buffer timeline of a file and keeps the intervals long
+    enough to be a stall or gap
+
+    Parameters
+    ----------
+    fname : str
+        Full path to the file
+
+    Returns
+    -------
+    fname : str
+        The full path to the file
+    timeline : dict
+        "num_buffers" is the number of complete buffers, "first_end" and
+        "last_end" the end times of the first and last buffers in
+        microseconds (None without buffers), "median" the median seconds
+        between buffer ends, and "intervals" a list of [buffer number,
+        seconds since the end of the previous buffer] of every buffer that
+        ended MIN_STALL_TIME or more after the previous one, or before it
+    """
+    end_times = read_end_times(fname)
+    intervals = get_intervals(end_times)
+    timeline = {"num_buffers": len(end_times),
+                "first_end": (end_times[0] if len(end_times) > 0 else None),
+                "last_end": (end_times[-1] if len(end_times) > 0 else None),
+                "median": 0.0, "intervals": []}
+    if len(intervals) > 0:
+        ordered = sorted(intervals)
+        mid = len(ordered) // 2
+        timeline["median"] = (ordered[mid] if len(ordered) % 2 == 1 else
+                              (ordered[mid - 1] + ordered[mid]) / 2.0)
+    timeline["intervals"] = [[ind + 1, secs] for ind, secs in
+                             enumerate(intervals)
+                             if secs >= MIN_STALL_TIME or secs < 0.0]
+    return fname, timeline
+
+
+def get_timeline_problems(timeline, split_time):
+    """Describes the stalls and gaps in the buffer timeline of a file
+
+    Parameters
+    ----------
+    timeline : dict
+        The timeline from timeline_file
+    split_time : float
+        The gap in seconds between files that splits a sub batch
+
+    Returns
+    -------
+    problems : list
+        Descriptions of the buffers that ended long after, or before, the
+        buffer before them
+    """
+    problems = []
+    stall_time = max(MIN_STALL_TIME, STALL_FACTOR * timeline["median"])
+    for buf_num, secs in timeline["intervals"]:
+        if secs < 0.0:
+            problems.append("buffer {0:d}: ended {1:.3f} s before the "
+                            "buffer before it".format(buf_num, -secs))
+        elif secs >= split_time:
+            problems.append("buffer {0:d}: gap of {1:.1f} s, longer than "
+                            "the split time".format(buf_num, secs))
+        elif secs >= stall_time:
+            problems.append("buffer {0:d}: stall of {1:.1f} s, the median "
+                            "buffer takes {2:.3f} s".format(
+                                buf_num, secs, timeline["median"]))
+    return problems
+
+
+def get_timelines(fnames, workers):
+    """Reads the buffer timelines of a list of files using a pool of processes
+
+    Parameters
+    ----------
+    fnames : list
+        List of full paths to the files
+    workers : int
+        Number of processes to read files with
+
+    Returns
+    -------
+    timelines : dict
+        Dictionary mapping the file path to the timeline from timeline_file
+    """
+    timelines = {}
+    if len(fnames) == 0:
+        return timelines
+    pool = multiprocessing.Pool(min(workers, len(fnames)))
+    try:
+        for count, (fname, timeline) in enumerate(
+                pool.imap_unordered(timeline_file, fnames)):
+            timelines[fname] = timeline
+            print("  Read the buffer timeline of {0:d} of {1:d} files\r"
+                  .format(count + 1, len(fnames)), end=" ")
+        print("")
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return timelines
+
+
+def report_buffer_timelines(file_list, cache, workers, split_time):
+    """Reads the buffer timeline of every file in the file list (using cached
+    timelines where the file has not changed) and reports the files with
+    stalls or gaps inside them
+
+    Parameters
+    ----------
+    file_list : list
+        List of file names and file header info pairs
+    cache : ScanCache
+        The scan cache that the timelines are stored in
+    workers : int
+        Number of processes to read files with
+    split_time : float
+        The gap in seconds between files that splits a sub batch
+
+    Returns
+    -------
+    timelines : dict
+        Dictionary mapping the file path to the timeline from timeline_file
+    """
+    timelines = {}
+    to_read = []
+    for fdat in file_list:
+        cached = cache.lookup(fdat[0], "timeline")
+        if cached is None:
+            to_read.append(fdat[0])
+        else:
+            timelines[fdat[0]] = cached
+    print("Reading the buffer timelines of", len(to_read), "files,",
+          len(timelines), "cached")
+    # the worker processes inherit the seek indexes of compressed files
+    cf.load_indexes(cache, to_read)
+    new_timelines = get_timelines(to_read, workers)
+    for fname in new_timelines:
+        cache.store(fname, "timeline", new_timelines[fname])
+        timelines[fname] = new_timelines[fname]
+    cache.save()
+    flagged = [(fdat[0], get_timeline_problems(timelines[fdat[0]],
+                                               split_time))
+               for fdat in file_list]
+    flagged = [(fname, problems) for fname, problems in flagged
+               if len(problems) > 0]
+    if len(flagged) == 0:
+        print("No stalls or gaps inside any of the", len(file_list), "files")
+        return timelines
+    print(len(flagged), "files have stalls or gaps inside them:")
+    for fname, problems in flagged:
+        print("  ", fname)
+        for problem in problems:
+            print("      ", problem)
+    return timelines
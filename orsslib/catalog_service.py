@@ -0,0 +1,371 @@
+"""This file contains the catalog service, a daemon that keeps the header
+information of the files of the input directories it is asked about in memory
+and listens on a Unix socket, so that repeated runs over the same campaign
+directories get their file lists without loading the scan cache or reading
+any data files. Each request only reads the headers of files that are new or
+have changed since the last request"""
+from __future__ import print_function
+import os
+import json
+import time
+import socket
+import threading
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+import orsslib.compressed_files as cf
+import orsslib.header_readers as hr
+import orsslib.io_backends as iobk
+import orsslib.scan_cache as sc
+
+SOCKET_NAME = ".orss_catalog.sock"
+
+# seconds between the daemon's checks of the directories it has been asked
+# about, so that new files are read before the next request needs them
+DEFAULT_REFRESH = 30.0
+
+# seconds a client waits for the daemon before scanning directly
+CLIENT_TIMEOUT = 60.0
+
+# seconds the daemon waits for a scan before answering that it is still
+# scanning, well below CLIENT_TIMEOUT so that a long scan does not make the
+# client give up and read every header again itself
+SCAN_WAIT = 10.0
+
+
+def get_socket_path(outdir):
+    """Gives the path of the socket of the daemon for a base output directory
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+
+    Returns
+    -------
+    socket_path : str
+        Path to the Unix socket
+    """
+    return os.path.join(outdir, SOCKET_NAME)
+
+
+def get_daemon_cache_path(outdir, batch_name):
+    """Gives the path the daemon saves the headers of a batch to, this is kept
+    apart from the scan cache of the setup script so that neither overwrites
+    what the other has stored
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+    batch_name : str
+        Name of the overall batch (the name of the input directory)
+
+    Returns
+    -------
+    cache_path : str
+        Path to the daemon's cache file for the batch
+    """
+    return os.path.join(outdir, sc.CACHE_DIR_NAME, batch_name + "_daemon.json")
+
+
+def send_request(socket_path, request, timeout=CLIENT_TIMEOUT):
+    """Sends a request to the daemon and waits for the reply
+
+    Parameters
+    ----------
+    socket_path : str
+        Path to the Unix socket of the daemon
+    request : dict
+        The request, with the operation in "op"
+    timeout : float
+        Seconds to wait for the daemon
+
+    Returns
+    -------
+    reply : dict
+        The reply of the daemon, None if there is no daemon or it failed
+    """
+    if not os.path.exists(socket_path):
+        return None
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(timeout)
+    try:
+        conn.connect(socket_path)
+        conn.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        conn.shutdown(socket.SHUT_WR)
+        data = []
+        while True:
+            block = conn.recv(65536)
+            if not block:
+                break
+            data.append(block)
+        reply = json.loads(b"".join(data).decode("utf-8"))
+    except (socket.error, ValueError):
+        return None
+    finally:
+        conn.close()
+    if "error" in reply:
+        print("Catalog daemon error:", reply["error"])
+        return None
+    return reply
+
+
+def get_file_list(socket_path, indir, cache=None):
+    """Asks the daemon for the header information of the files of an input
+    directory, asking again while the daemon answers that it is scanning
+
+    Parameters
+    ----------
+    socket_path : str
+        Path to the Unix socket of the daemon
+    indir : str
+        The directory given as an input directory for the raw data
+    cache : ScanCache
+        If not None, the seek indexes of the compressed files the daemon
+        built are stored in it and loaded, so they are not built again
+
+    Returns
+    -------
+    file_list : list
+        List of file names and file header info pairs sorted by start time,
+        in the form get_and_sort_file_list gives, None if the daemon is not
+        available
+    """
+    request = {"op": "scan", "indir": os.path.abspath(indir)}
+    reply = send_request(socket_path, request)
+    while reply is not None and reply.get("scanning"):
+        reply = send_request(socket_path, request)
+    if reply is None:
+        return None
+    # the daemon gives the names in the directory, join them to the input
+    # directory as given so the names match those of a direct scan
+    file_list = [[os.path.join(indir, str(name)), sc.header_from_json(header)]
+                 for name, header in reply["files"]]
+    file_list.sort(key=lambda x: x[1][0])
+    if cache is not None:
+        fnames = []
+        for name, json_index in reply.get("indexes", {}).items():
+            fnames.append(os.path.join(indir, str(name)))
+            cache.store(fnames[-1], "seek_index", json_index)
+        cf.load_indexes(cache, fnames)
+    return file_list
+
+
+class CatalogDaemon(object):
+    """This class holds the header information of the input directories and
+    answers the requests sent to the socket"""
+    def __init__(self, outdir, refresh=DEFAULT_REFRESH, budget=None,
+                 backend=iobk.DEFAULT_BACKEND):
+        """Sets up an empty catalog
+
+        Parameters
+        ----------
+        outdir : str
+            Name of the base output directory, the daemon's caches are kept in
+            it so that a restarted daemon does not read every file again
+        refresh : float
+            Seconds between the checks of the known directories
+        budget : IoBudget
+            If not None, the I/O budget the header reads wait for
+        backend : str
+            The name of the I/O backend the headers are read with
+        """
+        self.outdir = outdir
+        self.refresh = refresh
+        self.budget = budget
+        self.backend = backend
+        self.caches = {}
+        self.scans = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def scan_directory(self, indir):
+        """Brings the headers of an input directory up to date, only files
+        that are new or whose size or modification time changed are read.
+        This is only run by the thread of start_scan, so a directory is never
+        scanned by two threads at once and its cache needs no lock
+
+        Parameters
+        ----------
+        indir : str
+            The absolute path of the input directory
+
+        Returns
+        -------
+        files : list
+            List of [file name, json header] pairs, the names are relative to
+            the input directory
+        indexes : dict
+            The json seek indexes of the compressed files, keyed by the file
+            names relative to the input directory
+        """
+        with self.lock:
+            cache = self.caches.get(indir)
+            if cache is None:
+                cache = sc.ScanCache(get_daemon_cache_path(
+                    self.outdir, os.path.basename(indir)))
+                self.caches[indir] = cache
+        files = []
+        indexes = {}
+        for name in os.listdir(indir):
+            fname = os.path.join(indir, name)
+            if not os.path.isfile(fname):
+                continue
+            header = cache.lookup(fname, "header")
+            if header is None:
+                cf.load_indexes(cache, [fname])
+                header = hr.get_file_header_data(fname, self.budget,
+                                                 self.backend)
+                cf.save_indexes(cache, [fname])
+                # files too short or too damaged to read are left out
+                if header is None:
+                    continue
+                header = sc.header_to_json(header)
+                cache.store(fname, "header", header)
+            files.append([name, header])
+            if cf.is_compressed(fname):
+                json_index = cache.lookup(fname, "seek_index")
+                if json_index is not None:
+                    indexes[name] = json_index
+        cache.save()
+        return files, indexes
+
+    def start_scan(self, indir):
+        """Starts a scan of an input directory in a thread of its own, unless
+        one is already running, in which case that scan is joined
+
+        Parameters
+        ----------
+        indir : str
+            The absolute path of the input directory
+
+        Returns
+        -------
+        scan : dict
+            The scan, "done" is set once "files" and "indexes", or "error",
+            hold its outcome
+        """
+        with self.lock:
+            scan = self.scans.get(indir)
+            if scan is not None:
+                return scan
+            scan = {"done": threading.Event(), "files": None, "indexes": None,
+                    "error": None}
+            self.scans[indir] = scan
+        thread = threading.Thread(target=self.run_scan, args=(indir, scan))
+        thread.daemon = True
+        thread.start()
+        return scan
+
+    def run_scan(self, indir, scan):
+        """Runs a scan started by start_scan
+
+        Parameters
+        ----------
+        indir : str
+            The absolute path of the input directory
+        scan : dict
+            The scan from start_scan
+        """
+        try:
+            scan["files"], scan["indexes"] = self.scan_directory(indir)
+        except Exception as err:
+            scan["error"] = str(err)
+        finally:
+            # a later request starts a new scan, which sees files added since
+            with self.lock:
+                del self.scans[indir]
+            scan["done"].set()
+
+    def handle_request(self, request):
+        """Answers a request
+
+        Parameters
+        ----------
+        request : dict
+            The request, with the operation in "op"
+
+        Returns
+        -------
+        reply : dict
+            The reply to send back
+        """
+        if request.get("op") == "ping":
+            with self.lock:
+                return {"directories": sorted(self.caches)}
+        elif request.get("op") == "scan":
+            indir = request.get("indir")
+            if indir is None or not os.path.isdir(indir):
+                return {"error": "not a directory: " + str(indir)}
+            # the headers are read without holding the lock, and a client
+            # whose scan takes long is told to ask again rather than left
+            # waiting until it times out and scans the directory itself
+            scan = self.start_scan(indir)
+            if not scan["done"].wait(SCAN_WAIT):
+                return {"scanning": True}
+            if scan["error"] is not None:
+                return {"error": scan["error"]}
+            return {"files": scan["files"], "indexes": scan["indexes"]}
+        elif request.get("op") == "stop":
+            self.stopping.set()
+            return {}
+        return {"error": "unknown operation: " + str(request.get("op"))}
+
+    def refresh_directories(self):
+        """Checks the known directories for new or changed files until the
+        daemon is stopped, this is run by a background thread"""
+        while not self.stopping.wait(self.refresh):
+            with self.lock:
+                known = list(self.caches)
+            for indir in known:
+                if os.path.isdir(indir):
+                    scan = self.start_scan(indir)
+                    scan["done"].wait()
+                    if scan["error"] is not None:
+                        print("Refresh of", indir, "failed:", scan["error"])
+
+    def serve(self, socket_path):
+        """Listens on the socket until a stop request is received
+
+        Parameters
+        ----------
+        socket_path : str
+            Path to the Unix socket, it is removed when the daemon stops
+        """
+        daemon = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            """Reads one json request per connection and writes the reply"""
+            def handle(self):
+                """Answers the request of the connection"""
+                try:
+                    reply = daemon.handle_request(json.loads(
+                        self.rfile.readline().decode("utf-8")))
+                except Exception as err:
+                    reply = {"error": str(err)}
+                self.wfile.write(json.dumps(reply).encode("utf-8"))
+
+        server = ThreadingUnixServer(socket_path, RequestHandler)
+        os.chmod(socket_path, 0o770)
+        refresher = threading.Thread(target=self.refresh_directories)
+        refresher.daemon = True
+        refresher.start()
+        serve_thread = threading.Thread(target=server.serve_forever)
+        serve_thread.daemon = True
+        serve_thread.start()
+        try:
+            while not self.stopping.is_set():
+                time.sleep(0.5)
+        finally:
+            self.stopping.set()
+            server.shutdown()
+            server.server_close()
+            os.remove(socket_path)
+
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn,
+                          socketserver.UnixStreamServer):
+    """Unix socket server that answers each connection in its own thread"""
+    daemon_threads = True
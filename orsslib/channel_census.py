@@ -0,0 +1,229 @@
+"""This file contains the functions that sample buffers from each raw data file
+to find which digitizer board/channel pairs are producing events, and use that
+census to infer which of the known detector setups a run was taken with"""
+from __future__ import print_function
+import multiprocessing
+import orsslib.compressed_files as cf
+import orsslib.header_readers as hr
+import orsslib.orchid_format as ofmt
+import orsslib.setup_changes as sc
+
+DEFAULT_SAMPLES = 4
+
+
+def get_sample_buffers(num_buffers, samples):
+    """Picks which buffers of a file to sample, always the first and last
+    buffers plus evenly spaced buffers in between
+
+    Parameters
+    ----------
+    num_buffers : int
+        The number of complete buffers in the file
+    samples : int
+        The maximum number of buffers to sample
+
+    Returns
+    -------
+    buffer_indices : list
+        Sorted list of the indices of the buffers to sample
+    """
+    if num_buffers <= samples:
+        return list(range(num_buffers))
+    if samples == 1:
+        return [0]
+    step = float(num_buffers - 1) / float(samples - 1)
+    return sorted(set([int(round(ind * step)) for ind in range(samples)]))
+
+
+def census_file(args):
+    """Counts the DppPsd events from each digitizer board/channel pair in a
+    sample of the buffers of a file
+
+    Parameters
+    ----------
+    args : tuple
+        The full path to the file and the maximum number of buffers to sample
+        (a tuple so this can be used directly with Pool.imap_unordered)
+
+    Returns
+    -------
+    fname : str
+        The full path to the file
+    census : dict
+        "samples" is the number of buffers sampled and "counts" maps a
+        "board,channel" string to the number of events seen from that pair
+    """
+    fname, samples = args
+    counts = {}
+    size = cf.get_data_size(fname)
+    if size < ofmt.MIN_FILE_SIZE:
+        return fname, {"samples": 0, "counts": counts}
+    in_file = cf.open_data_file(fname)
+    header_offset, num_buffers, _ = hr.get_buffer_layout(in_file, size)
+    buffer_indices = get_sample_buffers(num_buffers, samples)
+    for buf_num in buffer_indices:
+        in_file.seek(header_offset + ofmt.FILE_HEADER_SIZE +
+                     buf_num * ofmt.BUFFER_SIZE + ofmt.BUFFER_HEADER_SIZE, 0)
+        rawdata = in_file.read(ofmt.BUFFER_EVENTS_SIZE)
+        count_buffer_events(rawdata, counts)
+    in_file.close()
+    return fname, {"samples": len(buffer_indices), "counts": counts}
+
+
+def count_buffer_events(rawdata, counts):
+    """Walks the event chain of a buffer and counts the DppPsd events from each
+    digitizer board/channel pair
+
+    Parameters
+    ----------
+    rawdata : str
+        The raw bytes of the buffer with the buffer header removed
+    counts : dict
+        Dictionary of "board,channel" string to count that is added to
+    """
+    unpack_word = ofmt.EVENT_WORD.unpack_from
+    unpack_channel = ofmt.EVENT_CHANNEL.unpack_from
+    ind = 0
+    end = len(rawdata) - ofmt.EVENT_WORD.size
+    while ind < end:
+        word = unpack_word(rawdata, ind)[0]
+        if word == ofmt.DPP_PSD_TYPE:
+            board, chan = unpack_channel(rawdata,
+                                         ind + ofmt.EVENT_CHANNEL.offset)
+            key = "{0:d},{1:d}".format(board, chan)
+            counts[key] = counts.get(key, 0) + 1
+            ind += ofmt.DPP_PSD_EVENT.size
+        elif word == ofmt.END_OF_EVENTS:
+            break
+        else:
+            ind += word
+
+
+def get_file_censuses(file_list, cache, samples, workers):
+    """Gets the census of every file in the file list, using the cached census
+    of files that have not changed
+
+    Parameters
+    ----------
+    file_list : list
+        List of file names and file header info pairs
+    cache : ScanCache
+        The scan cache that censuses are stored in
+    samples : int
+        The maximum number of buffers to sample per file
+    workers : int
+        Number of processes to take censuses with
+
+    Returns
+    -------
+    censuses : dict
+        Dictionary mapping the file path to the census from census_file
+    """
+    censuses = {}
+    to_scan = []
+    for fdat in file_list:
+        cached = cache.lookup(fdat[0], "census")
+        if cached is None or cached["samples"] < samples:
+            to_scan.append(fdat[0])
+        else:
+            censuses[fdat[0]] = cached
+    print("Taking channel census of", len(to_scan), "files,", len(censuses),
+          "cached")
+    if len(to_scan) > 0:
+        # the worker processes inherit the seek indexes of compressed files
+        cf.load_indexes(cache, to_scan)
+        pool = multiprocessing.Pool(min(workers, len(to_scan)))
+        try:
+            args = [(fname, samples) for fname in to_scan]
+            for fname, census in pool.imap_unordered(census_file, args):
+                censuses[fname] = census
+                cache.store(fname, "census", census)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+        cache.save()
+    return censuses
+
+
+def get_setup_channels(setup):
+    """Gives the set of digitizer board/channel pairs an array setup uses
+
+    Parameters
+    ----------
+    setup : ArraySetup
+        The array setup
+
+    Returns
+    -------
+    channels : set
+        Set of (board, channel) tuples
+    """
+    return set([tuple(det.digi_pair) for det in setup.det_dict.values()])
+
+
+def match_setups(channels):
+    """Finds the known detector setups that best match a set of channels
+
+    Parameters
+    ----------
+    channels : set
+        Set of (board, channel) tuples that produced events
+
+    Returns
+    -------
+    best : list
+        Indices into setup_changes.EXCEPTION_DATA of the setups with the fewest
+        mismatched channels
+    """
+    scores = []
+    for ind, setup in enumerate(sc.EXCEPTION_DATA):
+        expected = get_setup_channels(setup)
+        scores.append(len(expected - channels) + len(channels - expected))
+    best_score = min(scores)
+    return [ind for ind, score in enumerate(scores) if score == best_score]
+
+
+def infer_setups(file_list, censuses, min_count=1):
+    """Combines the censuses of all the files in each run and matches the
+    combined census to the known detector setups, a run is used because the
+    detector setup cannot change without starting a new run and a single file
+    may be too short to see events from the low rate detectors
+
+    Parameters
+    ----------
+    file_list : list
+        List of file names and file header info pairs
+    censuses : dict
+        Dictionary mapping the file path to the census from census_file
+    min_count : int
+        The number of events a channel needs for it to count as present
+
+    Returns
+    -------
+    inferred : dict
+        Dictionary mapping the file path to the list of indices into
+        setup_changes.EXCEPTION_DATA of the best matching setups, files in runs
+        with no events in the census are left out
+    """
+    run_counts = {}
+    run_files = {}
+    for fdat in file_list:
+        run_key = (fdat[1][1], fdat[1][2])
+        counts = run_counts.setdefault(run_key, {})
+        run_files.setdefault(run_key, []).append(fdat[0])
+        for key, count in censuses[fdat[0]]["counts"].items():
+            counts[key] = counts.get(key, 0) + count
+    inferred = {}
+    for run_key in run_counts:
+        channels = set()
+        for key, count in run_counts[run_key].items():
+            if count >= min_count:
+                board, chan = key.split(",")
+                channels.add((int(board), int(chan)))
+        if len(channels) == 0:
+            continue
+        best = match_setups(channels)
+        for fname in run_files[run_key]:
+            inferred[fname] = best
+    return inferred
@@ -0,0 +1,741 @@
+"""This file contains the readers of compressed raw data files, files archived
+with gzip, bzip2 or xz are read through the Python standard library codecs
+without decompressing them to disk. The first time a file is opened its whole
+compressed data is walked once to build a seek index, the points where the
+decompression can be restarted and the uncompressed size of the file. The
+index is kept for the life of the process and can be stored in the scan cache
+so that later reads of the header, the first buffer and the last buffer only
+decompress the part of the file that holds them
+
+The points a codec can restart at differ:
+  gzip: the start of each member of the file (files written with pigz
+        --independent or concatenated .gz files have many), and while the
+        process lives, snapshots of the decompressor taken every
+        CHECKPOINT_SPACING bytes of the first pass
+  bzip2: the start of each stream of the file (pbzip2 writes many)
+  xz: the start of each block, read from the indexes at the end of the file
+      without decompressing anything (xz -T0 or --block-size write many)"""
+import os
+import bz2
+import zlib
+import struct
+import threading
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+# the extensions of the compressed files and the codec of each
+CODECS = {".gz": "gzip", ".bz2": "bzip2", ".xz": "xz"}
+
+# the magic bytes at the start of a member or stream of each codec, anything
+# else after the end of a member is taken to be padding
+MAGICS = {"gzip": b"\x1f\x8b", "bzip2": b"BZh", "xz": b"\xfd7zXZ\x00"}
+
+# number of compressed bytes read at once
+CHUNK_SIZE = 1048576
+
+# distance in compressed bytes between the in memory snapshots of a gzip
+# decompressor
+CHECKPOINT_SPACING = 16777216
+
+XZ_HEADER_SIZE = 12
+XZ_FOOTER_SIZE = 12
+XZ_FOOTER = struct.Struct("<4xI2s2s")
+
+# the errors of reading a truncated or damaged compressed file, IOError is
+# raised by the index builders and by bz2 for a bad stream
+DECOMPRESS_ERRORS = (IOError, EOFError, zlib.error)
+if lzma is not None:
+    DECOMPRESS_ERRORS += (lzma.LZMAError,)
+
+# the seek index of every compressed file opened by this process, with the
+# size and modification time of the file when it was built
+_INDEXES = {}
+_INDEX_LOCK = threading.Lock()
+
+
+def get_codec(fname):
+    """Gives the codec a data file is compressed with, from its extension
+
+    Parameters
+    ----------
+    fname : str
+        Full path to the file
+
+    Returns
+    -------
+    codec : str
+        gzip, bzip2 or xz, None for a raw data file
+    """
+    return CODECS.get(os.path.splitext(fname)[1])
+
+
+def is_compressed(fname):
+    """Checks if a data file is compressed
+
+    Parameters
+    ----------
+    fname : str
+        Full path to the file
+
+    Returns
+    -------
+    compressed : bool
+        True if the file has the extension of one of the codecs
+    """
+    return get_codec(fname) is not None
+
+
+def make_decompressor(codec):
+    """Makes a decompressor for one member or stream of a codec
+
+    Parameters
+    ----------
+    codec : str
+        gzip, bzip2 or xz
+
+    Returns
+    -------
+    decomp : object
+        The decompressor, with a decompress method
+    """
+    if codec == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif codec == "bzip2":
+        return bz2.BZ2Decompressor()
+    # not an IOError, a missing module is not a damaged file
+    if lzma is None:
+        raise RuntimeError("Reading xz compressed files needs the lzma module "
+                           "of Python 3.3 or later")
+    return lzma.LZMADecompressor(lzma.FORMAT_XZ)
+
+
+def feed(decomp, data):
+    """Decompresses the next compressed bytes of a member or stream
+
+    Parameters
+    ----------
+    decomp : object
+        The decompressor from make_decompressor
+    data : bytes
+        The compressed bytes
+
+    Returns
+    -------
+    out : bytes
+        The decompressed bytes
+    leftover : bytes
+        None if the member has not ended, otherwise the bytes of data past
+        its end
+    """
+    try:
+        out = decomp.decompress(data)
+    except EOFError:
+        # bz2 of Python 2 has no eof, it complains when fed past the end
+        return b"", data
+    if len(decomp.unused_data) > 0:
+        return out, decomp.unused_data
+    if getattr(decomp, "eof", False):
+        return out, b""
+    return out, None
+
+
+def is_finished(decomp):
+    """Checks if a decompressor has reached the end of its member or stream,
+    for when the compressed data ran out right at the end of it
+
+    Parameters
+    ----------
+    decomp : object
+        The decompressor from make_decompressor
+
+    Returns
+    -------
+    finished : bool
+        True if the member or stream is complete
+    """
+    if hasattr(decomp, "eof"):
+        return decomp.eof
+    # the decompressors of Python 2 cannot say, but only a finished one
+    # hands back a byte fed past its end
+    try:
+        return feed(decomp, b"\x00")[1] is not None
+    except (IOError, zlib.error):
+        return False
+
+
+class SeekIndex(object):
+    """This class holds the points a compressed file can be decompressed from
+    and the uncompressed size of the file"""
+    def __init__(self, codec, size, points):
+        """Sets up the index
+
+        Parameters
+        ----------
+        codec : str
+            gzip, bzip2 or xz
+        size : int
+            The uncompressed size of the file
+        points : list
+            List of [compressed offset, uncompressed offset, compressed end,
+            header offset] lists, one per restart point in order. The
+            compressed end is where the decompressor must stop, and the
+            header offset, if not None, where the stream header that must
+            be fed first sits (xz blocks)
+        """
+        self.codec = codec
+        self.size = size
+        self.points = points
+        # (compressed offset, uncompressed offset, compressed end,
+        # decompressor) snapshots, only kept in memory
+        self.checkpoints = []
+
+    def to_json(self):
+        """Converts the index to something that can be written with json
+
+        Returns
+        -------
+        json_index : dict
+            The codec, size and points of the index
+        """
+        return {"codec": self.codec, "size": self.size, "points": self.points}
+
+    @classmethod
+    def from_json(cls, json_index):
+        """Converts the output of to_json back to an index
+
+        Parameters
+        ----------
+        json_index : dict
+            The index as stored in the scan cache
+
+        Returns
+        -------
+        index : SeekIndex
+            The index
+        """
+        return cls(str(json_index["codec"]), json_index["size"],
+                   [list(point) for point in json_index["points"]])
+
+    def get_start(self, offset):
+        """Gives the last restart point at or before an uncompressed offset
+
+        Parameters
+        ----------
+        offset : int
+            The uncompressed offset
+
+        Returns
+        -------
+        start : tuple
+            The compressed offset, uncompressed offset, compressed end, header
+            offset and a copy of the decompressor to use (None to make a new
+            one) of the point
+        """
+        best = None
+        for point in self.points:
+            if point[1] > offset:
+                break
+            best = (point[0], point[1], point[2], point[3], None)
+        for comp_pos, out_pos, comp_end, decomp in self.checkpoints:
+            if out_pos <= offset and (best is None or out_pos > best[1]):
+                best = (comp_pos, out_pos, comp_end, None, decomp.copy())
+        return best
+
+    def get_next(self, offset):
+        """Gives the restart point that starts at an uncompressed offset, the
+        next member or stream once one has been decompressed to its end
+
+        Parameters
+        ----------
+        offset : int
+            The uncompressed offset
+
+        Returns
+        -------
+        start : tuple
+            The point as given by get_start, None if no point starts there
+        """
+        for point in self.points:
+            if point[1] == offset:
+                return (point[0], point[1], point[2], point[3], None)
+        return None
+
+
+def build_index(fname, budget=None):
+    """Builds the seek index of a compressed file
+
+    Parameters
+    ----------
+    fname : str
+        Full path to the file
+    budget : IoBudget
+        If not None, the I/O budget the reads wait for
+
+    Returns
+    -------
+    index : SeekIndex
+        The index
+    """
+    codec = get_codec(fname)
+    with open(fname, 'rb') as in_file:
+        if codec == "xz":
+            return build_xz_index(in_file, os.path.getsize(fname), budget)
+        return build_member_index(in_file, codec, budget)
+
+
+def build_member_index(in_file, codec, budget):
+    """Builds the seek index of a gzip or bzip2 file by decompressing all of
+    it once, noting where each member or stream starts
+
+    Parameters
+    ----------
+    in_file : file object
+        The opened compressed file
+    codec : str
+        gzip or bzip2
+    budget : IoBudget
+        If not None, the I/O budget the reads wait for
+
+    Returns
+    -------
+    index : SeekIndex
+        The index
+    """
+    index = SeekIndex(codec, 0, [])
+    magic = MAGICS[codec]
+    comp_pos = 0
+    out_pos = 0
+    decomp = None
+    pending = b""
+    next_checkpoint = CHECKPOINT_SPACING
+    while True:
+        if len(pending) < len(magic):
+            if budget is not None:
+                budget.acquire(CHUNK_SIZE)
+            data = in_file.read(CHUNK_SIZE)
+            pending += data
+            if len(data) == 0 and len(pending) == 0:
+                if decomp is not None and is_finished(decomp):
+                    index.points[-1][2] = comp_pos
+                    decomp = None
+                break
+        if decomp is None:
+            # only another member or stream can follow, anything else is
+            # padding or junk that the codec tools skip too
+            if not pending.startswith(magic):
+                break
+            decomp = make_decompressor(codec)
+            index.points.append([comp_pos, out_pos, None, None])
+        if len(pending) == 0:
+            raise IOError("Compressed file ends inside a member")
+        out, leftover = feed(decomp, pending)
+        used = len(pending) - (0 if leftover is None else len(leftover))
+        comp_pos += used
+        out_pos += len(out)
+        pending = b""
+        if leftover is not None:
+            index.points[-1][2] = comp_pos
+            pending = leftover
+            decomp = None
+        elif codec == "gzip" and comp_pos >= next_checkpoint:
+            index.checkpoints.append((comp_pos, out_pos, None,
+                                      decomp.copy()))
+            next_checkpoint = comp_pos + CHECKPOINT_SPACING
+    if decomp is not None:
+        raise IOError("Compressed file ends inside a member")
+    index.size = out_pos
+    for ind, (cpos, opos, _, point_decomp) in enumerate(index.checkpoints):
+        end = [point[2] for point in index.points if point[0] <= cpos][-1]
+        index.checkpoints[ind] = (cpos, opos, end, point_decomp)
+    return index
+
+
+def read_vli(rawdata, offset):
+    """Decodes a variable length integer of the xz format
+
+    Parameters
+    ----------
+    rawdata : bytes
+        Bytes that hold the integer
+    offset : int
+        The offset of the integer in rawdata
+
+    Returns
+    -------
+    value : int
+        The integer
+    offset : int
+        The offset of the byte after it
+    """
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(rawdata):
+            raise IOError("Damaged xz index")
+        byte = bytearray(rawdata[offset:offset + 1])[0]
+        value |= (byte & 0x7f) << shift
+        offset += 1
+        if byte & 0x80 == 0:
+            return value, offset
+        shift += 7
+
+
+def build_xz_index(in_file, size, budget):
+    """Builds the seek index of an xz file from the index at the end of each
+    of its streams, no data is decompressed
+
+    Parameters
+    ----------
+    in_file : file object
+        The opened compressed file
+    size : int
+        The size of the compressed file
+    budget : IoBudget
+        If not None, the I/O budget the reads wait for
+
+    Returns
+    -------
+    index : SeekIndex
+        The index
+    """
+    streams = []
+    end = size
+    while end > 0:
+        if budget is not None:
+            budget.acquire(XZ_FOOTER_SIZE)
+        in_file.seek(end - XZ_FOOTER_SIZE, 0)
+        footer = in_file.read(XZ_FOOTER_SIZE)
+        if footer[-4:] == b"\x00\x00\x00\x00":
+            # stream padding
+            end -= 4
+            continue
+        backward, _, magic = XZ_FOOTER.unpack(footer)
+        if magic != b"YZ":
+            raise IOError("Not an xz file, or a damaged one")
+        index_size = (backward + 1) * 4
+        index_start = end - XZ_FOOTER_SIZE - index_size
+        if index_start < XZ_HEADER_SIZE:
+            raise IOError("Damaged xz index")
+        if budget is not None:
+            budget.acquire(index_size)
+        in_file.seek(index_start, 0)
+        rawdata = in_file.read(index_size)
+        num_blocks, pos = read_vli(rawdata, 1)
+        blocks = []
+        for _ in range(num_blocks):
+            unpadded, pos = read_vli(rawdata, pos)
+            uncomp, pos = read_vli(rawdata, pos)
+            blocks.append(((unpadded + 3) // 4 * 4, uncomp))
+        stream_start = (index_start - sum([blk[0] for blk in blocks]) -
+                        XZ_HEADER_SIZE)
+        if stream_start < 0:
+            raise IOError("Damaged xz index")
+        streams.append((stream_start, index_start, blocks))
+        end = stream_start
+    index = SeekIndex("xz", 0, [])
+    out_pos = 0
+    for stream_start, index_start, blocks in reversed(streams):
+        comp_pos = stream_start + XZ_HEADER_SIZE
+        for comp_size, uncomp in blocks:
+            index.points.append([comp_pos, out_pos, index_start,
+                                 stream_start])
+            comp_pos += comp_size
+            out_pos += uncomp
+    index.size = out_pos
+    return index
+
+
+def get_index(fname, budget=None):
+    """Gives the seek index of a compressed file, building it if this process
+    has no index for the file as it is now
+
+    Parameters
+    ----------
+    fname : str
+        Full path to the file
+    budget : IoBudget
+        If not None, the I/O budget the reads of the first pass wait for
+
+    Returns
+    -------
+    index : SeekIndex
+        The index
+    """
+    stat = os.stat(fname)
+    with _INDEX_LOCK:
+        entry = _INDEXES.get(fname)
+    if entry is not None and entry[0] == stat.st_size and\
+            entry[1] == stat.st_mtime:
+        return entry[2]
+    index = build_index(fname, budget)
+    with _INDEX_LOCK:
+        _INDEXES[fname] = (stat.st_size, stat.st_mtime, index)
+    return index
+
+
+def get_data_size(fname, budget=None):
+    """Gives the size of the raw data of a file, uncompressed
+
+    Parameters
+    ----------
+    fname : str
+        Full path to the file
+    budget : IoBudget
+        If not None, the I/O budget the reads of the first pass wait for
+
+    Returns
+    -------
+    size : int
+        The size in bytes
+    """
+    if not is_compressed(fname):
+        return os.path.getsize(fname)
+    return get_index(fname, budget).size
+
+
+def load_indexes(cache, fnames):
+    """Takes the seek indexes of compressed files from the scan cache, so they
+    are not built again
+
+    Parameters
+    ----------
+    cache : ScanCache
+        The scan cache
+    fnames : list
+        Full paths to the files, the raw data files are skipped
+    """
+    for fname in fnames:
+        if not is_compressed(fname):
+            continue
+        json_index = cache.lookup(fname, "seek_index")
+        if json_index is None:
+            continue
+        stat = os.stat(fname)
+        with _INDEX_LOCK:
+            entry = _INDEXES.get(fname)
+            if entry is None or entry[0] != stat.st_size or\
+                    entry[1] != stat.st_mtime:
+                _INDEXES[fname] = (stat.st_size, stat.st_mtime,
+                                   SeekIndex.from_json(json_index))
+
+
+def save_indexes(cache, fnames):
+    """Stores the seek indexes this process built in the scan cache
+
+    Parameters
+    ----------
+    cache : ScanCache
+        The scan cache, it is not saved to disk here
+    fnames : list
+        Full paths to the files, the raw data files and the files with no
+        index are skipped
+    """
+    for fname in fnames:
+        with _INDEX_LOCK:
+            entry = _INDEXES.get(fname)
+        if entry is None or cache.lookup(fname, "seek_index") is not None:
+            continue
+        stat = os.stat(fname)
+        if entry[0] == stat.st_size and entry[1] == stat.st_mtime:
+            cache.store(fname, "seek_index", entry[2].to_json())
+
+
+class CompressedFile(object):
+    """This class reads a compressed file as if it were the raw data file,
+    with the read, seek and tell of a file object and the read_at of the I/O
+    backends. Reads move forward through the decompressed data, a read
+    behind the decompressor or far enough ahead of it to pass a restart point
+    starts again from the nearest restart point"""
+    def __init__(self, fname, budget=None):
+        """Opens the file, building its seek index if needed
+
+        Parameters
+        ----------
+        fname : str
+            Full path to the file
+        budget : IoBudget
+            If not None, the I/O budget the reads wait for
+        """
+        self.index = get_index(fname, budget)
+        self.in_file = open(fname, 'rb')
+        self.budget = budget
+        self.pos = 0
+        self.decomp = None
+        self.comp_pos = 0
+        self.comp_end = None
+        # decompressed bytes not read yet and the offset of the first of them
+        self.pending = b""
+        self.pending_pos = 0
+
+    def restart(self, start):
+        """Starts decompressing from a restart point
+
+        Parameters
+        ----------
+        start : tuple
+            The point, as given by SeekIndex.get_start
+        """
+        comp_pos, out_pos, comp_end, header_offset, decomp = start
+        if decomp is None:
+            decomp = make_decompressor(self.index.codec)
+            if header_offset is not None:
+                self.in_file.seek(header_offset, 0)
+                feed(decomp, self.in_file.read(XZ_HEADER_SIZE))
+        self.decomp = decomp
+        self.comp_pos = comp_pos
+        self.comp_end = comp_end
+        self.pending = b""
+        self.pending_pos = out_pos
+
+    def decompress_more(self):
+        """Decompresses the next chunk of the file into the pending bytes
+
+        Returns
+        -------
+        more : bool
+            False at the end of the file
+        """
+        out_end = self.pending_pos + len(self.pending)
+        if self.comp_pos >= self.comp_end:
+            start = self.index.get_next(out_end)
+            if start is None:
+                return False
+            pending = self.pending
+            self.restart(start)
+            self.pending = pending
+            self.pending_pos = out_end - len(pending)
+        size = min(CHUNK_SIZE, self.comp_end - self.comp_pos)
+        if self.budget is not None:
+            self.budget.acquire(size)
+        self.in_file.seek(self.comp_pos, 0)
+        data = self.in_file.read(size)
+        if len(data) == 0:
+            return False
+        out, leftover = feed(self.decomp, data)
+        self.comp_pos += len(data)
+        if leftover is not None:
+            self.comp_pos = self.comp_end
+        # keep only what is still to be read
+        drop = min(max(self.pos - self.pending_pos, 0), len(self.pending))
+        self.pending = self.pending[drop:] + out
+        self.pending_pos += drop
+        return True
+
+    def read(self, size=-1):
+        """Reads from the current position
+
+        Parameters
+        ----------
+        size : int
+            The number of bytes to read, all that are left if negative
+
+        Returns
+        -------
+        data : bytes
+            The bytes read, fewer than size at the end of the file
+        """
+        if size < 0:
+            size = self.index.size - self.pos
+        size = max(min(size, self.index.size - self.pos), 0)
+        if size == 0:
+            return b""
+        start = self.index.get_start(self.pos)
+        if self.decomp is None or self.pos < self.pending_pos or\
+                start[1] > self.pending_pos + len(self.pending):
+            self.restart(start)
+        while self.pending_pos + len(self.pending) < self.pos + size:
+            if not self.decompress_more():
+                break
+        begin = self.pos - self.pending_pos
+        data = self.pending[begin:begin + size]
+        self.pos += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        """Moves the current position, nothing is decompressed until the next
+        read
+
+        Parameters
+        ----------
+        offset : int
+            The offset to move to
+        whence : int
+            0 to count from the start, 1 from the current position and 2 from
+            the end of the decompressed data
+        """
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += self.index.size
+        if offset < 0:
+            raise ValueError("Negative offset {0:d}".format(offset))
+        self.pos = offset
+
+    def tell(self):
+        """Gives the current position
+
+        Returns
+        -------
+        pos : int
+            The offset in the decompressed data
+        """
+        return self.pos
+
+    def read_at(self, offset, size):
+        """Reads a region of the decompressed data
+
+        Parameters
+        ----------
+        offset : int
+            The offset of the region from the start of the raw data
+        size : int
+            The number of bytes to read, fewer are returned at the end of the
+            file
+
+        Returns
+        -------
+        data : bytes
+            The bytes read
+        """
+        self.seek(offset)
+        return self.read(size)
+
+    def fileno(self):
+        """Gives the file descriptor of the compressed file
+
+        Returns
+        -------
+        fileno : int
+            The file descriptor
+        """
+        return self.in_file.fileno()
+
+    def close(self):
+        """Closes the file, counting it in the budget"""
+        if self.budget is not None:
+            self.budget.file_closed(self)
+        self.in_file.close()
+        self.decomp = None
+        self.pending = b""
+
+
+def open_data_file(fname, budget=None):
+    """Opens a raw data file, or a compressed one, for reading
+
+    Parameters
+    ----------
+    fname : str
+        Full path to the file
+    budget : IoBudget
+        If not None, the I/O budget the reads of compressed files wait for
+
+    Returns
+    -------
+    in_file : file object
+        The opened file, a CompressedFile for a compressed file
+    """
+    if is_compressed(fname):
+        return CompressedFile(fname, budget)
+    return open(fname, 'rb')
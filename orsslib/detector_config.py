@@ -1,4 +1,5 @@
 """This file contains the definition of the detector and array setup classes"""
+from __future__ import print_function
 import os
 import orsslib.input_sanitizer as inp
 
@@ -115,17 +116,17 @@ class DetectorSetup(object):
         detnum : int
             The detector number this detector is stored as
         """
-        print "Detector Number:", detnum
-        print "                Digitizer Board:", self.digi_pair[0]
-        print "              Digitizer Channel:", self.digi_pair[1]
-        print "                     MPOD Board:", self.mpod_pair[0]
-        print "                   MPOD Channel:", self.mpod_pair[1]
-        print "                       X Offset:", self.pos_offset[0]
-        print "                       Y Offset:", self.pos_offset[1]
-        print "                       Z Offset:", self.pos_offset[2]
-        print "                  Detector Type:", self.det_type
-        print "  Energy Threshold for PSD Proj:", self.thresh_pair[0]
-        print "  PSD Threshold for Energy Proj:", self.thresh_pair[1]
+        print("Detector Number:", detnum)
+        print("                Digitizer Board:", self.digi_pair[0])
+        print("              Digitizer Channel:", self.digi_pair[1])
+        print("                     MPOD Board:", self.mpod_pair[0])
+        print("                   MPOD Channel:", self.mpod_pair[1])
+        print("                       X Offset:", self.pos_offset[0])
+        print("                       Y Offset:", self.pos_offset[1])
+        print("                       Z Offset:", self.pos_offset[2])
+        print("                  Detector Type:", self.det_type)
+        print("  Energy Threshold for PSD Proj:", self.thresh_pair[0])
+        print("  PSD Threshold for Energy Proj:", self.thresh_pair[1])
 
     @staticmethod
     def build_new_det(detnum):
@@ -153,7 +154,7 @@ class DetectorSetup(object):
             yoff = inp.get_float("New Y Offset")
             zoff = inp.get_float("New Z Offset")
             temp.append((xoff, yoff, zoff))
-            print "Known Detector Types are: NaI, LS, CeBr3, HeMod, HeUnmod"
+            print("Known Detector Types are: NaI, LS, CeBr3, HeMod, HeUnmod")
             new_type = inp.get_str("New Detector Type")
             temp.append(new_type)
             out_str = "New Energy Threshold for PSD Proj"
@@ -191,7 +192,7 @@ class DetectorSetup(object):
             zoff = inp.get_float("New Z Offset")
             self.pos_offset = (xoff, yoff, zoff)
         if inp.get_yes_no("Change Detector Type", default_value=False):
-            print "Known Types are: NaI, LS, CeBr3, HeMod, HeUnmod"
+            print("Known Types are: NaI, LS, CeBr3, HeMod, HeUnmod")
             new_type = inp.get_str("New Detector Type")
             self.det_type = new_type
         if inp.get_yes_no("Change Projection Thresholds", default_value=False):
@@ -223,9 +224,24 @@ class ArraySetup(object):
         """Prints the array setup in a pretty way"""
         temp = [(key, self.det_dict[key]) for key in self.det_dict]
         temp.sort(key=lambda x: x[0])
-        print COL_HEADERS
+        print(COL_HEADERS)
         for idnum, val in temp:
-            print DET_FORMAT_STR.format(idnum, *val.get_tuple())
+            print(DET_FORMAT_STR.format(idnum, *val.get_tuple()))
+
+    def get_array_setup_str(self):
+        """Gives the array setup in the format of the array setup file
+
+        Returns
+        -------
+        setup_str : str
+            The contents of the array setup file
+        """
+        temp = [(key, self.det_dict[key]) for key in self.det_dict]
+        temp.sort(key=lambda x: x[0])
+        lines = [COL_HEADERS_FILE]
+        for idnum, val in temp:
+            lines.append(DET_FORMAT_STR_FILE.format(idnum, *val.get_tuple()))
+        return "".join(lines)
 
     def write_array_setup(self, out_name):
         """Writes the array setup to a file in the correct format
@@ -235,26 +251,22 @@ class ArraySetup(object):
         out_name : str
             Output name of the file to be written
         """
-        temp = [(key, self.det_dict[key]) for key in self.det_dict]
-        temp.sort(key=lambda x: x[0])
         out_file = open(out_name, 'w')
-        out_file.write(COL_HEADERS_FILE)
-        for idnum, val in temp:
-            out_file.write(DET_FORMAT_STR_FILE.format(idnum, *val.get_tuple()))
+        out_file.write(self.get_array_setup_str())
         out_file.close()
 
     def get_array_changes(self):
         """Asks the user for changes in the setup"""
         self.print_array_setup()
-        print ""
+        print("")
         if inp.get_yes_no("Remove dets from the array", default_value=False):
             self.get_removed_dets()
         self.print_array_setup()
-        print ""
+        print("")
         if inp.get_yes_no("Add dets to the array", default_value=False):
             self.get_added_dets()
         self.print_array_setup()
-        print ""
+        print("")
         if inp.get_yes_no("Modify dets in the array", default_value=False):
             self.get_modded_dets()
 
@@ -267,7 +279,7 @@ class ArraySetup(object):
             if val in self.det_dict:
                 self.det_dict[val].get_user_value_changes(val)
             else:
-                print "Detector does not exist"
+                print("Detector does not exist")
             ans = inp.get_yes_no("Modify Another Detector",
                                  default_value=False)
 
@@ -278,7 +290,7 @@ class ArraySetup(object):
             self.print_array_setup()
             val = inp.get_int("New Detector Number")
             if val in self.det_dict:
-                print "Detector number already exists!"
+                print("Detector number already exists!")
             else:
                 new_det = DetectorSetup.build_new_det(val)
                 self.det_dict[val] = new_det
@@ -293,6 +305,6 @@ class ArraySetup(object):
             if val in self.det_dict:
                 del self.det_dict[val]
             else:
-                print "Detector number not in array setup!"
+                print("Detector number not in array setup!")
             ans = inp.get_yes_no("Remove Another Detector",
                                  default_value=False)
@@ -0,0 +1,272 @@
+"""This file contains the functions that find the copies of the same data in
+an input directory, files with the same run name, run number and sequence
+number under different names, and optionally files of the same run whose
+timestamps and times largely coincide, so that only one copy of the data is
+put into the batches"""
+from __future__ import print_function
+import os
+import datetime
+import orsslib.compressed_files as cf
+
+# which copy of a set of duplicates is kept, largest keeps the copy with the
+# most data, newest the copy modified last, keep keeps every copy and only
+# reports them
+POLICIES = ["largest", "newest", "keep"]
+
+# two files of the same run are copies by overlap only if both their
+# timestamp ranges and their times overlap by at least this fraction of the
+# shorter file's, neighbouring files of a run often overlap a little
+OVERLAP_FRACTION = 0.5
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def get_identity(fdat):
+    """Gives the header identity of a file
+
+    Parameters
+    ----------
+    fdat : list
+        The file name and file header info pair
+
+    Returns
+    -------
+    identity : tuple
+        The run name, run number and sequence number
+    """
+    return fdat[1][1], fdat[1][2], fdat[1][3]
+
+
+def pick_copy(fdats, policy):
+    """Picks the copy of a set of duplicates to keep
+
+    Parameters
+    ----------
+    fdats : list
+        The file name and file header info pairs of the copies
+    policy : str
+        largest or newest, ties are broken by the other and then by name
+
+    Returns
+    -------
+    fdat : list
+        The copy to keep
+    """
+    def get_size(fdat):
+        return cf.get_data_size(fdat[0])
+
+    def get_mtime(fdat):
+        return os.path.getmtime(fdat[0])
+    keys = ([get_size, get_mtime] if policy == "largest"
+            else [get_mtime, get_size])
+    # max gives the first of equal copies, the first by name, so the choice
+    # does not depend on the order of the list
+    return max(sorted(fdats, key=lambda x: x[0]),
+               key=lambda fdat: (keys[0](fdat), keys[1](fdat)))
+
+
+def coincide(first, second):
+    """Tells whether two ranges overlap by at least OVERLAP_FRACTION of the
+    shorter of them
+
+    Parameters
+    ----------
+    first : tuple
+        The start and end of one range
+    second : tuple
+        The start and end of the other range
+
+    Returns
+    -------
+    coinciding : bool
+        True if the ranges largely coincide
+    """
+    overlap = min(first[1], second[1]) - max(first[0], second[0])
+    shorter = min(first[1] - first[0], second[1] - second[0])
+    if shorter <= 0:
+        return tuple(first) == tuple(second)
+    return overlap >= OVERLAP_FRACTION * shorter
+
+
+def get_seconds(time):
+    """Converts a datetime to seconds so that its ranges can be compared
+
+    Parameters
+    ----------
+    time : datetime.datetime
+        The time
+
+    Returns
+    -------
+    seconds : float
+        Seconds since the epoch
+    """
+    return (time - EPOCH).total_seconds()
+
+
+def overlaps(first, second):
+    """Tells whether two files of the same run hold the same data, their
+    timestamp ranges largely coincide and so do the times they were written
+
+    Parameters
+    ----------
+    first : list
+        The file name and file header info pair of one file
+    second : list
+        The file name and file header info pair of the other file
+
+    Returns
+    -------
+    overlapping : bool
+        True if both ranges largely coincide
+    """
+    # a file without events has no timestamp range
+    if min(first[1][5], first[1][6], second[1][5], second[1][6]) < 0:
+        return False
+    return coincide((first[1][5], first[1][6]),
+                    (second[1][5], second[1][6])) and\
+        coincide((get_seconds(first[1][0]), get_seconds(first[1][4])),
+                 (get_seconds(second[1][0]), get_seconds(second[1][4])))
+
+
+def find_duplicates(file_list, policy, by_overlap=False):
+    """Finds the files that are copies of other files, through an index of
+    the header identities and, if asked for, a sweep over the timestamp
+    ranges of each run
+
+    Parameters
+    ----------
+    file_list : list
+        List of file names and file header info pairs
+    policy : str
+        One of POLICIES
+    by_overlap : bool
+        True if files of the same run whose timestamps and times largely
+        coincide are copies too
+
+    Returns
+    -------
+    dropped : list
+        List of (file name, file name of the copy kept, reason) tuples, in
+        the order of file_list, empty if the policy is keep
+    duplicates : list
+        The same tuples for every copy found, whatever the policy
+    """
+    duplicates = []
+    by_identity = {}
+    for fdat in file_list:
+        by_identity.setdefault(get_identity(fdat), []).append(fdat)
+    kept = []
+    for fdat in file_list:
+        copies = by_identity[get_identity(fdat)]
+        if len(copies) == 1:
+            kept.append(fdat)
+            continue
+        keep = pick_copy(copies, "largest" if policy == "keep" else policy)
+        if fdat is keep:
+            kept.append(fdat)
+        else:
+            duplicates.append((fdat[0], keep[0], "same run name, run number "
+                               "and sequence number"))
+    # if asked to, sweep the files of each run in order of first timestamp,
+    # each file is compared with the file that reaches furthest so far
+    by_run = {}
+    for fdat in (kept if by_overlap else []):
+        by_run.setdefault(get_identity(fdat)[:2], []).append(fdat)
+    for run_files in by_run.values():
+        run_files = sorted([fdat for fdat in run_files if fdat[1][5] >= 0],
+                           key=lambda x: (x[1][5], x[0]))
+        reach = None
+        for fdat in run_files:
+            if reach is not None and overlaps(reach, fdat):
+                keep = pick_copy([reach, fdat],
+                                 "largest" if policy == "keep" else policy)
+                drop = (fdat if keep is reach else reach)
+                duplicates.append((drop[0], keep[0], "coinciding timestamps "
+                                   "and times in the same run"))
+                reach = keep
+            elif reach is None or fdat[1][6] > reach[1][6]:
+                reach = fdat
+    order = dict([(fdat[0], ind) for ind, fdat in enumerate(file_list)])
+    duplicates.sort(key=lambda x: order[x[0]])
+    if policy == "keep":
+        return [], duplicates
+    return duplicates, duplicates
+
+
+def drop_duplicate_files(file_list, policy, by_overlap=False):
+    """Reports the files of the file list that are copies of other files and
+    drops them according to the policy
+
+    Parameters
+    ----------
+    file_list : list
+        List of file names and file header info pairs
+    policy : str
+        One of POLICIES
+    by_overlap : bool
+        True if files of the same run whose timestamps and times largely
+        coincide are copies too
+
+    Returns
+    -------
+    file_list : list
+        The file list without the dropped copies
+    """
+    dropped, duplicates = find_duplicates(file_list, policy, by_overlap)
+    if len(duplicates) == 0:
+        return file_list
+    report_duplicates(duplicates, policy)
+    names = set([fname for fname, _, _ in dropped])
+    return [fdat for fdat in file_list if fdat[0] not in names]
+
+
+def report_duplicates(duplicates, policy):
+    """Lists the copies found and the copy kept for each
+
+    Parameters
+    ----------
+    duplicates : list
+        List of (file name, file name of the copy kept, reason) tuples
+    policy : str
+        One of POLICIES, the copies are dropped unless it is keep
+    """
+    if policy == "keep":
+        print(len(duplicates), "files are copies of other files, all of them "
+              "are kept:")
+    else:
+        print("Dropped", len(duplicates), "files that are copies of other "
+              "files, keeping the", policy, "copy:")
+    for fname, keep, reason in duplicates:
+        print("  ", fname)
+        print("       {0:s} as {1:s}".format(reason, keep))
+
+
+def iter_unique_files(files, policy):
+    """Drops the copies from files sorted by start time as they stream past,
+    for file lists too long to hold at once. A copy has the same file header
+    as the file it copies, so it has the same start time and sits next to
+    it, only the files with the same start time are held and checked
+
+    Parameters
+    ----------
+    files : iterable
+        File names and file header info pairs in order of start time, it is
+        only iterated over once
+    policy : str
+        One of POLICIES
+
+    Yields
+    ------
+    fdat : list
+        The file name and file header info pair of each file kept
+    """
+    group = []
+    for fdat in files:
+        if len(group) > 0 and fdat[1][0] != group[0][1][0]:
+            for kept in drop_duplicate_files(group, policy):
+                yield kept
+            group = []
+        group.append(fdat)
+    for kept in drop_duplicate_files(group, policy):
+        yield kept
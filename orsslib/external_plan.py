@@ -0,0 +1,225 @@
+"""This file contains the pieces of the external memory planning mode, for
+campaigns with too many files to hold their header information in memory. The
+scanned headers are spilled to sorted runs on disk, a run every time the
+memory budget allows no more, and the runs are merged back in order of start
+time one file at a time, so the splitting and writing of the batches only ever
+hold the sub batch they are working on"""
+from __future__ import print_function
+import os
+import json
+import heapq
+import shutil
+try:
+    import resource
+except ImportError:
+    resource = None
+import orsslib.scan_cache as sc
+
+# estimate of the memory used per file by the scan, a file name, its header
+# information and the Python objects around them, with room to spare
+RECORD_BYTES = 1024
+
+# the share of the memory budget given to the files of a run being sorted,
+# the rest is left for the sub batch being written and the interpreter
+RUN_SHARE = 0.25
+
+# smallest number of files in a run
+MIN_RUN_FILES = 1000
+
+# most runs merged at once, more are merged in several passes
+MAX_FAN_IN = 64
+
+
+def get_run_files(memory_budget):
+    """Gives the number of files sorted in memory for each run
+
+    Parameters
+    ----------
+    memory_budget : float
+        The memory budget in MB
+
+    Returns
+    -------
+    run_files : int
+        The number of files in each run
+    """
+    return max(MIN_RUN_FILES,
+               int(memory_budget * 1048576 * RUN_SHARE) // RECORD_BYTES)
+
+
+def get_spill_dir(outdir, batch_name):
+    """Gives the directory the sorted runs of a batch are spilled to
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+    batch_name : str
+        Name of the overall batch (the name of the input directory)
+
+    Returns
+    -------
+    spill_dir : str
+        Path to the spill directory
+    """
+    return os.path.join(outdir, sc.CACHE_DIR_NAME, batch_name + "_spill")
+
+
+def iter_data_files(indir):
+    """Gives the full paths of the files in a directory without listing them
+    all at once where os.scandir is available
+
+    Parameters
+    ----------
+    indir : str
+        The directory
+
+    Yields
+    ------
+    fname : str
+        Full path to a file, in the order of os.listdir
+    """
+    scandir = getattr(os, "scandir", None)
+    if scandir is None:
+        for name in os.listdir(indir):
+            fname = os.path.join(indir, name)
+            if os.path.isfile(fname):
+                yield fname
+        return
+    for entry in scandir(indir):
+        if entry.is_file():
+            yield entry.path
+
+
+def read_run(run_path):
+    """Reads the records of a run back in order
+
+    Parameters
+    ----------
+    run_path : str
+        Path to the run file
+
+    Yields
+    ------
+    record : list
+        The start time string, sequence number, file name and json header of
+        a file
+    """
+    with open(run_path, 'r') as in_file:
+        for line in in_file:
+            yield json.loads(line)
+
+
+def write_run(run_path, records):
+    """Writes a sorted run
+
+    Parameters
+    ----------
+    run_path : str
+        Path to the run file
+    records : iterable
+        The records, in order
+    """
+    with open(run_path, 'w') as out_file:
+        for record in records:
+            out_file.write(json.dumps(record) + "\n")
+
+
+class SpillSorter(object):
+    """This class sorts the scanned files by start time with bounded memory,
+    files are added in the order they were listed and every run_files of them
+    are sorted and written to a run file"""
+    def __init__(self, spill_dir, run_files):
+        """Sets up an empty spill directory
+
+        Parameters
+        ----------
+        spill_dir : str
+            The directory the runs are written to, anything in it is removed
+        run_files : int
+            The number of files sorted in memory for each run
+        """
+        self.spill_dir = spill_dir
+        self.run_files = run_files
+        if os.path.isdir(spill_dir):
+            shutil.rmtree(spill_dir)
+        os.makedirs(spill_dir)
+        self.records = []
+        self.runs = []
+        self.num_files = 0
+        self.num_merged = 0
+
+    def add(self, fname, json_header):
+        """Adds a scanned file, spilling a run once enough files are added
+
+        Parameters
+        ----------
+        fname : str
+            Full path to the file
+        json_header : list
+            The header information of the file from header_to_json
+        """
+        # the sequence number keeps files that start at the same time in the
+        # order they were listed, as the stable sort of the file list does
+        self.records.append([json_header[0], self.num_files, fname,
+                             json_header])
+        self.num_files += 1
+        if len(self.records) >= self.run_files:
+            self.spill()
+
+    def spill(self):
+        """Sorts the files added since the last run and writes them as a
+        run"""
+        if len(self.records) == 0:
+            return
+        self.records.sort()
+        run_path = os.path.join(self.spill_dir,
+                                "run_{0:d}.jsonl".format(len(self.runs)))
+        write_run(run_path, self.records)
+        self.runs.append(run_path)
+        self.records = []
+
+    def merge(self):
+        """Merges the runs into the files in order of start time, merging
+        groups of runs first if there are more than MAX_FAN_IN of them
+
+        Yields
+        ------
+        fdat : list
+            The file name and file header info pair of each file, in the
+            order the file list is sorted in
+        """
+        self.spill()
+        while len(self.runs) > MAX_FAN_IN:
+            runs = []
+            for start in range(0, len(self.runs), MAX_FAN_IN):
+                group = self.runs[start:start + MAX_FAN_IN]
+                run_path = os.path.join(self.spill_dir, "merge_{0:d}.jsonl"
+                                        .format(self.num_merged))
+                self.num_merged += 1
+                write_run(run_path, heapq.merge(*[read_run(path)
+                                                  for path in group]))
+                for path in group:
+                    os.remove(path)
+                runs.append(run_path)
+            self.runs = runs
+        for record in heapq.merge(*[read_run(path) for path in self.runs]):
+            yield [str(record[2]), sc.header_from_json(record[3])]
+
+    def cleanup(self):
+        """Removes the spill directory"""
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+
+def get_peak_rss():
+    """Gives the most memory the process has held at once
+
+    Returns
+    -------
+    peak_rss : float
+        The peak resident set size in MB, None where it cannot be measured
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
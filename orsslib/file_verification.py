@@ -0,0 +1,237 @@
+"""This file contains the functions that walk every buffer of the raw data
+files to catch corrupt or truncated files before any jobs are generated"""
+from __future__ import print_function
+import struct
+import zlib
+import multiprocessing
+import orsslib.compressed_files as cf
+import orsslib.header_readers as hr
+import orsslib.input_sanitizer as inp
+import orsslib.orchid_format as ofmt
+
+
+def verify_file(args):
+    """Walks every buffer of a file, checking the buffer headers and that the
+    event chain of each buffer is intact
+
+    Parameters
+    ----------
+    args : tuple
+        The full path to the file and a bool that is True if a checksum of the
+        file contents should be calculated (a tuple so this can be used
+        directly with Pool.imap_unordered)
+
+    Returns
+    -------
+    fname : str
+        The full path to the file
+    result : dict
+        "ok" is True if no problems were found, "num_buffers" is the number of
+        complete buffers, "bad_buffers" is the list of indices of buffers with
+        problems, "problems" is a list of descriptions of the problems, and
+        "checksum" is the adler32 checksum of the file as a hex string or None
+    """
+    fname, do_checksum = args
+    result = {"ok": True, "num_buffers": 0, "bad_buffers": [], "problems": [],
+              "checksum": None}
+    try:
+        size = cf.get_data_size(fname)
+        if size < ofmt.MIN_FILE_SIZE:
+            result["ok"] = False
+            result["problems"].append("size < 1 Buffer plus a file header")
+            return fname, result
+        in_file = cf.open_data_file(fname)
+        try:
+            check_file(in_file, size, do_checksum, result)
+        finally:
+            in_file.close()
+    except (OSError, EOFError) + cf.DECOMPRESS_ERRORS as err:
+        # one unreadable file fails, the rest are still verified
+        result["ok"] = False
+        result["problems"].append("unreadable file ({0})".format(err))
+    return fname, result
+
+
+def check_file(in_file, size, do_checksum, result):
+    """Walks the file header and every buffer of an opened file, noting the
+    problems found in the result
+
+    Parameters
+    ----------
+    in_file : file object
+        The opened data file
+    size : int
+        The size of the raw data of the file in bytes
+    do_checksum : bool
+        True if a checksum of the file contents should be calculated
+    result : dict
+        The result of verify_file, updated in place
+    """
+    header_offset, num_buffers, remainder = hr.get_buffer_layout(in_file,
+                                                                 size)
+    result["num_buffers"] = num_buffers
+    checksum = 1
+    # check that the file header can be read
+    rawdata = in_file.read(ofmt.FILE_HEADER_SIZE)
+    if do_checksum:
+        checksum = zlib.adler32(rawdata, checksum)
+    try:
+        in_file.seek(header_offset, 0)
+        hr.read_file_header_info(in_file)
+    except (ValueError, struct.error):
+        result["ok"] = False
+        result["problems"].append("unreadable file header")
+    # now walk every buffer
+    in_file.seek(header_offset + ofmt.FILE_HEADER_SIZE, 0)
+    prev_end = 0
+    for buf_num in range(num_buffers):
+        rawdata = in_file.read(ofmt.BUFFER_SIZE)
+        if do_checksum:
+            checksum = zlib.adler32(rawdata, checksum)
+        problem = check_buffer(rawdata, prev_end)
+        if problem is not None:
+            result["ok"] = False
+            result["bad_buffers"].append(buf_num)
+            result["problems"].append("buffer {0:d}: {1:s}".format(buf_num,
+                                                                  problem))
+        else:
+            prev_end = ofmt.END_TIME.unpack_from(rawdata,
+                                                 ofmt.END_TIME.offset)[0]
+    # a partial buffer at the end is expected from time to time, flag it but
+    # do not fail the file for it
+    if remainder > 0:
+        result["problems"].append("{0:d} trailing bytes that are not a "
+                                  "complete buffer".format(remainder))
+    if do_checksum:
+        result["checksum"] = "{0:08x}".format(checksum & 0xffffffff)
+
+
+def check_buffer(rawdata, prev_end):
+    """Checks a single buffer for a sane buffer header and an intact event
+    chain
+
+    Parameters
+    ----------
+    rawdata : str
+        The raw bytes of the full buffer, buffer header included
+    prev_end : int
+        The buffer end time (in microseconds) of the previous good buffer
+
+    Returns
+    -------
+    problem : str
+        A description of the problem with the buffer or None if it is good
+    """
+    if len(rawdata) != ofmt.BUFFER_SIZE:
+        return "truncated buffer"
+    end_time = ofmt.END_TIME.unpack_from(rawdata, ofmt.END_TIME.offset)[0]
+    if end_time <= 0:
+        return "invalid buffer end time"
+    if end_time < prev_end:
+        return "buffer end time earlier than the previous buffer"
+    # walk the event chain, every event word has to be that of a known kind
+    # of event, a garbled word taken as a size could jump anywhere
+    unpack_word = ofmt.EVENT_WORD.unpack_from
+    ind = ofmt.BUFFER_HEADER_SIZE
+    while ind < (ofmt.BUFFER_SIZE - ofmt.EVENT_WORD.size):
+        word = unpack_word(rawdata, ind)[0]
+        size = ofmt.get_event_size(word)
+        if size is None:
+            return "unknown event word 0x{0:04x} at byte {1:d}".format(word,
+                                                                      ind)
+        if size == ofmt.END_OF_EVENTS:
+            return None
+        if (ind + size) > ofmt.BUFFER_SIZE:
+            return "event chain runs past the end of the buffer at byte "\
+                "{0:d}".format(ind)
+        ind += size
+    return None
+
+
+def verify_files(fnames, do_checksum, workers):
+    """Verifies a list of files using a pool of processes
+
+    Parameters
+    ----------
+    fnames : list
+        List of full paths to the files to verify
+    do_checksum : bool
+        True if a checksum of each file should be calculated
+    workers : int
+        Number of processes to verify files with
+
+    Returns
+    -------
+    results : dict
+        Dictionary mapping the file path to the result of verify_file
+    """
+    results = {}
+    if len(fnames) == 0:
+        return results
+    pool = multiprocessing.Pool(min(workers, len(fnames)))
+    try:
+        args = [(fname, do_checksum) for fname in fnames]
+        for count, (fname, result) in enumerate(
+                pool.imap_unordered(verify_file, args)):
+            results[fname] = result
+            print("  Verified {0:d} of {1:d} files\r".format(
+                count + 1, len(fnames)), end=" ")
+        print("")
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return results
+
+
+def filter_verified_files(file_list, cache, do_checksum, workers):
+    """Verifies every file in the file list (using cached results where the
+    file has not changed), reports the files that failed, and lets the user
+    exclude them from the batches
+
+    Parameters
+    ----------
+    file_list : list
+        List of file names and file header info pairs
+    cache : ScanCache
+        The scan cache that verification results are stored in
+    do_checksum : bool
+        True if a checksum of each file should be calculated
+    workers : int
+        Number of processes to verify files with
+
+    Returns
+    -------
+    file_list : list
+        The file list, without the failed files if the user chose to exclude
+        them
+    """
+    results = {}
+    to_verify = []
+    for fdat in file_list:
+        cached = cache.lookup(fdat[0], "verify")
+        if cached is None or (do_checksum and cached["checksum"] is None):
+            to_verify.append(fdat[0])
+        else:
+            results[fdat[0]] = cached
+    print("Verifying", len(to_verify), "files,", len(results), "cached")
+    # the worker processes inherit the seek indexes of compressed files
+    cf.load_indexes(cache, to_verify)
+    new_results = verify_files(to_verify, do_checksum, workers)
+    for fname in new_results:
+        cache.store(fname, "verify", new_results[fname])
+        results[fname] = new_results[fname]
+    cache.save()
+    failed = [fdat for fdat in file_list if not results[fdat[0]]["ok"]]
+    if len(failed) == 0:
+        print("All", len(file_list), "files passed verification")
+        return file_list
+    print(len(failed), "files failed verification:")
+    for fdat in failed:
+        print("  ", fdat[0])
+        for problem in results[fdat[0]]["problems"]:
+            print("      ", problem)
+    if inp.get_yes_no("Exclude files that failed verification",
+                      default_value=True):
+        return [fdat for fdat in file_list if results[fdat[0]]["ok"]]
+    return file_list
@@ -0,0 +1,390 @@
+"""This file contains the functions that read the file header, first buffer and
+last buffer of ORCHID raw data files to get the information needed to sort and
+split the files into batches"""
+from __future__ import print_function
+import struct
+import datetime
+# datetime.strptime imports this on its first use, on Python 2 that fails if
+# the first use is in several threads at once
+import _strptime
+import orsslib.compressed_files as cf
+import orsslib.io_backends as iobk
+import orsslib.orchid_format as ofmt
+
+# bytes at the start of the file header that hold the fields read from it
+HEADER_INFO_SIZE = ofmt.HEADER_INFO.offset + ofmt.HEADER_INFO.size
+# bytes at the start of a buffer header that hold the buffer end time
+END_TIME_SIZE = ofmt.END_TIME.offset + ofmt.END_TIME.size
+# bytes of the first buffer searched for the first event
+FIRST_EVENTS_SIZE = 16384
+# bytes read from the start of a file, enough for the leading buffer header,
+# the file header and the events searched in the first buffer
+HEAD_READ_SIZE = (ofmt.LEADING_BUFFER_SIZE + ofmt.FILE_HEADER_SIZE +
+                  ofmt.BUFFER_HEADER_SIZE + FIRST_EVENTS_SIZE)
+# the errors of reading and decoding a corrupt file, a garbled date, a field
+# past the end of the bytes read or an end time out of range, and of reading
+# a truncated or damaged compressed file
+HEADER_ERRORS = ((ValueError, struct.error, IOError, OverflowError) +
+                 cf.DECOMPRESS_ERRORS)
+
+
+def get_buffer_layout(in_file, size):
+    """Works out where the buffers of an opened data file sit, leaves the file
+    pointing at the start of the file header
+
+    Parameters
+    ----------
+    in_file : file object
+        The file object for the opened data file
+    size : int
+        The size of the file in bytes
+
+    Returns
+    -------
+    header_offset : int
+        The offset in bytes of the file header (non zero if the file starts
+        with the strange leading buffer header)
+    num_buffers : int
+        The number of complete buffers in the file
+    remainder : int
+        The number of bytes past the header(s) that are not a complete buffer
+    """
+    in_file.seek(0, 0)
+    rawdata = b""
+    # only files with room for it can start with the strange buffer header
+    if ((size - ofmt.FILE_HEADER_SIZE) % ofmt.BUFFER_SIZE) >=\
+            ofmt.LEADING_BUFFER_SIZE:
+        rawdata = in_file.read(ofmt.MARKER.size)
+    header_offset, num_buffers, remainder = parse_buffer_layout(rawdata, size)
+    in_file.seek(header_offset, 0)
+    return header_offset, num_buffers, remainder
+
+
+def parse_buffer_layout(rawdata, size):
+    """Works out where the buffers of a data file sit from the first bytes of
+    the file
+
+    Parameters
+    ----------
+    rawdata : bytes
+        The first bytes of the file, at least the marker of the strange
+        leading buffer header if the file may start with it
+    size : int
+        The size of the file in bytes
+
+    Returns
+    -------
+    header_offset : int
+        The offset in bytes of the file header (non zero if the file starts
+        with the strange leading buffer header)
+    num_buffers : int
+        The number of complete buffers in the file
+    remainder : int
+        The number of bytes past the header(s) that are not a complete buffer
+    """
+    # check for that strange buffer header at beginning of file bug
+    remainder = ((size - ofmt.FILE_HEADER_SIZE) % ofmt.BUFFER_SIZE)
+    header_offset = 0
+    # check for strange buffer header at beginning of file
+    if remainder >= ofmt.LEADING_BUFFER_SIZE:
+        start_int = ofmt.MARKER.unpack_from(rawdata, ofmt.MARKER.offset)[0]
+        if start_int == ofmt.LEADING_BUFFER_MARKER:
+            header_offset += ofmt.LEADING_BUFFER_SIZE
+    # check if the excess size has been accounted for, if not, assume that
+    # there is also a broken buffer at the end
+    num_buffers = ((size - ofmt.FILE_HEADER_SIZE - remainder) //
+                   ofmt.BUFFER_SIZE)
+    return header_offset, num_buffers, remainder - header_offset
+
+
+def get_file_header_data(fname, budget=None, backend=iobk.DEFAULT_BACKEND):
+    """Takes a file name, reads the file header data and returns date time data.
+    The file is read in two regions, the start of the file with the file
+    header and the first events, and the whole last buffer
+
+    Parameters
+    ----------
+    fname : str
+        Full path to the file
+    budget : IoBudget
+        If not None, the I/O budget the reads of the file wait for
+    backend : str
+        The name of the I/O backend to read the file with
+
+    Returns
+    -------
+    date : datetime.datetime object
+        The date as stated by the file header
+    run_name: str
+        The run name as stated by the file header
+    run_num: int
+        The run number as stated by the file header
+    seq_num: int
+        The file sequence number as stated by the file header
+    mod_time: datetime.datetime object
+        The date of last modification given by the OS
+    first_ts : int
+        The timestamp of the first event in the first buffer of the file
+    last_ts : int
+        The timestamp of the last event in the last buffer of the file
+
+    Returns None instead if the file is too short to hold a complete buffer,
+    its file header or first and last buffers cannot be decoded or it is a
+    truncated or damaged compressed file, such a file is left out of the
+    batches
+    """
+    try:
+        # first figure out what the file size is, uncompressed
+        size = cf.get_data_size(fname, budget)
+        if size < ofmt.MIN_FILE_SIZE:
+            print("Invalid file, it has a size < 1 Buffer plus a file header, "
+                  "it is left out")
+            print(fname)
+            return None
+        reader = iobk.open_reader(fname, backend, budget)
+        try:
+            head = reader.read_at(0, HEAD_READ_SIZE)
+            header_offset, num_buffers, _ = parse_buffer_layout(head, size)
+            last_buf_offset = header_offset + ofmt.FILE_HEADER_SIZE
+            last_buf_offset += (ofmt.BUFFER_SIZE * (num_buffers-1))
+            # now last_buf_offset should point to the start of the last buffer
+            tail = reader.read_at(last_buf_offset, ofmt.BUFFER_SIZE)
+        finally:
+            reader.close()
+        # now read the information from the file header
+        date, run_name, run_num, seq_num = parse_file_header_info(
+            head, header_offset)
+        # now read the first DppPsd event of the first buffer and get its
+        # timestamp
+        first_ts = parse_first_time_stamp(
+            head, header_offset + ofmt.FILE_HEADER_SIZE +
+            ofmt.BUFFER_HEADER_SIZE)
+        # get the last buffer end time
+        mod_time = parse_last_buffer_end(tail)
+        # read the last DppPsd event of the last buffer and get its timestamp
+        last_ts = parse_last_time_stamp(tail, ofmt.BUFFER_HEADER_SIZE)
+    except HEADER_ERRORS as err:
+        print("Invalid file, its header could not be read ({0}), it is left "
+              "out".format(err))
+        print(fname)
+        return None
+    # return everything
+    return (date, run_name, run_num, seq_num, mod_time, first_ts, last_ts)
+
+
+def read_last_time_stamp(in_file):
+    """Reads the last digitizer event's timestamp in the last buffer of the
+    file
+
+    Parameters
+    ----------
+    in_file : file object
+        The file object for the opened data file
+
+    Returns
+    -------
+    last_ts : int
+        the time stamp associated with the last event of the last file buffer
+    """
+    in_file.seek(ofmt.BUFFER_HEADER_SIZE - END_TIME_SIZE, 1)
+    return parse_last_time_stamp(in_file.read(ofmt.BUFFER_EVENTS_SIZE))
+
+
+def parse_last_time_stamp(rawdata, offset=0):
+    """Finds the last digitizer event's timestamp in the events of a buffer
+
+    Parameters
+    ----------
+    rawdata : bytes
+        Bytes that hold the events of the buffer
+    offset : int
+        The offset in rawdata of the first event, just past the buffer header
+
+    Returns
+    -------
+    last_ts : int
+        the time stamp associated with the last event of the buffer
+    """
+    unpack_word = ofmt.EVENT_WORD.unpack_from
+    ind = offset
+    last_event = None
+    end = offset + ofmt.BUFFER_EVENTS_SIZE - ofmt.EVENT_WORD.size
+    while ind < end:
+        word = unpack_word(rawdata, ind)[0]
+        if word == ofmt.DPP_PSD_TYPE:
+            last_event = ind
+            ind += ofmt.DPP_PSD_EVENT.size
+        elif word == ofmt.END_OF_EVENTS:
+            break
+        else:
+            ind += word
+    # only the timestamp of the last event is needed
+    if last_event is None:
+        return -1
+    return ofmt.get_time_stamp(rawdata, last_event)
+
+
+def read_last_buffer_end(in_file, last_buf_offset):
+    """Reads the final modification time of the last buffer in the file
+
+     Parameters
+    ----------
+    in_file : file object
+        The file object for the opened data file
+    last_buf_offset : int
+        The offset in bytes of the start of the last buffer in the file
+
+    Returns
+    -------
+    mod_time : datetime.datetime
+        the last modification time of the file by ORCHID
+    """
+    # seek to last buffer start, the end time is in the buffer header
+    in_file.seek((last_buf_offset), 0)
+    return parse_last_buffer_end(in_file.read(END_TIME_SIZE))
+
+
+def parse_last_buffer_end(rawdata, offset=0):
+    """Gives the end time recorded in a buffer header
+
+    Parameters
+    ----------
+    rawdata : bytes
+        Bytes that hold the buffer header
+    offset : int
+        The offset in rawdata of the buffer header
+
+    Returns
+    -------
+    mod_time : datetime.datetime
+        the time ORCHID finished writing the buffer
+    """
+    timestamp = float(ofmt.END_TIME.unpack_from(
+        rawdata, offset + ofmt.END_TIME.offset)[0])/1000000.0
+    return datetime.datetime.fromtimestamp(timestamp)
+
+
+def read_first_time_stamp(in_file):
+    """Reads the first digitizer event's timestamp in the first buffer of the
+    file
+
+    Parameters
+    ----------
+    in_file : file object
+        The file object for the opened data file
+
+    Returns
+    -------
+    first_ts : int
+        the time stamp associated with the first event of the first file buffer
+    """
+    # skip remainder of file header and buffer header
+    in_file.seek(ofmt.FILE_HEADER_SIZE - HEADER_INFO_SIZE +
+                 ofmt.BUFFER_HEADER_SIZE, 1)
+    return parse_first_time_stamp(in_file.read(FIRST_EVENTS_SIZE))
+
+
+def parse_first_time_stamp(rawdata, offset=0):
+    """Finds the first digitizer event's timestamp in the events of a buffer
+
+    Parameters
+    ----------
+    rawdata : bytes
+        Bytes that hold the start of the events of the buffer
+    offset : int
+        The offset in rawdata of the first event, just past the buffer header
+
+    Returns
+    -------
+    first_ts : int
+        the time stamp associated with the first event of the buffer, -1 if
+        the buffer has no events
+    """
+    first_ts = -1
+    ind = offset
+    while first_ts == -1:
+        word = ofmt.EVENT_WORD.unpack_from(rawdata, ind)[0]
+        if word == ofmt.DPP_PSD_TYPE:
+            # get the timestamp
+            first_ts = ofmt.get_time_stamp(rawdata, ind)
+        elif word == ofmt.END_OF_EVENTS:
+            # a buffer without events, stepping by 0 would never end
+            break
+        else:
+            ind += word
+    return first_ts
+
+
+def read_file_header_info(in_file):
+    """Reads the relevant information from the file header
+
+    Parameters
+    ----------
+    in_file : file object
+        The file object for the opened data file
+
+    Returns
+    -------
+    date : datetime.datetime
+        The datetime object representing the start of file writing
+    run_name : str
+        The name of the run
+    run_num : int
+        The number of the run
+    seq_num : int
+        The sequence number of the file
+    """
+    # read the start of the header up to the end of the fields read
+    return parse_file_header_info(in_file.read(HEADER_INFO_SIZE))
+
+
+def parse_file_header_info(rawdata, offset=0):
+    """Gives the relevant information in the bytes of a file header
+
+    Parameters
+    ----------
+    rawdata : bytes
+        Bytes that hold the start of the file header, at least
+        HEADER_INFO_SIZE bytes
+    offset : int
+        The offset in rawdata of the file header
+
+    Returns
+    -------
+    date : datetime.datetime
+        The datetime object representing the start of file writing
+    run_name : str
+        The name of the run
+    run_num : int
+        The number of the run
+    seq_num : int
+        The sequence number of the file
+    """
+    raw_date, raw_name, run_num, seq_num = ofmt.HEADER_INFO.unpack_from(
+        rawdata, offset + ofmt.HEADER_INFO.offset)
+    # convert the raw date string in the header
+    date = datetime.datetime.strptime(get_header_str(raw_date),
+                                      "%Y-%m-%dT%H:%M:%S.%f")
+    # convert the raw run name in the header
+    run_name = get_header_str(raw_name)
+    return (date, run_name, run_num, seq_num)
+
+
+def get_header_str(value):
+    """Gives a null padded string field of a file header as a native string,
+    bytes on Python 2 and text on Python 3
+
+    Parameters
+    ----------
+    value : bytes
+        The raw bytes of the field
+
+    Returns
+    -------
+    value : str
+        The field with the null padding removed
+    """
+    value = value.strip(b"\x00")
+    if isinstance(value, str):
+        return value
+    return value.decode("latin-1")
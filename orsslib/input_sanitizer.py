@@ -1,7 +1,14 @@
 """File with routines to ensure that the input obtained from users will convert
 correctly, satisfy the correct bounds, etc"""
+from __future__ import print_function
 import sys
 
+# the function that reads a line typed by the user, input on Python 3
+try:
+    read_input = raw_input
+except NameError:
+    read_input = input
+
 
 def test_bounds(value, kwargs):
     """Function to test if a numeric type falls within a set of bounds that may
@@ -23,24 +30,24 @@ def test_bounds(value, kwargs):
     # test either type of lower bound
     if "inclusive_lower_bound" in kwargs:
         if kwargs["inclusive_lower_bound"] > value:
-            print value, "is below the inclusive lower bound of",\
-                kwargs["inclusive_lower_bound"]
+            print(value, "is below the inclusive lower bound of",
+                  kwargs["inclusive_lower_bound"])
             return False
     elif "exclusive_lower_bound" in kwargs:
         if kwargs["exclusive_lower_bound"] >= value:
-            print value, "is below the exclusive lower bound of",\
-                kwargs["exclusive_lower_bound"]
+            print(value, "is below the exclusive lower bound of",
+                  kwargs["exclusive_lower_bound"])
             return False
     # test either type of upper bound
     if "inclusive_upper_bound" in kwargs:
         if kwargs["inclusive_upper_bound"] < value:
-            print value, "is above the inclusive upper bound of",\
-                kwargs["inclusive_upper_bound"]
+            print(value, "is above the inclusive upper bound of",
+                  kwargs["inclusive_upper_bound"])
             return False
     elif "exclusive_upper_bound" in kwargs:
         if kwargs["exclusive_upper_bound"] <= value:
-            print value, "is above the exclusive upper bound of",\
-                kwargs["exclusive_upper_bound"]
+            print(value, "is above the exclusive upper bound of",
+                  kwargs["exclusive_upper_bound"])
             return False
     return True
 
@@ -87,11 +94,11 @@ def get_float(prompt, **kwargs):
             if "default_value" in kwargs:
                 pstr = "{0:s} ({1:f})?> ".format(prompt,
                                                  kwargs["default_value"])
-                in_str = raw_input(pstr)
+                in_str = read_input(pstr)
             else:
-                in_str = raw_input("{0:s}?> ".format(prompt))
+                in_str = read_input("{0:s}?> ".format(prompt))
         except EOFError:
-            print "Got end of file exitting"
+            print("Got end of file exitting")
             sys.exit()
         # now try to convert it to float
         value = None
@@ -99,12 +106,12 @@ def get_float(prompt, **kwargs):
             if "default_value" in kwargs:
                 return kwargs["default_value"]
             else:
-                print "There is no default value, you must enter a value"
+                print("There is no default value, you must enter a value")
                 continue
         try:
             value = float(in_str)
         except ValueError:
-            print in_str, "cannot be converted to a float, try again"
+            print(in_str, "cannot be converted to a float, try again")
             continue
         # now test the bounds
         if test_bounds(value, kwargs):
@@ -154,11 +161,11 @@ def get_int(prompt, **kwargs):
             if "default_value" in kwargs:
                 pstr = "{0:s} ({1:d})?> ".format(prompt,
                                                  kwargs["default_value"])
-                in_str = raw_input(pstr)
+                in_str = read_input(pstr)
             else:
-                in_str = raw_input("{0:s}?> ".format(prompt))
+                in_str = read_input("{0:s}?> ".format(prompt))
         except EOFError:
-            print "Got end of file exitting"
+            print("Got end of file exitting")
             sys.exit()
         # now try to convert it to float
         value = None
@@ -166,12 +173,12 @@ def get_int(prompt, **kwargs):
             if "default_value" in kwargs:
                 return kwargs["default_value"]
             else:
-                print "There is no default value, you must enter a value"
+                print("There is no default value, you must enter a value")
                 continue
         try:
             value = int(in_str)
         except ValueError:
-            print in_str, "cannot be converted to an int, try again"
+            print(in_str, "cannot be converted to an int, try again")
             continue
         # now test the bounds
         if test_bounds(value, kwargs):
@@ -202,11 +209,11 @@ def get_bool(prompt, default_value=None):
             if default_value is not None:
                 def_str = ("T/f" if default_value else "t/F")
                 pstr = "{0:s} ({1:s})?> ".format(prompt, def_str)
-                in_str = raw_input(pstr)
+                in_str = read_input(pstr)
             else:
-                in_str = raw_input("{0:s}?> ".format(prompt))
+                in_str = read_input("{0:s}?> ".format(prompt))
         except EOFError:
-            print "Got end of file exitting"
+            print("Got end of file exitting")
             sys.exit()
         # now try to convert it to float
         value = None
@@ -214,14 +221,14 @@ def get_bool(prompt, default_value=None):
             if default_value is not None:
                 return default_value
             else:
-                print "There is no default value, you must enter a value"
+                print("There is no default value, you must enter a value")
                 continue
         if in_str.lower() in ['t', 'true']:
             value = True
         elif in_str.lower() in ['f', 'false']:
             value = False
         else:
-            print in_str, "cannot be converted to a boolean, try 'f' or 't'"
+            print(in_str, "cannot be converted to a boolean, try 'f' or 't'")
             continue
         successful_input = True
         return value
@@ -251,11 +258,11 @@ def get_yes_no(prompt, default_value=None):
             if default_value is not None:
                 def_str = ("Y/n" if default_value else "y/N")
                 pstr = "{0:s} ({1:s})?> ".format(prompt, def_str)
-                in_str = raw_input(pstr)
+                in_str = read_input(pstr)
             else:
-                in_str = raw_input("{0:s}?> ".format(prompt))
+                in_str = read_input("{0:s}?> ".format(prompt))
         except EOFError:
-            print "Got end of file exitting"
+            print("Got end of file exitting")
             sys.exit()
         # now try to convert it to float
         value = None
@@ -263,14 +270,14 @@ def get_yes_no(prompt, default_value=None):
             if default_value is not None:
                 return default_value
             else:
-                print "There is no default value, you must enter a value"
+                print("There is no default value, you must enter a value")
                 continue
         if in_str.lower() in ['y', 'yes']:
             value = True
         elif in_str.lower() in ['n', 'no']:
             value = False
         else:
-            print in_str, "cannot be converted to a yes or no, try 'y' or 'n'"
+            print(in_str, "cannot be converted to a yes or no, try 'y' or 'n'")
             continue
         successful_input = True
         return value
@@ -299,11 +306,11 @@ def get_str(prompt, default_value=None):
         try:
             if default_value is not None:
                 pstr = "{0:s} ({1:s})?> ".format(prompt, default_value)
-                in_str = raw_input(pstr)
+                in_str = read_input(pstr)
             else:
-                in_str = raw_input("{0:s}?> ".format(prompt))
+                in_str = read_input("{0:s}?> ".format(prompt))
         except EOFError:
-            print "Got end of file exitting"
+            print("Got end of file exitting")
             sys.exit()
         # now try to convert it to float
         value = None
@@ -311,7 +318,7 @@ def get_str(prompt, default_value=None):
             if default_value is not None:
                 return default_value
             else:
-                print "There is no default value, you must enter a value"
+                print("There is no default value, you must enter a value")
                 continue
         value = in_str
         successful_input = True
@@ -0,0 +1,220 @@
+"""This file contains the autotuner of the header reads. It reads the headers
+of the first files of a scan with each I/O backend and with more and more
+threads, timing each trial, and reads the rest of the files with the fastest
+backend and number of threads. Every file read in a trial is a file that
+needed reading anyway, so tuning costs nothing but the slower trials"""
+import time
+from multiprocessing.pool import ThreadPool
+import orsslib.header_readers as hr
+import orsslib.io_backends as iobk
+
+# the numbers of threads tried by the autotuner
+WORKER_COUNTS = [1, 2, 4, 8, 16]
+
+# number of files read in each trial
+FILES_PER_TRIAL = 8
+
+
+def read_headers(fnames, backend, workers, budget=None):
+    """Reads the headers of a list of files with a backend and a number of
+    threads
+
+    Parameters
+    ----------
+    fnames : list
+        Full paths to the files
+    backend : str
+        The name of the I/O backend
+    workers : int
+        Number of threads that read files at once
+    budget : IoBudget
+        If not None, the I/O budget the header reads wait for
+
+    Returns
+    -------
+    headers : list
+        The tuples returned by get_file_header_data, in the order of fnames
+    """
+    if workers == 1 or len(fnames) < 2:
+        return [hr.get_file_header_data(fname, budget, backend)
+                for fname in fnames]
+    pool = ThreadPool(min(workers, len(fnames)))
+    try:
+        headers = pool.map(lambda fname: hr.get_file_header_data(
+            fname, budget, backend), fnames)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return headers
+
+
+def get_rate(trial):
+    """Gives the number of files per second read in a trial
+
+    Parameters
+    ----------
+    trial : tuple
+        The backend, threads, files and seconds of the trial
+
+    Returns
+    -------
+    rate : float
+        Files read per second
+    """
+    return trial[2] / max(trial[3], 1.0e-9)
+
+
+class AutoTuner(object):
+    """This class reads file headers, picking the backend and the number of
+    threads that read fastest on the first files if they are not given"""
+    def __init__(self, backend="auto", workers=0,
+                 files_per_trial=FILES_PER_TRIAL):
+        """Sets up the tuner
+
+        Parameters
+        ----------
+        backend : str
+            The name of the I/O backend, or auto to try every backend
+            available
+        workers : int
+            Number of threads that read files at once, 0 to try each of
+            WORKER_COUNTS
+        files_per_trial : int
+            Number of files read in each trial
+        """
+        self.backend = backend
+        self.workers = workers
+        self.files_per_trial = files_per_trial
+        # (backend, threads, files, seconds) of each trial
+        self.trials = []
+        self.choice = None
+        self.num_files = 0
+
+    def read_headers(self, fnames, budget=None):
+        """Reads the headers of a list of files, tuning on the first of them
+        the first time it is called
+
+        Parameters
+        ----------
+        fnames : list
+            Full paths to the files
+        budget : IoBudget
+            If not None, the I/O budget the header reads wait for
+
+        Returns
+        -------
+        headers : list
+            The tuples returned by get_file_header_data, in the order of fnames
+        """
+        headers = []
+        if self.choice is None:
+            headers = self.tune(fnames, budget)
+        backend, workers = self.choice
+        headers.extend(read_headers(fnames[len(headers):], backend, workers,
+                                    budget))
+        self.num_files += len(fnames)
+        return headers
+
+    def tune(self, fnames, budget):
+        """Picks the backend and then the number of threads with trials on
+        the first files, if there are enough of them for the trials to leave
+        at least as many files again
+
+        Parameters
+        ----------
+        fnames : list
+            Full paths to the files
+        budget : IoBudget
+            If not None, the I/O budget the header reads wait for
+
+        Returns
+        -------
+        headers : list
+            The headers of the files read in the trials, the first files of
+            fnames
+        """
+        backends = (iobk.get_available_backends() if self.backend == "auto"
+                    else [self.backend])
+        worker_counts = (WORKER_COUNTS if self.workers == 0
+                         else [self.workers])
+        num_trials = len(backends) + len(worker_counts) - 1
+        if num_trials == 1 or\
+                len(fnames) < 2 * num_trials * self.files_per_trial:
+            self.choice = (backends[0], worker_counts[0])
+            return []
+        headers = []
+        for backend in backends:
+            headers.extend(self.run_trial(fnames, len(headers), backend,
+                                          worker_counts[0], budget))
+        backend = self.get_best()[0]
+        for workers in worker_counts[1:]:
+            headers.extend(self.run_trial(fnames, len(headers), backend,
+                                          workers, budget))
+        self.choice = self.get_best()
+        return headers
+
+    def run_trial(self, fnames, start, backend, workers, budget):
+        """Reads the headers of the next files and times it
+
+        Parameters
+        ----------
+        fnames : list
+            Full paths to the files
+        start : int
+            The index of the first file of the trial
+        backend : str
+            The name of the I/O backend
+        workers : int
+            Number of threads that read files at once
+        budget : IoBudget
+            If not None, the I/O budget the header reads wait for
+
+        Returns
+        -------
+        headers : list
+            The headers of the files read
+        """
+        trial_files = fnames[start:start + self.files_per_trial]
+        begin = time.time()
+        headers = read_headers(trial_files, backend, workers, budget)
+        self.trials.append((backend, workers, len(trial_files),
+                            time.time() - begin))
+        return headers
+
+    def get_best(self):
+        """Gives the fastest trial so far, the earliest of equally fast trials
+
+        Returns
+        -------
+        choice : tuple
+            The backend and number of threads of the trial
+        """
+        best = self.trials[0]
+        for trial in self.trials[1:]:
+            if get_rate(trial) > get_rate(best):
+                best = trial
+        return best[0], best[1]
+
+    def get_summary_str(self):
+        """Gives a description of how the headers were read and of the trials
+        that decided it
+
+        Returns
+        -------
+        summary : str
+            The description, several lines
+        """
+        backend, workers = self.choice
+        lines = ["Read the headers of {0:d} files with the {1:s} backend and "
+                 "{2:d} threads".format(self.num_files, backend, workers)]
+        if len(self.trials) == 0:
+            if self.backend == "auto" or self.workers == 0:
+                lines.append("  There were too few files to tune the reads")
+            return "\n".join(lines)
+        lines.append("  Chosen by the autotuner from {0:d} trials of {1:d} "
+                     "files:".format(len(self.trials), self.files_per_trial))
+        for trial in self.trials:
+            lines.append("    {0:>8s} {1:2d} threads {2:8.1f} files/s".format(
+                trial[0], trial[1], get_rate(trial)))
+        return "\n".join(lines)
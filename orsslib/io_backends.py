@@ -0,0 +1,235 @@
+"""This file contains the I/O backends the file headers are read with. Each
+backend opens a data file and reads regions of it at given offsets, through a
+buffered file object, with os.pread calls that need no seek, or through a read
+only memory map. Which of them is fastest depends on the storage the files are
+on, local disks or network file systems like NFS and Lustre. Compressed files
+are always read through compressed_files"""
+import os
+import mmap
+import orsslib.compressed_files as cf
+
+# the backends in the order they are tried by the autotuner, the first is the
+# one used when nothing else is asked for
+BACKEND_NAMES = ["buffered", "pread", "mmap"]
+
+DEFAULT_BACKEND = "buffered"
+
+
+class BufferedReader(object):
+    """This class reads regions of a data file through a buffered file
+    object"""
+    def __init__(self, fname, budget=None):
+        """Opens the file
+
+        Parameters
+        ----------
+        fname : str
+            Full path to the file
+        budget : IoBudget
+            If not None, the I/O budget the reads wait for
+        """
+        self.in_file = open(fname, 'rb')
+        self.budget = budget
+
+    def read_at(self, offset, size):
+        """Reads a region of the file
+
+        Parameters
+        ----------
+        offset : int
+            The offset of the region from the start of the file
+        size : int
+            The number of bytes to read, fewer are returned at the end of the
+            file
+
+        Returns
+        -------
+        data : bytes
+            The bytes read
+        """
+        if self.budget is not None:
+            self.budget.acquire(size)
+        self.in_file.seek(offset, 0)
+        return self.in_file.read(size)
+
+    def fileno(self):
+        """Gives the file descriptor of the file
+
+        Returns
+        -------
+        fileno : int
+            The file descriptor
+        """
+        return self.in_file.fileno()
+
+    def close(self):
+        """Closes the file, counting it in the budget"""
+        if self.budget is not None:
+            self.budget.file_closed(self)
+        self.in_file.close()
+
+
+class PreadReader(BufferedReader):
+    """This class reads regions of a data file with os.pread, each region is
+    read with one call at its offset without moving a file pointer"""
+    def __init__(self, fname, budget=None):
+        """Opens the file
+
+        Parameters
+        ----------
+        fname : str
+            Full path to the file
+        budget : IoBudget
+            If not None, the I/O budget the reads wait for
+        """
+        self.fdesc = os.open(fname, os.O_RDONLY)
+        self.budget = budget
+
+    def read_at(self, offset, size):
+        """Reads a region of the file
+
+        Parameters
+        ----------
+        offset : int
+            The offset of the region from the start of the file
+        size : int
+            The number of bytes to read, fewer are returned at the end of the
+            file
+
+        Returns
+        -------
+        data : bytes
+            The bytes read
+        """
+        if self.budget is not None:
+            self.budget.acquire(size)
+        blocks = []
+        while size > 0:
+            block = os.pread(self.fdesc, size, offset)
+            if not block:
+                break
+            blocks.append(block)
+            offset += len(block)
+            size -= len(block)
+        return blocks[0] if len(blocks) == 1 else b"".join(blocks)
+
+    def fileno(self):
+        """Gives the file descriptor of the file
+
+        Returns
+        -------
+        fileno : int
+            The file descriptor
+        """
+        return self.fdesc
+
+    def close(self):
+        """Closes the file, counting it in the budget"""
+        if self.budget is not None:
+            self.budget.file_closed(self)
+        os.close(self.fdesc)
+
+
+class MmapReader(BufferedReader):
+    """This class reads regions of a data file through a read only memory map
+    of the whole file, only the pages of the regions read are touched"""
+    def __init__(self, fname, budget=None):
+        """Opens and maps the file
+
+        Parameters
+        ----------
+        fname : str
+            Full path to the file
+        budget : IoBudget
+            If not None, the I/O budget the reads wait for
+        """
+        BufferedReader.__init__(self, fname, budget)
+        self.data = mmap.mmap(self.in_file.fileno(), 0,
+                              access=mmap.ACCESS_READ)
+
+    def read_at(self, offset, size):
+        """Reads a region of the file
+
+        Parameters
+        ----------
+        offset : int
+            The offset of the region from the start of the file
+        size : int
+            The number of bytes to read, fewer are returned at the end of the
+            file
+
+        Returns
+        -------
+        data : bytes
+            The bytes read
+        """
+        if offset < 0:
+            # a slice would silently count from the end of the map
+            raise ValueError("Negative offset {0:d}".format(offset))
+        if self.budget is not None:
+            self.budget.acquire(size)
+        return self.data[offset:offset + size]
+
+    def close(self):
+        """Unmaps and closes the file, counting it in the budget"""
+        self.data.close()
+        BufferedReader.close(self)
+
+
+READERS = {"buffered": BufferedReader,
+           "pread": PreadReader,
+           "mmap": MmapReader}
+
+
+def is_available(backend):
+    """Checks if a backend can be used with this Python
+
+    Parameters
+    ----------
+    backend : str
+        The name of the backend
+
+    Returns
+    -------
+    available : bool
+        True if the backend is known and can be used, os.pread needs Python
+        3.3 or later
+    """
+    if backend == "pread":
+        return hasattr(os, "pread")
+    return backend in READERS
+
+
+def get_available_backends():
+    """Gives the backends that can be used with this Python
+
+    Returns
+    -------
+    backends : list
+        The names of the backends, in the order of BACKEND_NAMES
+    """
+    return [name for name in BACKEND_NAMES if is_available(name)]
+
+
+def open_reader(fname, backend=DEFAULT_BACKEND, budget=None):
+    """Opens a data file for reading regions of it with a backend
+
+    Parameters
+    ----------
+    fname : str
+        Full path to the file
+    backend : str
+        The name of the backend, one of BACKEND_NAMES
+    budget : IoBudget
+        If not None, the I/O budget the reads wait for
+
+    Returns
+    -------
+    reader : BufferedReader
+        The reader of the backend, it must be closed once the reads are done.
+        Compressed files are read through their seek index whatever the
+        backend, with a CompressedFile
+    """
+    if cf.is_compressed(fname):
+        return cf.CompressedFile(fname, budget)
+    return READERS[backend](fname, budget)
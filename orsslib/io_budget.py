@@ -0,0 +1,170 @@
+"""This file contains the I/O budget used when reading file headers, it caps
+the rate of bytes and of read calls with token buckets so that scanning a
+directory the DAQ is still writing to does not take the disk bandwidth the
+DAQ needs, and can drop the files read from the page cache"""
+import os
+import time
+import ctypes
+import ctypes.util
+import threading
+
+# advice value for posix_fadvise on Linux, for Pythons without os.posix_fadvise
+POSIX_FADV_DONTNEED = getattr(os, "POSIX_FADV_DONTNEED", 4)
+
+_LIBC = None
+
+
+def drop_file_cache(fileno):
+    """Tells the kernel the pages of an open file will not be needed again
+
+    Parameters
+    ----------
+    fileno : int
+        The file descriptor of the file
+
+    Returns
+    -------
+    dropped : bool
+        True if the advice was given, False if posix_fadvise is not available
+    """
+    global _LIBC
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(fileno, 0, 0, POSIX_FADV_DONTNEED)
+        return True
+    if _LIBC is None:
+        lib_name = ctypes.util.find_library("c")
+        _LIBC = (ctypes.CDLL(lib_name) if lib_name is not None else False)
+    if not _LIBC or not hasattr(_LIBC, "posix_fadvise"):
+        return False
+    _LIBC.posix_fadvise(fileno, ctypes.c_longlong(0), ctypes.c_longlong(0),
+                        POSIX_FADV_DONTNEED)
+    return True
+
+
+class TokenBucket(object):
+    """This class is a token bucket that refills at a fixed rate and holds at
+    most one second of tokens. A request larger than the bucket is let through
+    once the bucket is full and leaves it in debt, so the long run rate is
+    still the set rate"""
+    def __init__(self, rate):
+        """Starts with an empty bucket so the rate is kept from the start
+
+        Parameters
+        ----------
+        rate : float
+            Tokens added per second
+        """
+        self.rate = float(rate)
+        self.tokens = 0.0
+        self.last = time.time()
+
+    def take(self, amount):
+        """Takes tokens from the bucket
+
+        Parameters
+        ----------
+        amount : float
+            The number of tokens needed
+
+        Returns
+        -------
+        wait : float
+            The number of seconds to wait before using the tokens
+        """
+        now = time.time()
+        self.tokens = min(self.rate,
+                          self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= amount
+        if self.tokens >= 0.0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class IoBudget(object):
+    """This class caps the rate of the header reads and keeps count of what
+    was read, it can be shared by several threads"""
+    def __init__(self, mb_per_sec=0.0, iops=0.0, drop_cache=False):
+        """Sets up the limits
+
+        Parameters
+        ----------
+        mb_per_sec : float
+            Largest number of MB (1e6 bytes) to read per second, 0 for no limit
+        iops : float
+            Largest number of reads per second, 0 for no limit
+        drop_cache : bool
+            True if the pages of each file should be dropped from the page
+            cache once the file has been read
+        """
+        self.byte_bucket = (None if mb_per_sec <= 0.0
+                            else TokenBucket(mb_per_sec * 1.0e6))
+        self.op_bucket = (None if iops <= 0.0 else TokenBucket(iops))
+        self.drop_cache = drop_cache
+        self.lock = threading.Lock()
+        self.num_bytes = 0
+        self.num_reads = 0
+        self.num_files = 0
+        self.waited = 0.0
+        self.start = None
+        self.end = None
+
+    def acquire(self, num_bytes):
+        """Waits until a read of a number of bytes fits in the budget
+
+        Parameters
+        ----------
+        num_bytes : int
+            The size of the read
+        """
+        with self.lock:
+            if self.start is None:
+                self.start = time.time()
+            wait = 0.0
+            if self.byte_bucket is not None:
+                wait = self.byte_bucket.take(num_bytes)
+            if self.op_bucket is not None:
+                wait = max(wait, self.op_bucket.take(1))
+            self.num_bytes += num_bytes
+            self.num_reads += 1
+            self.waited += wait
+        if wait > 0.0:
+            time.sleep(wait)
+
+    def file_closed(self, in_file):
+        """Counts a file whose reads are finished and drops it from the page
+        cache if asked to
+
+        Parameters
+        ----------
+        in_file : BufferedReader
+            The reader of the file from io_backends, or any object with a
+            fileno method, still open
+        """
+        if self.drop_cache:
+            drop_file_cache(in_file.fileno())
+        with self.lock:
+            self.num_files += 1
+            self.end = time.time()
+
+    def get_summary_str(self):
+        """Gives a description of what was read and the rates achieved
+
+        Returns
+        -------
+        summary : str
+            The description, several lines
+        """
+        elapsed = 0.0
+        if self.start is not None and self.end is not None:
+            elapsed = self.end - self.start
+        rate = (self.num_bytes / 1.0e6 / elapsed if elapsed > 0.0 else 0.0)
+        iops = (self.num_reads / elapsed if elapsed > 0.0 else 0.0)
+        return IO_SUMMARY_STR.format(self.num_files, self.num_bytes / 1.0e6,
+                                     self.num_reads, elapsed, rate, iops,
+                                     self.waited)
+
+
+IO_SUMMARY_STR = """Read the headers of {0:d} files: {1:.1f} MB in {2:d} reads over {3:.1f} s
+  Achieved {4:.2f} MB/s and {5:.1f} reads/s, {6:.1f} s were spent waiting for
+  the I/O budget"""
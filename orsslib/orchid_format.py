@@ -0,0 +1,235 @@
+"""This file declares the layout of ORCHID raw data files, the sizes of the file
+header and buffers and the fields of the file header, the buffer header and
+the DppPsd event, in one place. The readers decode the fields with the
+precompiled struct decoders (or NumPy dtypes) built here from the layouts, so
+a revision of the format only needs its layout changed here"""
+import struct
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FILE_HEADER_SIZE = 4096
+BUFFER_SIZE = 2097152
+BUFFER_HEADER_SIZE = 8192
+# size of the strange buffer header that sometimes sits at the start of a file
+LEADING_BUFFER_SIZE = 8192
+LEADING_BUFFER_MARKER = 0xf0f0f0f0
+# smallest valid file, a file header plus one buffer
+MIN_FILE_SIZE = FILE_HEADER_SIZE + BUFFER_SIZE
+# bytes of events in a buffer, after the buffer header
+BUFFER_EVENTS_SIZE = BUFFER_SIZE - BUFFER_HEADER_SIZE
+
+# the first two bytes of an event are DPP_PSD_TYPE for a DppPsd event, 0 past
+# the last event of a buffer and the size of the event in bytes otherwise
+DPP_PSD_TYPE = 0x020f
+END_OF_EVENTS = 0
+# the high bits of a timestamp are shifted up by this much
+TIME_STAMP_SHIFT = 31
+
+# the format characters of the fields, little endian, and the NumPy types
+NUMPY_TYPES = {"B": "u1", "H": "<u2", "I": "<u4", "q": "<i8"}
+
+
+class FieldDecoder(struct.Struct):
+    """This class is a precompiled struct that decodes some of the fields of a
+    layout, offset is where the first of them sits in the layout"""
+    def __init__(self, fmt, offset):
+        """Compiles the decoder
+
+        Parameters
+        ----------
+        fmt : str
+            The struct format of the fields
+        offset : int
+            The offset of the first field from the start of the layout
+        """
+        struct.Struct.__init__(self, fmt)
+        self.offset = offset
+
+
+class Layout(object):
+    """This class declares a fixed size block of little endian fields, the
+    bytes between the fields are skipped"""
+    def __init__(self, name, size, fields):
+        """Checks the fields and compiles the decoder of all of them
+
+        Parameters
+        ----------
+        name : str
+            The name of the block, used in error messages
+        size : int
+            The size of the block in bytes
+        fields : list
+            List of (name, offset, format) tuples, the format is a struct
+            format character with its count for strings, like 30s
+        """
+        self.name = name
+        self.size = size
+        self.fields = sorted(fields, key=lambda x: x[1])
+        self.offsets = dict([(field[0], field[1]) for field in self.fields])
+        self.formats = dict([(field[0], field[2]) for field in self.fields])
+        self.names = [field[0] for field in self.fields]
+        self.decoders = {}
+        self.struct = self.decoder(*self.names)
+        if self.struct.offset + self.struct.size > size:
+            raise ValueError("The fields of the {0:s} run past its {1:d} "
+                             "bytes".format(name, size))
+
+    def decoder(self, *names):
+        """Gives the precompiled decoder of some of the fields, they are
+        decoded in the order of their offsets
+
+        Parameters
+        ----------
+        *names : str
+            The names of the fields
+
+        Returns
+        -------
+        decoder : FieldDecoder
+            The decoder, unpack_from at the offset of the layout plus
+            decoder.offset gives the values of the fields
+        """
+        if names not in self.decoders:
+            fields = [field for field in self.fields if field[0] in names]
+            if len(fields) != len(names):
+                raise ValueError("Unknown field of the {0:s} in {1:s}".format(
+                    self.name, ", ".join(names)))
+            fmt = "<"
+            pos = fields[0][1]
+            for _, offset, code in fields:
+                if offset < pos:
+                    raise ValueError("Overlapping fields in the " + self.name)
+                if offset > pos:
+                    fmt += "{0:d}x".format(offset - pos)
+                fmt += code
+                pos = offset + struct.calcsize("<" + code)
+            self.decoders[names] = FieldDecoder(fmt, fields[0][1])
+        return self.decoders[names]
+
+    def unpack(self, rawdata, offset=0):
+        """Decodes every field of the block
+
+        Parameters
+        ----------
+        rawdata : bytes
+            Bytes that hold the block
+        offset : int
+            The offset of the block in rawdata
+
+        Returns
+        -------
+        values : dict
+            Dictionary of field name to value
+        """
+        return dict(zip(self.names, self.struct.unpack_from(
+            rawdata, offset + self.struct.offset)))
+
+    def get_dtype(self, itemsize=None):
+        """Gives a NumPy dtype of the fields of the block, for decoding many
+        blocks at once
+
+        Parameters
+        ----------
+        itemsize : int
+            The distance in bytes between neighbouring blocks, the size of
+            the block if None
+
+        Returns
+        -------
+        dtype : numpy.dtype
+            The dtype, None if NumPy is not installed
+        """
+        if np is None:
+            return None
+        formats = []
+        for name in self.names:
+            code = self.formats[name]
+            if code.endswith("s"):
+                formats.append("S" + code[:-1])
+            else:
+                formats.append(NUMPY_TYPES[code])
+        return np.dtype({"names": self.names, "formats": formats,
+                         "offsets": [self.offsets[name] for name in self.names],
+                         "itemsize": (self.size if itemsize is None
+                                      else itemsize)})
+
+
+FILE_HEADER = Layout("file header", FILE_HEADER_SIZE,
+                     [("date", 26, "30s"),
+                      ("run_name", 56, "100s"),
+                      ("run_num", 156, "I"),
+                      ("seq_num", 160, "I")])
+
+LEADING_BUFFER = Layout("leading buffer header", LEADING_BUFFER_SIZE,
+                        [("marker", 0, "I")])
+
+# end_time is the time ORCHID finished writing the buffer, in microseconds
+# since the epoch
+BUFFER_HEADER = Layout("buffer header", BUFFER_HEADER_SIZE,
+                       [("end_time", 24, "q")])
+
+# the part of every event that says what it is or how long it is
+EVENT_HEADER = Layout("event header", 2, [("word", 0, "H")])
+
+DPP_PSD_EVENT = Layout("DppPsd event", 15,
+                       [("type", 0, "H"),
+                        ("board", 2, "B"),
+                        ("channel", 3, "B"),
+                        ("lo_time", 4, "I"),
+                        ("hi_time", 8, "H")])
+
+# decoders used by the readers
+MARKER = LEADING_BUFFER.decoder("marker")
+HEADER_INFO = FILE_HEADER.decoder("date", "run_name", "run_num", "seq_num")
+END_TIME = BUFFER_HEADER.decoder("end_time")
+EVENT_WORD = EVENT_HEADER.decoder("word")
+EVENT_CHANNEL = DPP_PSD_EVENT.decoder("board", "channel")
+EVENT_TIME = DPP_PSD_EVENT.decoder("lo_time", "hi_time")
+
+# the size of each kind of event by its event word, the high byte of the word
+# says what the event is and the low byte how long it is
+EVENT_SIZES = {DPP_PSD_TYPE: DPP_PSD_EVENT.size}
+for _word, _size in EVENT_SIZES.items():
+    if (_word & 0xff) != _size:
+        raise ValueError("The event word 0x{0:04x} does not hold the event "
+                         "size {1:d}".format(_word, _size))
+
+
+def get_time_stamp(rawdata, offset):
+    """Decodes the timestamp of a DppPsd event
+
+    Parameters
+    ----------
+    rawdata : bytes
+        Bytes that hold the event
+    offset : int
+        The offset of the event in rawdata
+
+    Returns
+    -------
+    time_stamp : int
+        The timestamp of the event
+    """
+    lotime, hitime = EVENT_TIME.unpack_from(rawdata, offset + EVENT_TIME.offset)
+    return (hitime << TIME_STAMP_SHIFT) + lotime
+
+
+def get_event_size(word):
+    """Gives the number of bytes to the next event
+
+    Parameters
+    ----------
+    word : int
+        The first two bytes of the event, decoded with EVENT_WORD
+
+    Returns
+    -------
+    size : int
+        The size of the event, 0 past the last event of a buffer and None if
+        the word is not that of a known kind of event
+    """
+    if word == END_OF_EVENTS:
+        return END_OF_EVENTS
+    return EVENT_SIZES.get(word)
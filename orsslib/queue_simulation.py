@@ -0,0 +1,130 @@
+"""This file contains a discrete event simulation of the batch queue running
+the jobs of one or more batch manifests, used to estimate how long a campaign
+will take with different numbers of nodes and queue limits before submitting
+it"""
+import heapq
+import collections
+import orsslib.submit_planning as sp
+
+# rate, in MB/s, that a single OrchidReader job gets through the raw data
+DEFAULT_RATE = 20.0
+# seconds each batch job spends copying and building OrchidReader
+DEFAULT_OVERHEAD = 300.0
+# seconds a merge job takes
+DEFAULT_MERGE_TIME = 60.0
+
+
+def get_plan_jobs(manifests, rate=DEFAULT_RATE, overhead=DEFAULT_OVERHEAD,
+                  merge_time=DEFAULT_MERGE_TIME, policy="timeline"):
+    """Turns the batches of a set of manifests into a list of jobs with
+    estimated run times, in the order submit_script submits them
+
+    Parameters
+    ----------
+    manifests : list
+        List of manifests as returned by batch_manifest.read_manifest
+    rate : float
+        Rate, in MB/s, that a single job gets through the raw data
+    overhead : float
+        Seconds each batch job spends before it starts reading data
+    merge_time : float
+        Seconds a merge job takes
+    policy : str
+        The order submit_script submits the batches in, one of
+        submit_planning.POLICIES
+
+    Returns
+    -------
+    jobs : list
+        List of dictionaries with the job "name", "bytes", estimated "runtime"
+        in seconds, and "deps", the list of indices of jobs that must finish
+        before the job can start
+    """
+    jobs = []
+    for manifest in manifests:
+        index = {}
+        batches = manifest["batches"]
+        order = sp.order_batches([batch["bytes"] for batch in batches],
+                                 policy)
+        for batch in [batches[ind] for ind in order]:
+            index[batch["dir"]] = len(jobs)
+            runtime = overhead + float(batch["bytes"]) / (rate * 1.0e6)
+            jobs.append({"name": batch["name"], "bytes": batch["bytes"],
+                         "runtime": runtime, "deps": []})
+        for merge in manifest["merges"]:
+            jobs.append({"name": "merge:" + merge["dir"], "bytes": 0,
+                         "runtime": merge_time,
+                         "deps": [index[chunk] for chunk in merge["chunks"]]})
+    return jobs
+
+
+def simulate_queue(jobs, nodes, jobs_per_node=1, max_running=0):
+    """Simulates a first in first out queue running a list of jobs
+
+    Parameters
+    ----------
+    jobs : list
+        List of jobs as returned by get_plan_jobs, in submission order
+    nodes : int
+        Number of nodes the jobs can run on
+    jobs_per_node : int
+        Number of jobs that can run on a node at once
+    max_running : int
+        Maximum number of the jobs that the queue lets run at once (a user or
+        job array throttle), 0 for no limit
+
+    Returns
+    -------
+    result : dict
+        "makespan" is the seconds until the last job finishes, "utilization"
+        is the fraction of the node slots kept busy over the makespan,
+        "start" and "end" are lists of the start and end times of each job, and
+        "critical" is the list of indices of the chain of jobs that ends with
+        the last job to finish, each job in the chain started when the job
+        before it finished (either as a dependency or by freeing its slot)
+    """
+    slots = nodes * jobs_per_node
+    capacity = slots
+    if max_running > 0:
+        capacity = min(capacity, max_running)
+    waiting_deps = [len(job["deps"]) for job in jobs]
+    dependents = [[] for _ in jobs]
+    for ind, job in enumerate(jobs):
+        for dep in job["deps"]:
+            dependents[dep].append(ind)
+    ready = collections.deque([ind for ind in range(len(jobs))
+                               if waiting_deps[ind] == 0])
+    start = [None] * len(jobs)
+    end = [None] * len(jobs)
+    blocker = [None] * len(jobs)
+    running = []
+    time = 0.0
+    last_finished = None
+    while len(ready) > 0 or len(running) > 0:
+        # start everything that there is room for
+        while len(ready) > 0 and len(running) < capacity:
+            ind = ready.popleft()
+            start[ind] = time
+            end[ind] = time + jobs[ind]["runtime"]
+            blocker[ind] = last_finished
+            heapq.heappush(running, (end[ind], ind))
+        # move on to the next job to finish
+        time, last_finished = heapq.heappop(running)
+        for dep in dependents[last_finished]:
+            waiting_deps[dep] -= 1
+            if waiting_deps[dep] == 0:
+                ready.append(dep)
+    if len(jobs) == 0:
+        return {"makespan": 0.0, "utilization": 0.0, "start": start,
+                "end": end, "critical": []}
+    makespan = max(end)
+    busy = sum([job["runtime"] for job in jobs])
+    critical = []
+    ind = end.index(makespan)
+    while ind is not None:
+        critical.append(ind)
+        ind = blocker[ind]
+    critical.reverse()
+    utilization = (busy / (slots * makespan) if makespan > 0.0 else 0.0)
+    return {"makespan": makespan, "utilization": utilization, "start": start,
+            "end": end, "critical": critical}
@@ -0,0 +1,332 @@
+"""This file contains the result harvester, which collects the csv files that
+OrchidReader writes in every batch directory of the batch manifests into one
+columnar table per kind of csv file for the whole campaign, each row tagged
+with the sub batch, detector setup and position it came from. The parsed csv
+files are kept in a harvest cache so that a later harvest only reads the files
+that changed"""
+from __future__ import print_function
+import os
+import sys
+import csv
+from multiprocessing.pool import ThreadPool
+import orsslib.scan_cache as sc
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the csv files written in every batch directory, in the order of the tables
+CSV_KINDS = ["batch_data", "det_meta_data", "run_data"]
+
+ROOT_FILE_NAME = "batch_hists.root"
+
+RESULTS_DIR_NAME = "orss_results"
+
+# the columns every row of the tables is tagged with, named as in the run
+# catalog
+TAG_COLUMNS = ["batch_name", "batch_dir", "setup", "position", "x", "y"]
+
+DEFAULT_WORKERS = 8
+
+
+def get_cache_path(outdir):
+    """Gives the path of the harvest cache of a base output directory
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+
+    Returns
+    -------
+    cache_path : str
+        Path to the harvest cache
+    """
+    return os.path.join(outdir, sc.CACHE_DIR_NAME, "orss_harvest.json")
+
+
+def get_table_path(outdir, kind):
+    """Gives the path of the harvested table of a kind of csv file
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+    kind : str
+        One of CSV_KINDS
+
+    Returns
+    -------
+    table_path : str
+        Path to the .npz file of the table
+    """
+    return os.path.join(outdir, RESULTS_DIR_NAME, kind + ".npz")
+
+
+def get_output_batches(manifests):
+    """Gives the directories that hold the final outputs of the batches of a
+    set of manifests, the sub batches that were cut into chunks have their
+    outputs merged into the sub batch directory
+
+    Parameters
+    ----------
+    manifests : list
+        The manifests, as from read_manifest
+
+    Returns
+    -------
+    batches : list
+        List of dictionaries with the TAG_COLUMNS of each directory
+    """
+    batches = []
+    for manifest in manifests:
+        merged = {}
+        for batch in manifest["batches"]:
+            tags = {"batch_name": batch["name"], "batch_dir": batch["dir"],
+                    "setup": batch["setup"], "position": batch["position"],
+                    "x": batch["x"], "y": batch["y"]}
+            if batch["chunk_of"] is None:
+                batches.append(tags)
+            elif batch["chunk_of"] not in merged:
+                # the merged outputs take the tags of the first chunk
+                tags["batch_dir"] = batch["chunk_of"]
+                tags["batch_name"] = os.path.basename(batch["chunk_of"])
+                merged[batch["chunk_of"]] = tags
+                batches.append(tags)
+    return batches
+
+
+def open_csv(path):
+    """Opens a csv file for the csv module
+
+    Parameters
+    ----------
+    path : str
+        Path to the csv file
+
+    Returns
+    -------
+    in_file : file object
+        The opened file
+    """
+    if sys.version_info[0] < 3:
+        return open(path, 'rb')
+    return open(path, 'r', newline='')
+
+
+def parse_csv(path):
+    """Reads a csv file written by OrchidReader
+
+    Parameters
+    ----------
+    path : str
+        Path to the csv file
+
+    Returns
+    -------
+    parsed : dict
+        "header" is the list of column names, "rows" the list of rows (lists
+        of strings with one value per column) and "problems" a list of
+        descriptions of what is wrong with the file, empty if nothing is
+    """
+    parsed = {"header": [], "rows": [], "problems": []}
+    with open_csv(path) as in_file:
+        lines = list(csv.reader(in_file))
+    with open(path, 'rb') as in_file:
+        in_file.seek(0, 2)
+        size = in_file.tell()
+        if size > 0:
+            in_file.seek(-1, 2)
+            if in_file.read(1) != b"\n":
+                parsed["problems"].append("does not end with a newline, it "
+                                          "may still be being written")
+    if len(lines) == 0:
+        parsed["problems"].append("is empty")
+        return parsed
+    parsed["header"] = [name.strip() for name in lines[0]]
+    for line_num, row in enumerate(lines[1:], 2):
+        if len(row) == 0:
+            continue
+        if len(row) != len(parsed["header"]):
+            parsed["problems"].append("line {0:d} has {1:d} fields, the "
+                                      "header has {2:d}".format(
+                                          line_num, len(row),
+                                          len(parsed["header"])))
+            continue
+        parsed["rows"].append([value.strip() for value in row])
+    if len(parsed["rows"]) == 0:
+        parsed["problems"].append("has no rows")
+    return parsed
+
+
+def harvest_batch(batch_dir, cache):
+    """Reads the outputs of one batch directory, taking the csv files that
+    have not changed from the cache, this is run by the harvest threads
+
+    Parameters
+    ----------
+    batch_dir : str
+        The batch directory
+    cache : ScanCache
+        The harvest cache, only looked up here
+
+    Returns
+    -------
+    batch_dir : str
+        The batch directory
+    parsed : dict
+        Dictionary mapping each of CSV_KINDS to the parsed csv file from
+        parse_csv, or None if it is missing
+    new : dict
+        The parsed csv files that were read rather than taken from the cache,
+        keyed by path
+    problems : list
+        Descriptions of the outputs that are missing or incomplete
+    """
+    parsed = {}
+    new = {}
+    problems = []
+    for kind in CSV_KINDS:
+        path = os.path.join(batch_dir, kind + ".csv")
+        if not os.path.isfile(path):
+            parsed[kind] = None
+            problems.append(kind + ".csv is missing")
+            continue
+        parsed[kind] = cache.lookup(path, "harvest")
+        if parsed[kind] is None:
+            parsed[kind] = parse_csv(path)
+            new[path] = parsed[kind]
+        problems.extend(["{0:s}.csv {1:s}".format(kind, problem)
+                         for problem in parsed[kind]["problems"]])
+    root_path = os.path.join(batch_dir, ROOT_FILE_NAME)
+    if not os.path.isfile(root_path):
+        problems.append(ROOT_FILE_NAME + " is missing")
+    elif os.path.getsize(root_path) == 0:
+        problems.append(ROOT_FILE_NAME + " is empty")
+    return batch_dir, parsed, new, problems
+
+
+def harvest(batches, cache, workers=DEFAULT_WORKERS):
+    """Reads the outputs of every batch directory with a pool of threads
+
+    Parameters
+    ----------
+    batches : list
+        The batches from get_output_batches
+    cache : ScanCache
+        The harvest cache, the csv files read are stored in it and files that
+        no longer belong to any batch are dropped from it
+    workers : int
+        Number of threads reading batch directories at once
+
+    Returns
+    -------
+    results : dict
+        Dictionary mapping each batch directory to its parsed csv files, as
+        returned by harvest_batch
+    problems : dict
+        Dictionary mapping each batch directory with missing or incomplete
+        outputs to the descriptions of them
+    num_read : int
+        The number of csv files that were read rather than taken from the
+        cache
+    """
+    results = {}
+    problems = {}
+    num_read = 0
+    dirs = [batch["batch_dir"] for batch in batches]
+    if len(dirs) > 0:
+        pool = ThreadPool(min(workers, len(dirs)))
+        try:
+            for batch_dir, parsed, new, batch_problems in pool.imap_unordered(
+                    lambda batch_dir: harvest_batch(batch_dir, cache), dirs):
+                results[batch_dir] = parsed
+                if len(batch_problems) > 0:
+                    problems[batch_dir] = batch_problems
+                for path in new:
+                    cache.store(path, "harvest", new[path])
+                num_read += len(new)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+    cache.prune([os.path.join(batch_dir, kind + ".csv") for batch_dir in dirs
+                 for kind in CSV_KINDS])
+    cache.save()
+    return results, problems, num_read
+
+
+def convert_column(values):
+    """Converts the strings of a column to the narrowest of integers, floats
+    and strings that holds all of them
+
+    Parameters
+    ----------
+    values : list
+        The values, None where a batch had no such column
+
+    Returns
+    -------
+    column : numpy.ndarray
+        The column, missing values are NaN in numeric columns and empty in
+        string columns
+    """
+    present = [value for value in values if value is not None]
+    for dtype in [np.int64, np.float64]:
+        if dtype == np.int64 and len(present) < len(values):
+            # integers have no missing value
+            continue
+        try:
+            return np.array([(float("nan") if value is None else dtype(value))
+                             for value in values], dtype=dtype)
+        except ValueError:
+            pass
+    return np.array([("" if value is None else value) for value in values],
+                    dtype="U")
+
+
+def build_table(batches, results, kind):
+    """Builds the campaign wide table of one kind of csv file
+
+    Parameters
+    ----------
+    batches : list
+        The batches from get_output_batches, the rows are in their order
+    results : dict
+        The parsed csv files of each batch directory, from harvest
+    kind : str
+        One of CSV_KINDS
+
+    Returns
+    -------
+    columns : dict
+        Dictionary of NumPy arrays keyed by the TAG_COLUMNS and the column
+        names of the csv files, a column missing from the csv files of some
+        batches is blank in their rows
+    """
+    names = []
+    for batch in batches:
+        parsed = results[batch["batch_dir"]][kind]
+        if parsed is not None:
+            names.extend([name for name in parsed["header"]
+                          if name not in names and name not in TAG_COLUMNS])
+    values = dict([(name, []) for name in TAG_COLUMNS + names])
+    for batch in batches:
+        parsed = results[batch["batch_dir"]][kind]
+        if parsed is None:
+            continue
+        index = dict([(name, ind) for ind, name in
+                      enumerate(parsed["header"])])
+        for row in parsed["rows"]:
+            for name in TAG_COLUMNS:
+                values[name].append(batch[name])
+            for name in names:
+                values[name].append(row[index[name]] if name in index
+                                    else None)
+    columns = dict([(name, np.array(values[name], dtype="U"))
+                    for name in TAG_COLUMNS[:4]])
+    columns["x"] = np.array(values["x"], dtype=np.float64)
+    columns["y"] = np.array(values["y"], dtype=np.float64)
+    for name in names:
+        columns[name] = convert_column(values[name])
+    return columns
@@ -0,0 +1,293 @@
+"""This file contains the run catalog, a columnar table of the header
+information of every scanned file and the sub batch it was put in, written as
+one NumPy .npz part per input directory so that the catalog of a campaign
+grows by adding parts and loads without parsing. NumPy is optional, without it
+the catalog is not written. The external memory planning writes the catalog of
+a batch in several numbered parts as its sub batches are written"""
+import os
+import re
+import datetime
+import orsslib.compressed_files as cf
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CATALOG_DIR_NAME = "orss_catalog"
+
+# the columns of the catalog in the order they are written
+COLUMNS = ["path", "start", "end", "run_name", "run_num", "seq_num",
+           "first_ts", "last_ts", "size", "batch_name", "batch_dir", "setup",
+           "position", "x", "y"]
+
+
+def get_catalog_dir(outdir):
+    """Gives the directory that holds the catalog parts of a base output
+    directory
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+
+    Returns
+    -------
+    catalog_dir : str
+        Path to the catalog directory
+    """
+    return os.path.join(outdir, CATALOG_DIR_NAME)
+
+
+def get_part_path(outdir, batch_name, part=None):
+    """Gives the path of the catalog part for a batch
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+    batch_name : str
+        Name of the overall batch (the name of the input directory)
+    part : int
+        If not None, the number of the part, for batches whose catalog is
+        written in several parts by the external memory planning
+
+    Returns
+    -------
+    part_path : str
+        Path to the catalog part of the batch
+    """
+    if part is None:
+        return os.path.join(get_catalog_dir(outdir), batch_name + ".npz")
+    return os.path.join(get_catalog_dir(outdir),
+                        "{0:s}.{1:d}.npz".format(batch_name, part))
+
+
+def remove_stale_parts(outdir, batch_name, written):
+    """Removes the catalog parts of a batch left by earlier runs, so that a
+    batch written in one part does not keep the numbered parts of an earlier
+    run and the other way around
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+    batch_name : str
+        Name of the overall batch (the name of the input directory)
+    written : list
+        Paths to the parts written by this run, these are kept
+    """
+    catalog_dir = get_catalog_dir(outdir)
+    if not os.path.isdir(catalog_dir):
+        return
+    # <batch>.npz or <batch>.<N>.npz
+    pattern = re.compile(re.escape(batch_name) + r"(\.[0-9]+)?\.npz$")
+    for fname in os.listdir(catalog_dir):
+        path = os.path.join(catalog_dir, fname)
+        if path in written or pattern.match(fname) is None:
+            continue
+        # run.1.npz is both part 1 of batch run and the only part of batch
+        # run.1, so each part records the batch it was written for
+        if get_part_batch(path) not in (None, batch_name):
+            continue
+        os.remove(path)
+
+
+def get_part_batch(part_path):
+    """Gives the batch a catalog part was written for
+
+    Parameters
+    ----------
+    part_path : str
+        Path to the catalog part
+
+    Returns
+    -------
+    batch_name : str
+        Name of the overall batch, None if the part does not record it
+    """
+    try:
+        with np.load(part_path) as part:
+            if "batch" in part.files:
+                return str(part["batch"])
+    except (IOError, ValueError):
+        pass
+    return None
+
+
+def build_columns(sub_batches):
+    """Builds the catalog columns for a set of sub batches, sorted by the
+    start time of the files
+
+    Parameters
+    ----------
+    sub_batches : list
+        list of sub batch tuples (with chunks) as passed to build_batch_scripts
+
+    Returns
+    -------
+    columns : dict
+        Dictionary of NumPy arrays keyed by the names in COLUMNS, times are
+        datetime64[us] in the local time of the data acquisition
+    """
+    rows = []
+    for files, setup, _, pos, folder in sub_batches:
+        for fdat in files:
+            rows.append((fdat[0], fdat[1], fdat[5], fdat[2], fdat[3], fdat[4],
+                         fdat[6], fdat[7], cf.get_data_size(fdat[0]),
+                         folder[0], folder[1], setup[0], pos[0], pos[1][0],
+                         pos[1][1]))
+    rows.sort(key=lambda x: x[1])
+    values = zip(*rows) if len(rows) > 0 else [[]] * len(COLUMNS)
+    dtypes = ["U", "datetime64[us]", "datetime64[us]", "U", np.int64,
+              np.int64, np.int64, np.int64, np.int64, "U", "U", "U", "U",
+              np.float64, np.float64]
+    return dict([(name, np.array(list(vals), dtype=dtype)) for name, vals,
+                 dtype in zip(COLUMNS, values, dtypes)])
+
+
+def write_part(part_path, columns, batch_name=None):
+    """Writes a catalog part, replacing the part if it exists
+
+    Parameters
+    ----------
+    part_path : str
+        Path to the catalog part
+    columns : dict
+        The columns from build_columns
+    batch_name : str
+        If not None, name of the overall batch, recorded in the part so that
+        remove_stale_parts can tell the parts of batches apart
+    """
+    part_dir = os.path.dirname(part_path)
+    if not os.path.isdir(part_dir):
+        os.makedirs(part_dir)
+    tmp_path = part_path + ".tmp"
+    with open(tmp_path, 'wb') as out_file:
+        if batch_name is None:
+            np.savez(out_file, **columns)
+        else:
+            np.savez(out_file, batch=np.array(batch_name), **columns)
+    os.rename(tmp_path, part_path)
+
+
+def load_catalog(outdir):
+    """Loads every catalog part of a base output directory into one table
+    sorted by file start time
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+
+    Returns
+    -------
+    catalog : dict
+        Dictionary of NumPy arrays keyed by the names in COLUMNS, plus
+        "end_max", the largest end time of the file and every file before it,
+        which is sorted so that time ranges can be found by binary search
+    """
+    catalog_dir = get_catalog_dir(outdir)
+    parts = []
+    if os.path.isdir(catalog_dir):
+        for fname in sorted(os.listdir(catalog_dir)):
+            if fname.endswith(".npz"):
+                with np.load(os.path.join(catalog_dir, fname)) as part:
+                    parts.append(dict([(name, part[name])
+                                       for name in COLUMNS]))
+    if len(parts) == 0:
+        catalog = build_columns([])
+    else:
+        catalog = dict([(name, np.concatenate([part[name] for part in parts]))
+                        for name in COLUMNS])
+        order = np.argsort(catalog["start"], kind="mergesort")
+        for name in COLUMNS:
+            catalog[name] = catalog[name][order]
+    catalog["end_max"] = np.maximum.accumulate(catalog["end"]) if\
+        len(catalog["end"]) > 0 else catalog["end"]
+    return catalog
+
+
+def to_datetime64(time):
+    """Converts a datetime to the type of the catalog time columns
+
+    Parameters
+    ----------
+    time : datetime.datetime
+        The time to convert
+
+    Returns
+    -------
+    time64 : numpy.datetime64
+        The time with microsecond precision
+    """
+    return np.datetime64(time, "us")
+
+
+def query_time_range(catalog, start, end):
+    """Finds the files that overlap a time range, the range and each file's
+    start to end are half open, so a file that ends exactly at the start of
+    the range is not included
+
+    Parameters
+    ----------
+    catalog : dict
+        The catalog from load_catalog
+    start : datetime.datetime
+        The start of the time range, files that end at or before it are not
+        included
+    end : datetime.datetime
+        The end of the time range, files that start at or after it are not
+        included
+
+    Returns
+    -------
+    rows : numpy.ndarray
+        The indices of the catalog rows of the files, in start time order
+    """
+    start = to_datetime64(start)
+    end = to_datetime64(end)
+    # every file before low ends at or before the range starts and every file
+    # from high on starts at or after it ends
+    low = np.searchsorted(catalog["end_max"], start, side="right")
+    high = np.searchsorted(catalog["start"], end, side="left")
+    rows = np.arange(low, max(low, high))
+    return rows[catalog["end"][rows] > start]
+
+
+def to_datetime(time64):
+    """Converts a value of a catalog time column to a datetime
+
+    Parameters
+    ----------
+    time64 : numpy.datetime64
+        The value to convert
+
+    Returns
+    -------
+    time : datetime.datetime
+        The same time
+    """
+    return datetime.datetime(1970, 1, 1) + datetime.timedelta(
+        microseconds=int(time64.astype("int64")))
+
+
+def query_time(catalog, time):
+    """Finds the file that was being taken at a time, or the last file taken
+    before it if the time falls between files
+
+    Parameters
+    ----------
+    catalog : dict
+        The catalog from load_catalog
+    time : datetime.datetime
+        The time to look up
+
+    Returns
+    -------
+    row : int
+        The index of the catalog row of the file, None if every file starts
+        after the time
+    """
+    row = np.searchsorted(catalog["start"], to_datetime64(time),
+                          side="right") - 1
+    return (None if row < 0 else int(row))
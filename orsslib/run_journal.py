@@ -0,0 +1,470 @@
+"""This file contains the run journal, which records each step of a setup run
+as it completes (the scan results, the split into sub batches, the user's
+review of each sub batch, and the batch directories written) so that an
+interrupted run can be resumed without reading the data files again or
+repeating the questions already answered. The scan and the split are written
+to files of their own once each, the reviews and written batches are appended
+to a log as they happen, so recording them does not write the whole journal
+again"""
+from __future__ import print_function
+import os
+import json
+import datetime
+import orsslib.scan_cache as sc
+import orsslib.setup_changes as setc
+from orsslib.detector_config import DetectorSetup
+
+
+def get_journal_path(outdir, batch_name):
+    """Gives the path of the run journal for a batch in a base output directory
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+    batch_name : str
+        Name of the overall batch (the name of the input directory)
+
+    Returns
+    -------
+    journal_path : str
+        Path to the run journal file for the batch
+    """
+    return os.path.join(outdir, batch_name + "_journal.json")
+
+
+def setup_to_json(array_setup):
+    """Converts the detectors of an ArraySetup to something that can be written
+    with json
+
+    Parameters
+    ----------
+    array_setup : ArraySetup
+        The array setup to convert
+
+    Returns
+    -------
+    json_setup : list
+        List of [detector number, digitizer pair, mpod pair, position offsets,
+        detector type, threshold pair] lists, sorted by detector number
+    """
+    out = []
+    for det_num in sorted(array_setup.det_dict):
+        det = array_setup.det_dict[det_num]
+        out.append([det_num, list(det.digi_pair), list(det.mpod_pair),
+                    list(det.pos_offset), det.det_type,
+                    list(det.thresh_pair)])
+    return out
+
+
+def setup_from_json(json_setup):
+    """Converts the output of setup_to_json back to the detector dictionary of
+    an ArraySetup
+
+    Parameters
+    ----------
+    json_setup : list
+        The detectors as stored in the journal
+
+    Returns
+    -------
+    det_dict : dict
+        Dictionary of DetectorSetups keyed by detector number
+    """
+    det_dict = {}
+    for det_num, digi, mpod, pos, det_type, threshs in json_setup:
+        det_dict[det_num] = DetectorSetup((tuple(digi), tuple(mpod)),
+                                          tuple(pos), str(det_type),
+                                          tuple(threshs))
+    return det_dict
+
+
+def get_split_path(journal_path):
+    """Gives the path of the file the split of a run journal is written to
+
+    Parameters
+    ----------
+    journal_path : str
+        Path to the run journal file, which holds the scan
+
+    Returns
+    -------
+    split_path : str
+        Path to the split file
+    """
+    return os.path.splitext(journal_path)[0] + "_split.json"
+
+
+def get_log_path(journal_path):
+    """Gives the path of the log the reviews and written batches of a run
+    journal are appended to
+
+    Parameters
+    ----------
+    journal_path : str
+        Path to the run journal file, which holds the scan
+
+    Returns
+    -------
+    log_path : str
+        Path to the log, one json record per line
+    """
+    return os.path.splitext(journal_path)[0] + ".log"
+
+
+def read_json(path):
+    """Reads a json file of the journal
+
+    Parameters
+    ----------
+    path : str
+        Path to the file
+
+    Returns
+    -------
+    value : object
+        The contents of the file, None if it is missing or unreadable
+    """
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, 'r') as in_file:
+            return json.load(in_file)
+    except ValueError:
+        print("Run journal file is unreadable")
+        print(path)
+        return None
+
+
+def write_json(path, value):
+    """Writes a json file of the journal, through a temporary file so that
+    an interrupted write never leaves a truncated file behind
+
+    Parameters
+    ----------
+    path : str
+        Path to the file
+    value : object
+        Something that json can write
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as out_file:
+        json.dump(value, out_file)
+    os.rename(tmp_path, path)
+
+
+class RunJournal(object):
+    """This class holds the journal of a setup run, every record is written
+    to disk straight away so that the journal is up to date if the run is
+    interrupted"""
+    def __init__(self, journal_path, resume=False, read_only=False):
+        """Loads the journal file if the run is being resumed, otherwise starts
+        an empty journal
+
+        Parameters
+        ----------
+        journal_path : str
+            Path to the journal file, which holds the scan, the split and the
+            log are kept beside it
+        resume : bool
+            True if the steps recorded by an earlier run should be used
+        read_only : bool
+            True if the journal is only being looked at, it is then never
+            written
+        """
+        self.read_only = read_only
+        self.journal_path = journal_path
+        self.split_path = get_split_path(journal_path)
+        self.log_path = get_log_path(journal_path)
+        self.steps = {}
+        scan = (read_json(journal_path) if resume else None)
+        if scan is not None:
+            self.steps["scan"] = scan
+            split = read_json(self.split_path)
+            if split is not None:
+                self.steps["split"] = split
+                self.steps["reviews"] = {}
+                self.steps["written"] = {}
+            self.replay_log()
+            return
+        if resume:
+            print("No run journal to resume, starting from the beginning")
+        if not read_only:
+            # a new run starts an empty journal
+            for path in [journal_path, self.split_path, self.log_path]:
+                if os.path.isfile(path):
+                    os.remove(path)
+
+    def replay_log(self):
+        """Applies the records of the log to the steps read from the scan and
+        split files"""
+        if not os.path.isfile(self.log_path):
+            return
+        with open(self.log_path, 'r') as in_file:
+            lines = in_file.read().split("\n")
+        # the last record of an interrupted run may be cut short, it is
+        # dropped so that the records appended after it can be read
+        if lines[-1] != "" and not self.read_only:
+            with open(self.log_path, 'w') as out_file:
+                out_file.write("".join([line + "\n" for line in lines[:-1]]))
+        for line in lines[:-1]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            self.apply_record(record)
+
+    def apply_record(self, record):
+        """Applies one record of the log to the steps
+
+        Parameters
+        ----------
+        record : list
+            The kind of record, "review", "writing" or "written", followed by
+            its values
+        """
+        if record[0] == "review":
+            self.steps.setdefault("reviews", {})[record[1]] = record[2]
+        elif record[0] == "writing":
+            if self.steps.get("write_opts") != record[2]:
+                self.steps["written"] = {}
+            self.steps["email"] = record[1]
+            self.steps["write_opts"] = record[2]
+        elif record[0] == "written":
+            self.steps.setdefault("written", {})[record[1]] = record[2]
+
+    def append_record(self, record):
+        """Applies a record to the steps and appends it to the log
+
+        Parameters
+        ----------
+        record : list
+            The kind of record, "review", "writing" or "written", followed by
+            its values
+        """
+        self.apply_record(record)
+        if self.read_only:
+            return
+        with open(self.log_path, 'a') as out_file:
+            out_file.write(json.dumps(record) + "\n")
+
+    def has_step(self, step):
+        """Checks if a step has been recorded
+
+        Parameters
+        ----------
+        step : str
+            Name of the step, "scan" or "split"
+
+        Returns
+        -------
+        done : bool
+            True if the step was completed
+        """
+        return step in self.steps
+
+    def record_scan(self, file_list, inferred):
+        """Records the sorted file list and header information and the
+        inferred detector setups
+
+        Parameters
+        ----------
+        file_list : list
+            List of file names and file header info pairs
+        inferred : dict
+            Dictionary mapping file names to inferred detector setup indices,
+            or None
+        """
+        self.steps["scan"] = {
+            "files": [[fdat[0], sc.header_to_json(fdat[1])]
+                      for fdat in file_list],
+            "inferred": inferred}
+        if not self.read_only:
+            write_json(self.journal_path, self.steps["scan"])
+
+    def get_scan(self):
+        """Retrieves the recorded file list and inferred detector setups
+
+        Returns
+        -------
+        file_list : list
+            List of file names and file header info pairs
+        inferred : dict
+            Dictionary mapping file names to inferred detector setup indices,
+            or None
+        """
+        scan = self.steps["scan"]
+        file_list = [[str(fname), sc.header_from_json(header)]
+                     for fname, header in scan["files"]]
+        inferred = scan["inferred"]
+        if inferred is not None:
+            inferred = dict([(str(fname), best) for fname, best
+                             in inferred.items()])
+        return file_list, inferred
+
+    def record_split(self, sub_batches):
+        """Records the split of the files into sub batches, this clears the
+        reviews and written batches of any earlier split
+
+        Parameters
+        ----------
+        sub_batches : list
+            list of sub batch tuples as returned by split_into_subbatches
+        """
+        self.steps["split"] = [
+            {"files": [fdat[0] for fdat in files], "setup": setup[0],
+             "times": [times[0].strftime(sc.DATE_FMT),
+                       times[1].strftime(sc.DATE_FMT)],
+             "position": [pos[0], list(pos[1])]}
+            for files, setup, times, pos in sub_batches]
+        self.steps["reviews"] = {}
+        self.steps["written"] = {}
+        if self.read_only:
+            return
+        write_json(self.split_path, self.steps["split"])
+        # the log starts again with only the options written with
+        with open(self.log_path, 'w') as out_file:
+            if "write_opts" in self.steps:
+                out_file.write(json.dumps(
+                    ["writing", self.steps["email"],
+                     self.steps["write_opts"]]) + "\n")
+
+    def get_split(self, file_list):
+        """Rebuilds the recorded sub batches from the recorded file list, the
+        sub batches use the same ArraySetup objects as a fresh split would
+
+        Parameters
+        ----------
+        file_list : list
+            List of file names and file header info pairs from get_scan
+
+        Returns
+        -------
+        sub_batches : list
+            list of sub batch tuples as returned by split_into_subbatches
+        """
+        file_data = {}
+        for fname, header in file_list:
+            file_data[fname] = (fname,) + tuple(header)
+        sub_batches = []
+        for batch in self.steps["split"]:
+            setup_name = str(batch["setup"])
+            setup = (setup_name,
+                     setc.EXCEPTION_DATA[setc.EXCEPTION_NAME.index(setup_name)])
+            times = tuple([datetime.datetime.strptime(val, sc.DATE_FMT)
+                           for val in batch["times"]])
+            pos = [str(batch["position"][0]), list(batch["position"][1])]
+            sub_batches.append(([file_data[str(fname)] for fname
+                                 in batch["files"]], setup, times, pos))
+        return sub_batches
+
+    def record_review(self, index, setup, pos):
+        """Records the detector setup and position of a sub batch once the
+        user has finished reviewing it
+
+        Parameters
+        ----------
+        index : int
+            Index of the sub batch in the split
+        setup : tuple
+            Name of setup and ArraySetup in a pair
+        pos : tuple
+            Position name and X-Y position pair
+        """
+        self.append_record(["review", str(index),
+                            {"setup": setup_to_json(setup[1]),
+                             "position": list(pos[1])}])
+
+    def apply_review(self, index, setup, pos):
+        """Puts the recorded edits of a reviewed sub batch back in place
+
+        Parameters
+        ----------
+        index : int
+            Index of the sub batch in the split
+        setup : tuple
+            Name of setup and ArraySetup in a pair, the ArraySetup is changed
+        pos : tuple
+            Position name and X-Y position pair, the X-Y pair is changed
+
+        Returns
+        -------
+        reviewed : bool
+            True if the sub batch had been reviewed
+        """
+        review = self.steps.get("reviews", {}).get(str(index))
+        if review is None:
+            return False
+        setup[1].det_dict = setup_from_json(review["setup"])
+        pos[1][0] = review["position"][0]
+        pos[1][1] = review["position"][1]
+        return True
+
+    def start_writing(self, email, write_opts):
+        """Records the answers and options the batch files are written with,
+        batches written with different options are written again
+
+        Parameters
+        ----------
+        email : str
+            The email address supplied to the batch scripts
+        write_opts : dict
+            The options that change the contents of the batch directories
+        """
+        # compare the options as json would store them
+        write_opts = json.loads(json.dumps(write_opts))
+        self.append_record(["writing", email, write_opts])
+
+    def get_email(self):
+        """Retrieves the email address recorded by start_writing
+
+        Returns
+        -------
+        email : str
+            The email address, or None if none was recorded
+        """
+        email = self.steps.get("email")
+        return (None if email is None else str(email))
+
+    def record_written(self, folder, changed=True):
+        """Records that every file of a batch directory has been written
+
+        Parameters
+        ----------
+        folder : str
+            The batch directory
+        changed : bool
+            True if any of the files of the directory had to be (re)written
+        """
+        self.append_record(["written", folder, changed])
+
+    def was_changed(self, folder):
+        """Checks if a batch directory recorded as written had changed files
+
+        Parameters
+        ----------
+        folder : str
+            The batch directory
+
+        Returns
+        -------
+        changed : bool
+            True if any of the files of the directory had to be (re)written
+        """
+        return self.steps.get("written", {}).get(folder, False)
+
+    def is_written(self, folder):
+        """Checks if a batch directory was fully written
+
+        Parameters
+        ----------
+        folder : str
+            The batch directory
+
+        Returns
+        -------
+        written : bool
+            True if the directory was recorded as written and still exists
+        """
+        return folder in self.steps.get("written", {}) and\
+            os.path.isdir(folder)
@@ -0,0 +1,311 @@
+"""This file contains the scan cache, which stores the information read from
+each raw data file so that later runs over the same directory do not need to
+read the data files again, and the scan database, which stores the same
+information on disk for campaigns with too many files to hold it in memory"""
+from __future__ import print_function
+import os
+import json
+import sqlite3
+import datetime
+import threading
+
+DATE_FMT = "%Y-%m-%dT%H:%M:%S.%f"
+
+CACHE_DIR_NAME = ".orss_cache"
+
+
+def get_cache_path(outdir, batch_name):
+    """Gives the path of the scan cache for a batch in a base output directory
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+    batch_name : str
+        Name of the overall batch (the name of the input directory)
+
+    Returns
+    -------
+    cache_path : str
+        Path to the scan cache file for the batch
+    """
+    return os.path.join(outdir, CACHE_DIR_NAME, batch_name + "_scan.json")
+
+
+def get_database_path(outdir, batch_name):
+    """Gives the path of the on disk scan cache used by the external memory
+    planning for a batch in a base output directory
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+    batch_name : str
+        Name of the overall batch (the name of the input directory)
+
+    Returns
+    -------
+    db_path : str
+        Path to the scan cache database for the batch
+    """
+    return os.path.join(outdir, CACHE_DIR_NAME, batch_name + "_scan.sqlite")
+
+
+def header_to_json(header):
+    """Converts the tuple returned by get_file_header_data to something that
+    can be written with json
+
+    Parameters
+    ----------
+    header : tuple
+        date, run name, run number, seq number, mod time, first ts, last ts
+
+    Returns
+    -------
+    json_header : list
+        The same information with the datetimes converted to strings
+    """
+    return [header[0].strftime(DATE_FMT), header[1], header[2], header[3],
+            header[4].strftime(DATE_FMT), header[5], header[6]]
+
+
+def header_from_json(json_header):
+    """Converts the output of header_to_json back to a file header tuple
+
+    Parameters
+    ----------
+    json_header : list
+        The header information as stored in the cache
+
+    Returns
+    -------
+    header : tuple
+        date, run name, run number, seq number, mod time, first ts, last ts
+    """
+    return (datetime.datetime.strptime(json_header[0], DATE_FMT),
+            str(json_header[1]), json_header[2], json_header[3],
+            datetime.datetime.strptime(json_header[4], DATE_FMT),
+            json_header[5], json_header[6])
+
+
+class ScanCache(object):
+    """This class holds the cached scan results for a set of data files, each
+    entry is only used while the size and modification time of its file are
+    the same as when it was stored"""
+    def __init__(self, cache_path):
+        """Loads the cache file if it exists
+
+        Parameters
+        ----------
+        cache_path : str
+            Path to the cache file, it is created on save if it is missing
+        """
+        self.cache_path = cache_path
+        self.entries = {}
+        self.modified = False
+        if cache_path is not None and os.path.isfile(cache_path):
+            try:
+                with open(cache_path, 'r') as in_file:
+                    self.entries = json.load(in_file)
+            except ValueError:
+                print("Scan cache is unreadable, it will be rebuilt")
+                print(cache_path)
+                self.entries = {}
+
+    def lookup(self, fname, section):
+        """Retrieves a cached value for a file if the file has not changed
+
+        Parameters
+        ----------
+        fname : str
+            Full path to the file
+        section : str
+            Name of the cached information, e.g. "header" or "verify"
+
+        Returns
+        -------
+        value : object
+            The cached value or None if there is no usable cached value
+        """
+        entry = self.entries.get(fname)
+        if entry is None or section not in entry:
+            return None
+        stat = os.stat(fname)
+        if entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+            return None
+        return entry[section]
+
+    def store(self, fname, section, value):
+        """Stores a value for a file, dropping everything cached for the file
+        if the file has changed since it was last stored
+
+        Parameters
+        ----------
+        fname : str
+            Full path to the file
+        section : str
+            Name of the cached information, e.g. "header" or "verify"
+        value : object
+            Something that json can write
+        """
+        stat = os.stat(fname)
+        entry = self.entries.get(fname)
+        if entry is None or entry["size"] != stat.st_size or\
+                entry["mtime"] != stat.st_mtime:
+            entry = {"size": stat.st_size, "mtime": stat.st_mtime}
+            self.entries[fname] = entry
+        entry[section] = value
+        self.modified = True
+
+    def merge(self, other):
+        """Adds the entries of another cache, an entry replaces the entry of
+        the same file here if the file had another size or modification time
+        when it was stored
+
+        Parameters
+        ----------
+        other : ScanCache
+            The cache whose entries are added
+        """
+        for fname, entry in other.entries.items():
+            mine = self.entries.get(fname)
+            if mine is None or mine["size"] != entry["size"] or\
+                    mine["mtime"] != entry["mtime"]:
+                self.entries[fname] = entry
+            else:
+                mine.update(entry)
+            self.modified = True
+
+    def prune(self, fnames):
+        """Drops the entries of every file not in a list
+
+        Parameters
+        ----------
+        fnames : list
+            Full paths to the files whose entries are kept
+        """
+        keep = set(fnames)
+        for fname in list(self.entries.keys()):
+            if fname not in keep:
+                del self.entries[fname]
+                self.modified = True
+
+    def save(self):
+        """Writes the cache back to disk if anything has changed"""
+        if self.cache_path is None or not self.modified:
+            return
+        cache_dir = os.path.dirname(self.cache_path)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        # write to a temporary file and rename so that an interrupted save
+        # never leaves a truncated cache behind
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, 'w') as out_file:
+            json.dump(self.entries, out_file)
+        os.rename(tmp_path, self.cache_path)
+        self.modified = False
+
+
+class ScanDatabase(object):
+    """This class holds the cached scan results like ScanCache, but in an
+    SQLite database that is read and written one entry at a time, so its
+    memory use does not grow with the number of files"""
+    def __init__(self, db_path):
+        """Opens the database, creating it if it is missing
+
+        Parameters
+        ----------
+        db_path : str
+            Path to the database file
+        """
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS entries (fname TEXT "
+                          "PRIMARY KEY, size INTEGER, mtime REAL, "
+                          "sections TEXT)")
+        self.lock = threading.Lock()
+        self.modified = False
+
+    def get_sections(self, fname, stat):
+        """Gives everything cached for a file if the file has not changed
+
+        Parameters
+        ----------
+        fname : str
+            Full path to the file
+        stat : os.stat_result
+            The current stat of the file
+
+        Returns
+        -------
+        sections : dict
+            Dictionary of section name to cached value, None if nothing usable
+            is cached
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT size, mtime, sections FROM "
+                                    "entries WHERE fname = ?",
+                                    (fname,)).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime:
+            return None
+        return json.loads(row[2])
+
+    def lookup(self, fname, section):
+        """Retrieves a cached value for a file if the file has not changed
+
+        Parameters
+        ----------
+        fname : str
+            Full path to the file
+        section : str
+            Name of the cached information, e.g. "header" or "verify"
+
+        Returns
+        -------
+        value : object
+            The cached value or None if there is no usable cached value
+        """
+        sections = self.get_sections(fname, os.stat(fname))
+        if sections is None:
+            return None
+        return sections.get(section)
+
+    def store(self, fname, section, value):
+        """Stores a value for a file, dropping everything cached for the file
+        if the file has changed since it was last stored
+
+        Parameters
+        ----------
+        fname : str
+            Full path to the file
+        section : str
+            Name of the cached information, e.g. "header" or "verify"
+        value : object
+            Something that json can write
+        """
+        stat = os.stat(fname)
+        sections = self.get_sections(fname, stat)
+        if sections is None:
+            sections = {}
+        sections[section] = value
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO entries VALUES "
+                              "(?, ?, ?, ?)", (fname, stat.st_size,
+                                               stat.st_mtime,
+                                               json.dumps(sections)))
+            self.modified = True
+
+    def save(self):
+        """Commits what has been stored since the last save"""
+        with self.lock:
+            if self.modified:
+                self.conn.commit()
+                self.modified = False
+
+    def close(self):
+        """Commits and closes the database"""
+        self.save()
+        self.conn.close()
@@ -35,3 +35,9 @@ EXCEPTION_NAME = ["Default", "CeBr3", "No_3He", "Mod_3He"]
 # list of exception patterns in the same order as the det setups, minus default
 EXCEPTION_PATTERN = [CEBR_RUN_PATTERNS, NO_HE_RUN_PATTERNS,
                      MOD_HE_RUN_PATTERNS]
+
+# setups that use the same channels, which a channel census cannot tell apart
+# as it cannot see the type of a detector, and the setup a run that matches
+# all of them and none of the patterns is given. The CeBr3 runs are all known
+# by their file names, so such a run missing channels 6 and 7 is a No_3He run
+CENSUS_TIES = [(["CeBr3", "No_3He"], "No_3He")]
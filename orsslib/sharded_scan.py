@@ -0,0 +1,420 @@
+"""This file contains the sharded header scan, which splits the files whose
+headers need reading into shards that are scanned by separate jobs, on the
+cluster as a PBS job array or on this machine as separate processes. Each
+shard writes the headers it read to a fragment, a scan cache of its own, and
+the fragments are merged into the scan cache so that the file list is then
+built from the cache without reading any data files here"""
+from __future__ import print_function
+import os
+import sys
+import time
+import shutil
+import subprocess
+import orsslib.compressed_files as cf
+import orsslib.io_autotune as iot
+import orsslib.scan_cache as sc
+
+# seconds between checks for finished shards of a job array
+POLL_SECONDS = 15.0
+
+# the script that scans one shard, it sits beside orsslib
+SHARD_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "orchid_scan_shard.py")
+
+
+def get_shard_dir(outdir, batch_name):
+    """Gives the directory that holds the shard lists and fragments of a batch
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+    batch_name : str
+        Name of the overall batch (the name of the input directory)
+
+    Returns
+    -------
+    shard_dir : str
+        Path to the shard directory
+    """
+    return os.path.join(outdir, sc.CACHE_DIR_NAME, batch_name + "_shards")
+
+
+def get_list_path(shard_dir, index):
+    """Gives the path of the list of files of a shard
+
+    Parameters
+    ----------
+    shard_dir : str
+        The shard directory
+    index : int
+        The number of the shard
+
+    Returns
+    -------
+    list_path : str
+        Path to the file list of the shard
+    """
+    return os.path.join(shard_dir, "shard_{0:d}.list".format(index))
+
+
+def get_fragment_path(shard_dir, index):
+    """Gives the path of the fragment a shard writes
+
+    Parameters
+    ----------
+    shard_dir : str
+        The shard directory
+    index : int
+        The number of the shard
+
+    Returns
+    -------
+    fragment_path : str
+        Path to the fragment of the shard
+    """
+    return os.path.join(shard_dir, "shard_{0:d}.json".format(index))
+
+
+def get_exit_path(shard_dir, index):
+    """Gives the path of the marker with the exit status of a shard's job
+
+    Parameters
+    ----------
+    shard_dir : str
+        The shard directory
+    index : int
+        The number of the shard
+
+    Returns
+    -------
+    exit_path : str
+        Path to the exit marker of the shard
+    """
+    return os.path.join(shard_dir, "shard_{0:d}.exit".format(index))
+
+
+def write_shards(shard_dir, fnames, num_shards):
+    """Splits the files into shards of nearly equal numbers of files and
+    writes their file lists, anything left in the shard directory by an
+    earlier scan is removed
+
+    Parameters
+    ----------
+    shard_dir : str
+        The shard directory
+    fnames : list
+        Full paths to the files whose headers need reading
+    num_shards : int
+        The largest number of shards, there are no more shards than files
+
+    Returns
+    -------
+    num_shards : int
+        The number of shards written
+    """
+    if os.path.isdir(shard_dir):
+        shutil.rmtree(shard_dir)
+    os.makedirs(shard_dir)
+    num_shards = min(num_shards, len(fnames))
+    start = 0
+    for index in range(num_shards):
+        end = start + (len(fnames) - start) // (num_shards - index)
+        with open(get_list_path(shard_dir, index), 'w') as out_file:
+            for fname in fnames[start:end]:
+                out_file.write(fname + "\n")
+        start = end
+    return num_shards
+
+
+def scan_shard(shard_dir, index, tuner=None):
+    """Reads the headers of the files of a shard and writes its fragment,
+    this is what each scan job runs
+
+    Parameters
+    ----------
+    shard_dir : str
+        The shard directory
+    index : int
+        The number of the shard
+    tuner : AutoTuner
+        If not None, the autotuner that reads the file headers, otherwise it
+        picks the I/O backend and the number of threads itself
+
+    Returns
+    -------
+    num_files : int
+        The number of files read
+    """
+    with open(get_list_path(shard_dir, index), 'r') as in_file:
+        fnames = [line.rstrip("\n") for line in in_file if line.strip()]
+    if tuner is None:
+        tuner = iot.AutoTuner()
+    fragment = sc.ScanCache(get_fragment_path(shard_dir, index))
+    for fname, header in zip(fnames, tuner.read_headers(fnames)):
+        # files too short or too damaged to read have no header, they are
+        # left out when the file list is built
+        if header is not None:
+            fragment.store(fname, "header", sc.header_to_json(header))
+    # the seek indexes built while reading compressed files go with them
+    cf.save_indexes(fragment, fnames)
+    fragment.save()
+    return len(fnames)
+
+
+class LocalExecutor(object):
+    """This class runs the scan of each shard in a process of its own on this
+    machine, a stand in for the cluster that runs the same scan jobs"""
+    def __init__(self, workers):
+        """Sets up the executor
+
+        Parameters
+        ----------
+        workers : int
+            Number of shards scanned at once
+        """
+        self.workers = workers
+
+    def run(self, shard_dir, num_shards):
+        """Scans every shard and waits for them all to finish
+
+        Parameters
+        ----------
+        shard_dir : str
+            The shard directory
+        num_shards : int
+            The number of shards
+
+        Returns
+        -------
+        failed : list
+            The numbers of the shards whose scan failed
+        """
+        failed = []
+        running = {}
+        pending = list(range(num_shards))
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and len(running) < self.workers:
+                index = pending.pop(0)
+                running[index] = subprocess.Popen(
+                    [sys.executable, SHARD_SCRIPT, shard_dir, str(index)])
+            time.sleep(0.05)
+            for index in list(running.keys()):
+                if running[index].poll() is not None:
+                    if running[index].returncode != 0:
+                        failed.append(index)
+                    del running[index]
+        return sorted(failed)
+
+
+class PbsArrayExecutor(object):
+    """This class submits the scans of the shards as a PBS job array and
+    waits for the exit markers the jobs leave. The qsub used can be replaced
+    by setting QSUB, and the option that makes the job an array by setting
+    QSUB_ARRAY (-t for Torque, the default, or -J for PBS Pro). Likewise
+    qstat and qdel can be replaced by setting QSTAT and QDEL"""
+    def __init__(self, timeout=0.0):
+        """Sets up the executor
+
+        Parameters
+        ----------
+        timeout : float
+            Hours to wait for the job array before deleting it and reading
+            the files of the unfinished shards here, 0 to wait as long as the
+            array is queued or running
+        """
+        self.timeout = timeout
+
+    def is_queued(self, job_id):
+        """Checks with qstat if the job array is still queued or running
+
+        Parameters
+        ----------
+        job_id : str
+            The id qsub gave the job array
+
+        Returns
+        -------
+        queued : bool
+            False once qstat no longer knows the job array, True if it does or
+            qstat cannot be run
+        """
+        try:
+            with open(os.devnull, 'w') as null:
+                return subprocess.call(
+                    [os.environ.get("QSTAT", "qstat"), job_id],
+                    stdout=null, stderr=null) == 0
+        except OSError:
+            return True
+
+    def get_script_str(self, shard_dir):
+        """Gives the script each job of the array runs
+
+        Parameters
+        ----------
+        shard_dir : str
+            The shard directory
+
+        Returns
+        -------
+        script : str
+            The contents of the job script
+        """
+        fmt_dict = {}
+        # the file names in the shard lists may be relative to the directory
+        # the scan was started from
+        fmt_dict["work_dir"] = os.getcwd()
+        fmt_dict["shard_dir"] = os.path.abspath(shard_dir)
+        fmt_dict["python"] = sys.executable
+        fmt_dict["shard_script"] = SHARD_SCRIPT
+        return SCAN_ARRAY_TMPL.format(**fmt_dict)
+
+    def run(self, shard_dir, num_shards):
+        """Submits the job array and waits for every job to finish
+
+        Parameters
+        ----------
+        shard_dir : str
+            The shard directory
+        num_shards : int
+            The number of shards
+
+        Returns
+        -------
+        failed : list
+            The numbers of the shards whose scan failed
+        """
+        script_path = os.path.join(os.path.abspath(shard_dir), "scan_script")
+        with open(script_path, 'w') as out_file:
+            out_file.write(self.get_script_str(shard_dir))
+        os.chmod(script_path, 0o774)
+        qsub = [os.environ.get("QSUB", "qsub"),
+                os.environ.get("QSUB_ARRAY", "-t"),
+                "0-{0:d}".format(num_shards - 1), script_path]
+        job_id = subprocess.check_output(qsub, cwd=shard_dir)
+        job_id = job_id.decode("utf-8").strip()
+        print("Submitted the scan of", num_shards, "shards as job array",
+              job_id)
+        begin = time.time()
+        polls_gone = 0
+        while True:
+            time.sleep(POLL_SECONDS)
+            finished = [index for index in range(num_shards) if
+                        os.path.isfile(get_exit_path(shard_dir, index))]
+            print("  {0:d} of {1:d} shards scanned\r".format(
+                len(finished), num_shards), end=" ")
+            sys.stdout.flush()
+            if len(finished) == num_shards:
+                print("")
+                break
+            if self.timeout > 0.0 and\
+                    time.time() - begin > self.timeout * 3600.0:
+                print("")
+                print("The scan jobs did not finish within", self.timeout,
+                      "hours, deleting the job array")
+                subprocess.call([os.environ.get("QDEL", "qdel"), job_id])
+                break
+            # a job killed by the walltime or a node crash never writes its
+            # exit marker, once the array has left the queue (and one more
+            # poll has let the last markers arrive) none will come
+            polls_gone = (0 if self.is_queued(job_id) else polls_gone + 1)
+            if polls_gone > 1:
+                print("")
+                print("The job array has left the queue without every shard "
+                      "finishing")
+                break
+        failed = []
+        for index in range(num_shards):
+            exit_path = get_exit_path(shard_dir, index)
+            if not os.path.isfile(exit_path):
+                failed.append(index)
+                continue
+            with open(exit_path, 'r') as in_file:
+                if in_file.read().strip() != "0":
+                    failed.append(index)
+        return failed
+
+
+# the executors that can run the shard scans
+EXECUTORS = ["local", "pbs"]
+
+
+def get_executor(name, workers, timeout=0.0):
+    """Gives the executor of a name
+
+    Parameters
+    ----------
+    name : str
+        One of EXECUTORS
+    workers : int
+        Number of shards the local executor scans at once
+    timeout : float
+        Hours the PBS executor waits for the job array, 0 for no limit
+
+    Returns
+    -------
+    executor : object
+        The executor, with a run(shard_dir, num_shards) method that returns
+        the numbers of the shards whose scan failed
+    """
+    if name == "local":
+        return LocalExecutor(workers)
+    if name == "pbs":
+        return PbsArrayExecutor(timeout)
+    raise ValueError("Unknown scan executor: " + name)
+
+
+def scan_sharded(fnames, cache, shard_dir, num_shards, executor):
+    """Reads the headers of the files that are not in the scan cache with
+    sharded scan jobs and merges the fragments they write into the cache
+
+    Parameters
+    ----------
+    fnames : list
+        Full paths to the data files
+    cache : ScanCache
+        The scan cache, it is not saved to disk here
+    shard_dir : str
+        The shard directory
+    num_shards : int
+        The largest number of shards
+    executor : object
+        The executor that runs the scan jobs, from get_executor
+
+    Returns
+    -------
+    num_read : int
+        The number of files whose headers the shards read
+    """
+    to_read = [fname for fname in fnames
+               if cache.lookup(fname, "header") is None]
+    if len(to_read) == 0:
+        return 0
+    num_shards = write_shards(shard_dir, to_read, num_shards)
+    print("Scanning the headers of", len(to_read), "files in", num_shards,
+          "shards")
+    failed = executor.run(shard_dir, num_shards)
+    num_read = 0
+    for index in range(num_shards):
+        fragment_path = get_fragment_path(shard_dir, index)
+        if index in failed or not os.path.isfile(fragment_path):
+            continue
+        fragment = sc.ScanCache(fragment_path)
+        cache.merge(fragment)
+        num_read += len(fragment.entries)
+    if len(failed) > 0:
+        print("The scans of", len(failed), "shards failed, their files are",
+              "read here")
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    return num_read
+
+
+SCAN_ARRAY_TMPL = """#!/bin/bash
+SHARD_DIR={shard_dir:s}
+cd {work_dir:s}
+# Torque gives the index of the job in the array as PBS_ARRAYID and PBS Pro
+# as PBS_ARRAY_INDEX
+INDEX=${{PBS_ARRAYID:-$PBS_ARRAY_INDEX}}
+{python:s} {shard_script:s} $SHARD_DIR $INDEX
+echo $? > $SHARD_DIR/shard_$INDEX.exit
+"""
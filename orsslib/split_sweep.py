@@ -0,0 +1,184 @@
+"""This file contains the functions that evaluate the split of a scanned file
+list into sub batches for many settings of the split thresholds at once. The
+splits by detector setup and position do not depend on the thresholds, so
+they are found once, and the time split of each setting only compares each
+file with the file before it using values worked out once"""
+import os
+import orsslib.scan_cache as sc
+import orsslib.run_journal as rj
+import orsslib.sub_batch_handling as sb_hnd
+
+
+def load_file_list(outdir, batch_name):
+    """Loads the scanned file list of a batch from its run journal, or from
+    its scan cache if the journal has no scan
+
+    Parameters
+    ----------
+    outdir : str
+        Name of the base output directory
+    batch_name : str
+        Name of the overall batch (the name of the input directory)
+
+    Returns
+    -------
+    file_list : list
+        List of file names and file header info pairs sorted by start time,
+        None if neither the journal nor the cache has any
+    inferred : dict
+        Dictionary mapping file names to inferred detector setup indices, or
+        None
+    source : str
+        The path the file list was loaded from
+    """
+    journal_path = rj.get_journal_path(outdir, batch_name)
+    if os.path.isfile(journal_path):
+        journal = rj.RunJournal(journal_path, resume=True, read_only=True)
+        if journal.has_step("scan"):
+            file_list, inferred = journal.get_scan()
+            return file_list, inferred, journal_path
+    cache_path = sc.get_cache_path(outdir, batch_name)
+    if not os.path.isfile(cache_path):
+        return None, None, None
+    cache = sc.ScanCache(cache_path)
+    file_list = [[str(fname), sc.header_from_json(entry["header"])]
+                 for fname, entry in cache.entries.items()
+                 if "header" in entry]
+    file_list.sort(key=lambda x: x[1][0])
+    return file_list, None, cache_path
+
+
+def get_boundaries(sub_batches):
+    """Gives the positions in the file list where the sub batches start
+
+    Parameters
+    ----------
+    sub_batches : list
+        list of sub batch tuples as returned by split_into_subbatches
+
+    Returns
+    -------
+    boundaries : set
+        The indices in the file list of the first file of every sub batch but
+        the first
+    """
+    boundaries = set()
+    count = 0
+    for batch in sub_batches:
+        if count > 0:
+            boundaries.add(count)
+        count += len(batch[0])
+    return boundaries
+
+
+class SplitSweep(object):
+    """This class holds what the time split needs to know about each pair of
+    neighbouring files so that the split can be evaluated quickly for any
+    thresholds"""
+    def __init__(self, file_list, fixed):
+        """Works out the gaps and timestamps between neighbouring files
+
+        Parameters
+        ----------
+        file_list : list
+            List of file names and file header info pairs sorted by start time
+        fixed : set
+            The boundaries of the split by detector setup and position, which
+            the thresholds do not change
+        """
+        self.file_list = file_list
+        self.fixed = fixed
+        # gap between the end of the file before and the start of each file,
+        # the first timestamp of each file and the last of the file before
+        self.pairs = []
+        for ind in range(1, len(file_list)):
+            prev = file_list[ind - 1][1]
+            curr = file_list[ind][1]
+            self.pairs.append((ind, (curr[0] - prev[4]).total_seconds(),
+                               curr[5], prev[6]))
+
+    def evaluate(self, split_time, misorder, min_ts, max_ts):
+        """Finds the boundaries of the split for a set of thresholds, the same
+        as those of split_into_subbatches with the thresholds
+
+        Parameters
+        ----------
+        split_time : float
+            Gap in seconds that splits the files
+        misorder : int
+            Timestamp misorder threshold
+        min_ts : int
+            Minimum timestamp threshold of a rollover
+        max_ts : int
+            Maximum timestamp threshold of a rollover
+
+        Returns
+        -------
+        boundaries : set
+            The indices in the file list of the first file of every sub batch
+            but the first
+        """
+        boundaries = set(self.fixed)
+        for ind, gap, first_ts, prev_ts in self.pairs:
+            if gap > split_time:
+                boundaries.add(ind)
+            elif (first_ts + misorder) < prev_ts and\
+                    not (prev_ts > max_ts and first_ts < min_ts):
+                boundaries.add(ind)
+        return boundaries
+
+    def get_batch_sizes(self, boundaries):
+        """Gives the number of files and the hours of data of each sub batch
+
+        Parameters
+        ----------
+        boundaries : set
+            The boundaries of the split
+
+        Returns
+        -------
+        sizes : list
+            List of (number of files, hours) pairs, one per sub batch
+        """
+        starts = [0] + sorted(boundaries) + [len(self.file_list)]
+        sizes = []
+        for first, end in zip(starts[:-1], starts[1:]):
+            hours = (self.file_list[end - 1][1][4] -
+                     self.file_list[first][1][0]).total_seconds() / 3600.0
+            sizes.append((end - first, hours))
+        return sizes
+
+
+def get_distribution(values):
+    """Gives the smallest, median and largest of a list of values
+
+    Parameters
+    ----------
+    values : list
+        The values, there must be at least one
+
+    Returns
+    -------
+    dist : tuple
+        The smallest, median and largest values
+    """
+    values = sorted(values)
+    return values[0], values[len(values) // 2], values[-1]
+
+
+def get_default_thresholds(split_time):
+    """Gives the thresholds the setup script uses when none are given
+
+    Parameters
+    ----------
+    split_time : float
+        The default split time of the setup script
+
+    Returns
+    -------
+    thresholds : tuple
+        The split time, timestamp misorder, minimum and maximum timestamp
+        thresholds
+    """
+    return (split_time, sb_hnd.TS_MISORDER_THRESH, sb_hnd.MIN_TS_THRESH,
+            sb_hnd.MAX_TS_THRESH)
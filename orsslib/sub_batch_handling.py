@@ -1,5 +1,6 @@
 """This file contains functions and global constants that allow known cases
 that need special handling to be addressed"""
+from __future__ import print_function
 import fnmatch  # for file name pattern matching
 import orsslib.position_changes as pc
 import orsslib.setup_changes as sc
@@ -9,7 +10,7 @@ MAX_TS_THRESH = 140596750866972
 TS_MISORDER_THRESH = 5000000000
 
 
-def split_sub_batches_det_setup(file_list):
+def split_sub_batches_det_setup(file_list, inferred=None):
     """Takes a file_list and splits runs if they contain the patterns
     defined in setup_changes.py, also tries to guess detector setups from what
     is known
@@ -18,6 +19,10 @@ def split_sub_batches_det_setup(file_list):
     ----------
     file_list : list
         list of file data
+    inferred : dict
+        optional dictionary mapping file names to the list of indices of the
+        detector setups that best match the channel census of the file's run,
+        used for files that do not match any of the patterns
 
     Returns
     -------
@@ -26,11 +31,40 @@ def split_sub_batches_det_setup(file_list):
         setup for that sub batch
     """
     batch_sets = []
-    curr_batch = []
-    prev_det = 0
-    curr_det = 0
-    prev_name = sc.EXCEPTION_NAME[0]
+    for fdat, setup, starts_batch in iter_det_setup_files(file_list,
+                                                          inferred):
+        if starts_batch:
+            batch_sets.append(([], setup))
+        batch_sets[-1][0].append(fdat)
+    return batch_sets
+
+
+def iter_det_setup_files(file_list, inferred=None):
+    """Goes through the files in order working out the detector setup of
+    each, the files of a run of files with the same setup form a sub batch
+
+    Parameters
+    ----------
+    file_list : iterable
+        file data, in order, it is only iterated over once
+    inferred : dict
+        optional dictionary mapping file names to the list of indices of the
+        detector setups that best match the channel census of the file's run,
+        used for files that do not match any of the patterns
+
+    Yields
+    ------
+    fdat : tuple
+        The file data, flattened
+    setup : tuple
+        Name of the detector setup of the sub batch and its ArraySetup
+    starts_batch : bool
+        True if the file is the first of a sub batch
+    """
+    prev_det = None
+    setup = None
     curr_name = sc.EXCEPTION_NAME[0]
+    warned_runs = set()
     for dat in file_list:
         # reset current detector to default
         curr_det = 0
@@ -42,25 +76,67 @@ def split_sub_batches_det_setup(file_list):
                     curr_det = ind + 1
                     curr_name = sc.EXCEPTION_NAME[ind + 1]
                     break
+        # if there is a channel census for the file use it to check or guess
+        # the detector setup
+        if inferred is not None and dat[0] in inferred:
+            pattern_det = curr_det
+            curr_det, warning = pick_inferred_setup(curr_det, inferred[dat[0]])
+            if curr_det != pattern_det:
+                curr_name = sc.EXCEPTION_NAME[curr_det]
+            run_key = (dat[1][1], dat[1][2])
+            if warning is not None and run_key not in warned_runs:
+                warned_runs.add(run_key)
+                print("Warning: run {0:s} #{1:d}:".format(*run_key), warning)
         # check if the file before this one was a different det setup
-        if curr_det == prev_det:
-            curr_batch.append((dat[0], dat[1][0], dat[1][1], dat[1][2],
-                               dat[1][3], dat[1][4], dat[1][5], dat[1][6]))
-        else:
-            if len(curr_batch) > 0:
-                batch_sets.append((curr_batch, (prev_name,
-                                                sc.EXCEPTION_DATA[prev_det])))
+        starts_batch = curr_det != prev_det
+        if starts_batch:
             prev_det = curr_det
-            prev_name = curr_name
-            curr_batch = [(dat[0], dat[1][0], dat[1][1], dat[1][2], dat[1][3],
-                           dat[1][4], dat[1][5], dat[1][6])]
-    # we have made it through the list of files, append the last batch with
-    # the guessed detector setup
-    batch_sets.append((curr_batch, (curr_name, sc.EXCEPTION_DATA[curr_det])))
-    return batch_sets
+            setup = (curr_name, sc.EXCEPTION_DATA[curr_det])
+        yield ((dat[0], dat[1][0], dat[1][1], dat[1][2], dat[1][3], dat[1][4],
+                dat[1][5], dat[1][6]), setup, starts_batch)
 
 
-def split_sub_batches_time(sub_batches, threshold):
+def pick_inferred_setup(pattern_det, best):
+    """Decides the detector setup of a file from the setup given by the file
+    name patterns and the setups that best match the channel census, files
+    that match a pattern keep the pattern's setup, other files get the
+    inferred setup if the census is unambiguous or matches setups that only
+    differ in detector types, as listed in setup_changes.CENSUS_TIES
+
+    Parameters
+    ----------
+    pattern_det : int
+        Index of the detector setup given by the file name patterns
+    best : list
+        Indices of the detector setups that best match the channel census
+
+    Returns
+    -------
+    det : int
+        Index of the detector setup to use for the file
+    warning : str
+        Description of a disagreement or ambiguity to warn the user about, or
+        None
+    """
+    best_names = ", ".join([sc.EXCEPTION_NAME[ind] for ind in best])
+    if pattern_det in best:
+        return pattern_det, None
+    if pattern_det != 0:
+        return pattern_det, "channel census matches {0:s} not {1:s} from "\
+            "setup_changes.py".format(best_names,
+                                      sc.EXCEPTION_NAME[pattern_det])
+    if len(best) == 1:
+        return best[0], None
+    best_set = set([sc.EXCEPTION_NAME[ind] for ind in best])
+    for names, name in sc.CENSUS_TIES:
+        if best_set == set(names):
+            return sc.EXCEPTION_NAME.index(name), None
+    return 0, "channel census matches all of {0:s}, keeping {1:s}".format(
+        best_names, sc.EXCEPTION_NAME[0])
+
+
+def split_sub_batches_time(sub_batches, threshold, misorder_thresh=None,
+                           min_ts_thresh=None, max_ts_thresh=None):
     """Takes a set of sub batches and splits them further runs if they contain
     time differences between the beginning of a file and the end of a previous
     file greater than threshold, also checks for new runs from digitizer
@@ -74,6 +150,16 @@ def split_sub_batches_time(sub_batches, threshold):
     threshold : int
         minimum number of seconds between end and beginning of two files to
         force a split into two different batches
+    misorder_thresh : int
+        if not None, used in place of TS_MISORDER_THRESH, how far the first
+        timestamp of a file can be behind the last timestamp of the file
+        before it without being taken as a timestamp reset
+    min_ts_thresh : int
+        if not None, used in place of MIN_TS_THRESH, a reset to a first
+        timestamp below this is taken as the timestamp rolling over
+    max_ts_thresh : int
+        if not None, used in place of MAX_TS_THRESH, a reset from a last
+        timestamp above this is taken as the timestamp rolling over
 
     Returns
     -------
@@ -81,37 +167,78 @@ def split_sub_batches_time(sub_batches, threshold):
         list of sets of files for each sub batch, also contains the detector
         setup for that sub batch, and a begin and end time for that sub batch
     """
-    batch_sets = []
-    curr_batch = []
-    for file_list, setup in sub_batches:
-        curr_batch = []
-        prev_time = file_list[0][5]
-        first_time = file_list[0][1]
-        last_time = file_list[0][5]
-        prev_ts = file_list[0][7]
-        count = 0
-        for fdat in file_list:
-            maintain_batch = True
-            # determine if the batch needs to be broken
-            if (fdat[1]-prev_time).total_seconds() > threshold:
-                maintain_batch = False
-            if count != 0 and (fdat[6] + TS_MISORDER_THRESH) < prev_ts:
-                if not (prev_ts > MAX_TS_THRESH and fdat[6] < MIN_TS_THRESH):
-                    maintain_batch = False
-            # break the batch if need be
-            if maintain_batch:
-                curr_batch.append(fdat)
-                last_time = fdat[5]
-            else:
-                batch_sets.append((curr_batch, setup, (first_time, last_time)))
-                first_time = fdat[1]
-                last_time = fdat[5]
-                curr_batch = [fdat]
-            prev_ts = fdat[7]
+    files = ((fdat, setup, ind == 0) for file_list, setup in sub_batches
+             for ind, fdat in enumerate(file_list))
+    return list(iter_sub_batches_time(files, threshold, misorder_thresh,
+                                      min_ts_thresh, max_ts_thresh))
+
+
+def iter_sub_batches_time(files, threshold, misorder_thresh=None,
+                          min_ts_thresh=None, max_ts_thresh=None):
+    """Splits the files of each detector setup sub batch as
+    split_sub_batches_time does, giving each sub batch as soon as the file
+    after it is seen
+
+    Parameters
+    ----------
+    files : iterable
+        (file data, setup, starts batch) tuples as given by
+        iter_det_setup_files, it is only iterated over once
+    threshold : int
+        minimum number of seconds between end and beginning of two files to
+        force a split into two different batches
+    misorder_thresh : int
+        if not None, used in place of TS_MISORDER_THRESH
+    min_ts_thresh : int
+        if not None, used in place of MIN_TS_THRESH
+    max_ts_thresh : int
+        if not None, used in place of MAX_TS_THRESH
+
+    Yields
+    ------
+    batch_set : tuple
+        The files of the sub batch, its detector setup and its begin and end
+        time
+    """
+    if misorder_thresh is None:
+        misorder_thresh = TS_MISORDER_THRESH
+    if min_ts_thresh is None:
+        min_ts_thresh = MIN_TS_THRESH
+    if max_ts_thresh is None:
+        max_ts_thresh = MAX_TS_THRESH
+    curr_batch = None
+    for fdat, setup, starts_batch in files:
+        if starts_batch:
+            if curr_batch is not None:
+                yield (curr_batch, curr_setup, (first_time, last_time))
+            curr_batch = []
+            curr_setup = setup
             prev_time = fdat[5]
-            count += 1
-        batch_sets.append((curr_batch, setup, (first_time, last_time)))
-    return batch_sets
+            first_time = fdat[1]
+            last_time = fdat[5]
+            prev_ts = fdat[7]
+            count = 0
+        maintain_batch = True
+        # determine if the batch needs to be broken
+        if (fdat[1]-prev_time).total_seconds() > threshold:
+            maintain_batch = False
+        if count != 0 and (fdat[6] + misorder_thresh) < prev_ts:
+            if not (prev_ts > max_ts_thresh and fdat[6] < min_ts_thresh):
+                maintain_batch = False
+        # break the batch if need be
+        if maintain_batch:
+            curr_batch.append(fdat)
+            last_time = fdat[5]
+        else:
+            yield (curr_batch, curr_setup, (first_time, last_time))
+            first_time = fdat[1]
+            last_time = fdat[5]
+            curr_batch = [fdat]
+        prev_ts = fdat[7]
+        prev_time = fdat[5]
+        count += 1
+    if curr_batch is not None:
+        yield (curr_batch, curr_setup, (first_time, last_time))
 
 
 def split_sub_batches_position(sub_batches):
@@ -131,8 +258,26 @@ def split_sub_batches_position(sub_batches):
         setup for that sub batch, a begin and end time for that sub batch, and
         the x and y positions for the array for that run
     """
-    batch_sets = []
-    curr_batch = []
+    return list(iter_sub_batches_position(sub_batches))
+
+
+def iter_sub_batches_position(sub_batches):
+    """Splits sub batches based on position exceptions as
+    split_sub_batches_position does, giving each sub batch as soon as it is
+    split
+
+    Parameters
+    ----------
+    sub_batches : iterable
+        sub batches with their detector setup and times, as given by
+        iter_sub_batches_time, it is only iterated over once
+
+    Yields
+    ------
+    batch_set : tuple
+        The files of the sub batch, its detector setup, begin and end time,
+        and the name and x and y position of the array
+    """
     prev_pos = 0
     curr_pos = 0
     prev_name = pc.EXCEPTION_NAME[0]
@@ -153,12 +298,10 @@ def split_sub_batches_position(sub_batches):
                 curr_batch.append(fdat)
             else:
                 if len(curr_batch) > 0:
-                    batch_sets.append((curr_batch, setup, dates,
-                                       [prev_name,
-                                        list(pc.EXCEPTION_DATA[prev_pos])]))
+                    yield (curr_batch, setup, dates,
+                           [prev_name, list(pc.EXCEPTION_DATA[prev_pos])])
                 prev_pos = curr_pos
                 prev_name = curr_name
                 curr_batch = [fdat]
-        batch_sets.append((curr_batch, setup, dates,
-                           [curr_name, list(pc.EXCEPTION_DATA[curr_pos])]))
-    return batch_sets
+        yield (curr_batch, setup, dates,
+               [curr_name, list(pc.EXCEPTION_DATA[curr_pos])])
@@ -0,0 +1,143 @@
+"""This file contains the functions that decide the order the batch jobs are
+submitted in and the dependencies between the jobs that submit_script sets up
+with qsub"""
+
+# the orders the batch jobs can be submitted in, timeline is the order of the
+# data, longest-first submits the batches with the most data first so that the
+# long jobs do not start last and stretch out the end of the campaign
+POLICIES = ["timeline", "longest-first", "shortest-first"]
+
+
+def order_batches(batch_bytes, policy):
+    """Gives the order to submit a set of batches in
+
+    Parameters
+    ----------
+    batch_bytes : list
+        The number of bytes of raw data in each batch, in timeline order
+    policy : str
+        One of POLICIES
+
+    Returns
+    -------
+    order : list
+        The indices of the batches in the order they should be submitted
+    """
+    order = list(range(len(batch_bytes)))
+    if policy == "longest-first":
+        order.sort(key=lambda x: -batch_bytes[x])
+    elif policy == "shortest-first":
+        order.sort(key=lambda x: batch_bytes[x])
+    elif policy != "timeline":
+        raise ValueError("Unknown submission policy: " + policy)
+    return order
+
+
+def plan_submission(batch_dirs, batch_bytes, merge_groups, policy,
+                    build_dir=None, only=None):
+    """Builds the list of jobs to submit, in submission order, with the jobs
+    each one has to wait for. Every job comes after the jobs it depends on
+
+    Parameters
+    ----------
+    batch_dirs : list
+        The directory of each batch job, in timeline order
+    batch_bytes : list
+        The number of bytes of raw data in each batch, in timeline order
+    merge_groups : list
+        list of (sub batch folder, list of chunk folders) pairs, each merge job
+        waits for the jobs of its chunks
+    policy : str
+        One of POLICIES
+    build_dir : str
+        If not None, the directory of a build job that every batch job waits
+        for
+    only : set
+        If not None, only the jobs of these directories are planned, a merge
+        job is planned if its directory or any of its chunks are, and the
+        build job is planned if any batch job is. Jobs do not wait for jobs
+        that are not planned
+
+    Returns
+    -------
+    jobs : list
+        List of dictionaries with the shell variable that holds the job's id
+        ("var"), the directory to submit from ("dir"), the script to submit
+        ("script"), the variables of the jobs it waits for ("deps") and a
+        description of the job ("comment")
+    """
+    jobs = []
+    batch_deps = []
+    order = order_batches(batch_bytes, policy)
+    if only is not None:
+        order = [num for num in order if batch_dirs[num] in only]
+    if build_dir is not None and len(order) > 0:
+        jobs.append({"var": "BUILD", "dir": build_dir,
+                     "script": "./build_script", "deps": [],
+                     "comment": "Build of OrchidReader for the batches"})
+        batch_deps = ["BUILD"]
+    dir_vars = {}
+    for num in order:
+        var = "BATCH_{0:d}".format(num)
+        dir_vars[batch_dirs[num]] = var
+        jobs.append({"var": var, "dir": batch_dirs[num],
+                     "script": "./batch_script", "deps": list(batch_deps),
+                     "comment": "Batch number: {0:d}".format(num)})
+    for num, (batch_dir, chunk_dirs) in enumerate(merge_groups):
+        deps = [dir_vars[chunk_dir] for chunk_dir in chunk_dirs
+                if chunk_dir in dir_vars]
+        if only is not None and batch_dir not in only and len(deps) == 0:
+            continue
+        jobs.append({"var": "MERGE_{0:d}".format(num), "dir": batch_dir,
+                     "script": "./merge_script", "deps": deps,
+                     "comment": "Merge of the chunks of: " + batch_dir})
+    return jobs
+
+
+def get_qsub_lines(job, needed):
+    """Gives the lines of shell that submit a job
+
+    Parameters
+    ----------
+    job : dict
+        A job from plan_submission
+    needed : set
+        The variables of the jobs that other jobs depend on, the job id is only
+        kept if it is needed
+
+    Returns
+    -------
+    lines : str
+        The lines of shell, newline terminated
+    """
+    lines = "# {0:s}\ncd {1:s}\n".format(job["comment"], job["dir"])
+    qsub = "$QSUB"
+    if len(job["deps"]) > 0:
+        qsub += " -W depend=afterok:" + ":".join(["$" + dep for dep
+                                                   in job["deps"]])
+    qsub += " " + job["script"]
+    if job["var"] in needed:
+        return lines + "{0:s}=$({1:s}) || exit 1\n".format(job["var"], qsub)
+    return lines + qsub + "\n"
+
+
+def get_submit_lines(jobs):
+    """Gives the lines of shell that submit a list of jobs, with the qsub used
+    taken from QSUB if it is set
+
+    Parameters
+    ----------
+    jobs : list
+        The jobs from plan_submission, in submission order
+
+    Returns
+    -------
+    lines : str
+        The lines of shell, newline terminated
+    """
+    # only the ids of jobs that other jobs wait for need to be kept
+    needed = set()
+    for job in jobs:
+        needed.update(job["deps"])
+    return "QSUB=${QSUB:-qsub}\n" + "".join([get_qsub_lines(job, needed)
+                                             for job in jobs])
@@ -0,0 +1,6 @@
+"""Puts the top of the repository on the path so the tests can import
+orsslib and the setup script without installing anything"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
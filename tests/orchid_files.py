@@ -0,0 +1,62 @@
+"""Writes small synthetic ORCHID raw data files for the tests, with the layout
+declared in orchid_format"""
+import time
+import struct
+import orsslib.orchid_format as ofmt
+
+# the channels of the events, board and channel pairs
+ALL_CHANNELS = [(0, chan) for chan in range(16)]
+
+
+def make_event(board, channel, time_stamp):
+    """Gives the bytes of a DppPsd event"""
+    event = bytearray(ofmt.DPP_PSD_EVENT.size)
+    struct.pack_into("<HBBIH", event, 0, ofmt.DPP_PSD_TYPE, board, channel,
+                     time_stamp & 0x7fffffff,
+                     time_stamp >> ofmt.TIME_STAMP_SHIFT)
+    return event
+
+
+def write_data_file(path, start, run_name, run_num, seq_num, num_buffers=1,
+                    buffer_secs=60.0, first_ts=1000, channels=None,
+                    num_events=100, leading=False, trailing=0):
+    """Writes a data file whose buffers each hold num_events events 1000
+    timestamp ticks apart, ending buffer_secs after each other
+
+    Returns
+    -------
+    last_ts : int
+        The timestamp of the last event of the file
+    """
+    if channels is None:
+        channels = ALL_CHANNELS
+    out = bytearray()
+    if leading:
+        marker = bytearray(ofmt.LEADING_BUFFER_SIZE)
+        struct.pack_into("<I", marker, 0, ofmt.LEADING_BUFFER_MARKER)
+        out += marker
+    header = bytearray(ofmt.FILE_HEADER_SIZE)
+    date = start.strftime("%Y-%m-%dT%H:%M:%S.%f").encode("ascii")
+    header[26:26 + len(date)] = date
+    name = run_name.encode("ascii")
+    header[56:56 + len(name)] = name
+    struct.pack_into("<II", header, 156, run_num, seq_num)
+    out += header
+    begin = time.mktime(start.timetuple()) + start.microsecond / 1.0e6
+    time_stamp = first_ts
+    for buf_num in range(num_buffers):
+        buf = bytearray(ofmt.BUFFER_SIZE)
+        struct.pack_into("<q", buf, 24,
+                         int((begin + (buf_num + 1) * buffer_secs) * 1.0e6))
+        ind = ofmt.BUFFER_HEADER_SIZE
+        for count in range(num_events):
+            board, channel = channels[count % len(channels)]
+            buf[ind:ind + ofmt.DPP_PSD_EVENT.size] = make_event(
+                board, channel, time_stamp)
+            ind += ofmt.DPP_PSD_EVENT.size
+            time_stamp += 1000
+        out += buf
+    out += bytearray(trailing)
+    with open(path, 'wb') as out_file:
+        out_file.write(out)
+    return time_stamp - 1000
@@ -0,0 +1,94 @@
+"""Checks where large sub batches are cut into chunks and that only the first
+chunk keeps the ProcessFirstBuffer setting"""
+import os
+import datetime
+import orchid_reader_simple_setup as orss
+import orsslib.batch_chunking as bc
+import orsslib.scan_cache as sc
+from orchid_files import write_data_file
+
+START = datetime.datetime(2017, 9, 10, 12, 0)
+
+
+def make_files(tmp_path, sizes, step=300):
+    """Writes files of the given sizes and gives their file data, the files
+    start step seconds apart"""
+    files = []
+    for ind, size in enumerate(sizes):
+        path = str(tmp_path / "Sept10_0000.dat.{0:04d}".format(ind))
+        with open(path, 'wb') as out_file:
+            out_file.write(b"\x00" * size)
+        begin = START + datetime.timedelta(seconds=ind * step)
+        files.append([path, begin, "Sept10", 0, ind,
+                      begin + datetime.timedelta(seconds=step), 0, 0])
+    return files
+
+
+def test_cuts_on_integration_boundaries(tmp_path):
+    # the byte halfway point is at the start of file 5, 1500 s in, the files
+    # next to it start on a whole number of 600 s periods
+    files = make_files(tmp_path, [100] * 10)
+    assert bc.find_chunk_starts(files, 2, 600.0) == [0, 4]
+    # with a period the files start on, the cut is where the bytes say
+    assert bc.find_chunk_starts(files, 2, 300.0) == [0, 5]
+    # the cuts follow the bytes, not the number of files
+    files = make_files(tmp_path, [450, 100, 100, 100, 100, 100, 100, 100])
+    assert bc.find_chunk_starts(files, 2, 300.0) == [0, 2]
+
+
+def test_every_chunk_gets_a_file(tmp_path):
+    files = make_files(tmp_path, [1000, 1, 1])
+    assert bc.find_chunk_starts(files, 3, 600.0) == [0, 1, 2]
+    assert bc.find_chunk_starts(files, 5, 600.0) == [0, 1, 2]
+
+
+def test_only_large_sub_batches_are_cut(tmp_path):
+    files = make_files(tmp_path, [100] * 6)
+    big = (files[:4], ("NaI",), (files[0][1], files[3][5]), ("Pos1", (1, 2)),
+           ("Sept10_0", str(tmp_path / "Sept10_0")))
+    small = (files[4:], ("NaI",), (files[4][1], files[5][5]),
+             ("Pos1", (1, 2)), ("Sept10_1", str(tmp_path / "Sept10_1")))
+    out_batches, merge_groups = bc.chunk_sub_batches([big, small], 2, 300,
+                                                     600.0)
+    assert [batch[4] for batch in out_batches] == [
+        ("Sept10_0_chunk0", str(tmp_path / "Sept10_0" / "chunk_0")),
+        ("Sept10_0_chunk1", str(tmp_path / "Sept10_0" / "chunk_1")),
+        small[4]]
+    assert [len(batch[0]) for batch in out_batches] == [2, 2, 2]
+    assert out_batches[1][2] == (files[2][1], files[3][5])
+    assert merge_groups == [(big[4][1], [out_batches[0][4][1],
+                                         out_batches[1][4][1]])]
+
+
+def read_cfg_setting(batch_dir, setting):
+    """Gives the value of a setting of the batch_cfg of a directory"""
+    with open(os.path.join(batch_dir, "batch_cfg")) as in_file:
+        for line in in_file:
+            if line.startswith(setting + " = "):
+                return line.split(" = ")[1].strip()
+    return None
+
+
+def test_later_chunks_process_their_first_buffer(tmp_path, monkeypatch):
+    monkeypatch.setattr(orss, "PROCESS_FIRST_BUFFER", False)
+    indir = str(tmp_path / "Sept10")
+    outdir = str(tmp_path / "out")
+    os.makedirs(indir)
+    last_ts = 0
+    for seq_num in range(4):
+        last_ts = write_data_file(
+            os.path.join(indir, "Sept10_0000.dat.{0:04d}".format(seq_num)),
+            START + datetime.timedelta(seconds=300 * seq_num), "Sept10", 0,
+            seq_num, num_buffers=2, buffer_secs=150.0,
+            first_ts=last_ts + 1000)
+    cache = sc.ScanCache(sc.get_cache_path(outdir, "Sept10"))
+    sub_batches = orss.get_proc_folders(outdir, orss.split_into_subbatches(
+        orss.get_and_sort_file_list(indir, cache)), "Sept10")
+    assert len(sub_batches) == 1
+    chunks, merge_groups = bc.chunk_sub_batches(sub_batches, 2, 0, 600.0)
+    orss.build_batch_scripts(chunks, merge_groups, email="me@x.org")
+    batch_dir, chunk_dirs = merge_groups[0]
+    assert [read_cfg_setting(chunk_dir, "ProcessFirstBuffer")
+            for chunk_dir in chunk_dirs] == ["False", "True"]
+    assert os.path.exists(os.path.join(batch_dir, "merge_script"))
+    assert not os.path.exists(os.path.join(batch_dir, "batch_cfg"))
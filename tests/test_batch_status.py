@@ -0,0 +1,127 @@
+"""Checks the provenance hash of the batch inputs and which batches are found
+complete, failed or stale and submitted again"""
+import os
+import subprocess
+import pytest
+import orchid_reader_simple_setup as orss
+import orsslib.batch_status as bst
+import orsslib.result_harvest as rh
+import orsslib.submit_planning as sp
+
+# the time the batch files are written, the job starts a minute later
+WRITTEN = 1500000000
+
+
+def has_program(name):
+    """Checks if a program is on the path"""
+    return any([os.access(os.path.join(path, name), os.X_OK)
+                for path in os.environ.get("PATH", "").split(os.pathsep)])
+
+
+def make_batch(tmp_path, name, exit_status="0"):
+    """Writes a batch directory with two input files, left as a job with the
+    given exit status would leave it, None for a job that has not finished"""
+    batch_dir = str(tmp_path / name)
+    os.makedirs(batch_dir)
+    inputs = []
+    for ind in range(2):
+        inputs.append(os.path.join(batch_dir, "in.dat.{0:04d}".format(ind)))
+        with open(inputs[-1], 'wb') as out_file:
+            out_file.write(b"\x00" * (100 + ind))
+    for fname in bst.BATCH_FILES:
+        with open(os.path.join(batch_dir, fname), 'w') as out_file:
+            if fname == "input_file_list":
+                out_file.write("".join([path + "\n" for path in inputs]))
+        os.utime(os.path.join(batch_dir, fname), (WRITTEN, WRITTEN))
+    write_marker(batch_dir, bst.STARTED_MARKER, bst.get_provenance_hash(
+        os.path.join(batch_dir, "input_file_list")), WRITTEN + 60)
+    if exit_status is not None:
+        write_outputs(batch_dir)
+        write_marker(batch_dir, bst.EXIT_MARKER, exit_status, WRITTEN + 120)
+    return batch_dir
+
+
+def write_marker(batch_dir, name, value, mtime):
+    """Writes a marker as the batch script does"""
+    path = os.path.join(batch_dir, name)
+    with open(path, 'w') as out_file:
+        out_file.write(value + "\n")
+    os.utime(path, (mtime, mtime))
+
+
+def write_outputs(batch_dir):
+    """Writes the csv files and root file of a finished job"""
+    for kind in rh.CSV_KINDS:
+        with open(os.path.join(batch_dir, kind + ".csv"), 'w') as out_file:
+            out_file.write("a, b\n1, 2\n")
+    with open(os.path.join(batch_dir, rh.ROOT_FILE_NAME), 'wb') as out_file:
+        out_file.write(b"root")
+
+
+@pytest.mark.skipif(not (has_program("bash") and has_program("md5sum")),
+                    reason="needs bash, stat and md5sum")
+def test_hash_matches_batch_script(tmp_path):
+    batch_dir = make_batch(tmp_path, "batch")
+    # a file that is gone is left out by both
+    with open(os.path.join(batch_dir, "input_file_list"), 'a') as out_file:
+        out_file.write(os.path.join(batch_dir, "gone.dat.0000") + "\n")
+    script = "BATCH_DIR=" + batch_dir + "\n" + orss.MARK_STARTED.format(
+        exit_marker=bst.EXIT_MARKER, started_marker=bst.STARTED_MARKER)
+    subprocess.check_call(["bash", "-c", script])
+    assert bst.read_marker(os.path.join(batch_dir, bst.STARTED_MARKER)) ==\
+        bst.get_provenance_hash(os.path.join(batch_dir, "input_file_list"))
+
+
+def test_batch_states(tmp_path):
+    assert bst.get_batch_status(make_batch(tmp_path, "done")) ==\
+        (bst.COMPLETE, [])
+    assert bst.get_batch_status(make_batch(tmp_path, "crashed", "1"))[0] ==\
+        bst.FAILED
+    assert bst.get_batch_status(make_batch(tmp_path, "unstaged",
+                                           bst.STAGE_IN_FAILED))[0] ==\
+        bst.FAILED
+    running = make_batch(tmp_path, "running", None)
+    assert bst.get_batch_status(running)[0] == bst.UNFINISHED
+    assert bst.get_batch_status(running, walltime=1.0)[0] == bst.FAILED
+    cut_short = make_batch(tmp_path, "cut_short")
+    with open(os.path.join(cut_short, "run_data.csv"), 'a') as out_file:
+        out_file.write("3,")
+    assert bst.get_batch_status(cut_short)[0] == bst.FAILED
+    not_run = str(tmp_path / "not_run")
+    os.makedirs(not_run)
+    assert bst.get_batch_status(not_run)[0] == bst.NOT_RUN
+
+
+def test_changed_inputs_are_stale(tmp_path):
+    touched = make_batch(tmp_path, "touched")
+    os.utime(os.path.join(touched, "in.dat.0001"), (WRITTEN, WRITTEN + 5))
+    assert bst.get_batch_status(touched)[0] == bst.STALE
+    grown = make_batch(tmp_path, "grown")
+    stat = os.stat(os.path.join(grown, "in.dat.0000"))
+    with open(os.path.join(grown, "in.dat.0000"), 'ab') as out_file:
+        out_file.write(b"\x00")
+    os.utime(os.path.join(grown, "in.dat.0000"),
+             (stat.st_atime, stat.st_mtime))
+    assert bst.get_batch_status(grown)[0] == bst.STALE
+    rewritten = make_batch(tmp_path, "rewritten")
+    os.utime(os.path.join(rewritten, "batch_cfg"),
+             (WRITTEN + 90, WRITTEN + 90))
+    assert bst.get_batch_status(rewritten) == (
+        bst.STALE, ["batch_cfg was written after the job started"])
+
+
+def test_only_failed_chunks_and_their_merge_are_resubmitted(tmp_path):
+    done = make_batch(tmp_path, "done")
+    chunks = [make_batch(tmp_path, "sub/chunk_0"),
+              make_batch(tmp_path, "sub/chunk_1", "137")]
+    sub_dir = str(tmp_path / "sub")
+    manifest = {"batches": [{"dir": path} for path in [done] + chunks],
+                "merges": [{"dir": sub_dir, "chunks": chunks}]}
+    statuses = bst.get_statuses(manifest, workers=2)
+    assert statuses[sub_dir] == (bst.WAITING, ["waits for chunk_1"])
+    only = bst.get_resubmit_dirs(statuses, [bst.FAILED, bst.STALE])
+    assert only == set([chunks[1]])
+    jobs = sp.plan_submission([done] + chunks, [1, 1, 1],
+                              [(sub_dir, chunks)], "timeline", only=only)
+    assert [(job["dir"], job["deps"]) for job in jobs] == [
+        (chunks[1], []), (sub_dir, ["BATCH_2"])]
@@ -0,0 +1,76 @@
+"""Checks the end times read from every buffer, for files with and without the
+leading block, and the stalls and gaps found in them"""
+import gzip
+import struct
+import datetime
+import pytest
+import orsslib.buffer_timeline as bt
+import orsslib.orchid_format as ofmt
+from orchid_files import write_data_file
+
+START = datetime.datetime(2017, 9, 10, 12, 0)
+
+# seconds since the first buffer ended: a stall after buffer 3, a gap after
+# buffer 5 and a buffer that ends before the one before it
+OFFSETS = [0.0, 1.0, 2.0, 3.0, 40.0, 41.0, 300.0, 299.5, 300.5]
+
+
+def write_timeline_file(path, end_times, leading):
+    """Writes a data file with a buffer for each end time, followed by half a
+    buffer that is not complete"""
+    write_data_file(path, START, "Sept10", 0, 0, num_buffers=len(end_times),
+                    num_events=10, leading=leading,
+                    trailing=ofmt.BUFFER_SIZE // 2)
+    first = ofmt.FILE_HEADER_SIZE + ofmt.END_TIME.offset
+    if leading:
+        first += ofmt.LEADING_BUFFER_SIZE
+    with open(path, 'r+b') as out_file:
+        for buf_num, end_time in enumerate(end_times):
+            out_file.seek(first + buf_num * ofmt.BUFFER_SIZE)
+            out_file.write(struct.pack("<q", end_time))
+
+
+def make_end_times():
+    """Gives the end times of OFFSETS in microseconds"""
+    return [1505044860000000 + int(secs * 1000000) for secs in OFFSETS]
+
+
+@pytest.mark.parametrize("leading", [False, True])
+def test_end_times(tmp_path, leading):
+    path = str(tmp_path / "Sept10_0000.dat.0000")
+    write_timeline_file(path, make_end_times(), leading)
+    assert bt.read_end_times(path) == make_end_times()
+
+
+@pytest.mark.parametrize("leading", [False, True])
+def test_end_times_without_numpy(tmp_path, monkeypatch, leading):
+    monkeypatch.setattr(bt, "np", None)
+    path = str(tmp_path / "Sept10_0000.dat.0000")
+    write_timeline_file(path, make_end_times(), leading)
+    assert bt.read_end_times(path) == make_end_times()
+
+
+def test_end_times_of_compressed_file(tmp_path):
+    path = str(tmp_path / "Sept10_0000.dat.0000")
+    write_timeline_file(path, make_end_times(), True)
+    with open(path, 'rb') as in_file:
+        rawdata = in_file.read()
+    with gzip.open(path + ".gz", 'wb') as out_file:
+        out_file.write(rawdata)
+    assert bt.read_end_times(path + ".gz") == make_end_times()
+
+
+def test_stalls_and_gaps(tmp_path):
+    path = str(tmp_path / "Sept10_0000.dat.0000")
+    write_timeline_file(path, make_end_times(), True)
+    fname, timeline = bt.timeline_file(path)
+    assert fname == path
+    assert timeline["num_buffers"] == len(OFFSETS)
+    assert timeline["median"] == 1.0
+    assert timeline["intervals"] == [[1, 1.0], [2, 1.0], [3, 1.0],
+                                     [4, 37.0], [5, 1.0], [6, 259.0],
+                                     [7, -0.5], [8, 1.0]]
+    assert bt.get_timeline_problems(timeline, 120.0) == [
+        "buffer 4: stall of 37.0 s, the median buffer takes 1.000 s",
+        "buffer 6: gap of 259.0 s, longer than the split time",
+        "buffer 7: ended 0.500 s before the buffer before it"]
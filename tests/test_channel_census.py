@@ -0,0 +1,73 @@
+"""Checks the channel census of data files and the detector setups inferred
+from it"""
+import datetime
+import orsslib.channel_census as cc
+import orsslib.setup_changes as sc
+import orsslib.sub_batch_handling as sb_hnd
+from orchid_files import ALL_CHANNELS, write_data_file
+
+START = datetime.datetime(2017, 9, 1)
+DEFAULT = sc.EXCEPTION_NAME.index("Default")
+CEBR = sc.EXCEPTION_NAME.index("CeBr3")
+NO_HE = sc.EXCEPTION_NAME.index("No_3He")
+MOD_HE = sc.EXCEPTION_NAME.index("Mod_3He")
+
+
+def without(*chans):
+    """Gives the channels of the default setup less some of them"""
+    return set([pair for pair in ALL_CHANNELS if pair[1] not in chans])
+
+
+def test_sample_buffers():
+    assert cc.get_sample_buffers(3, 4) == [0, 1, 2]
+    assert cc.get_sample_buffers(100, 1) == [0]
+    assert cc.get_sample_buffers(100, 4) == [0, 33, 66, 99]
+
+
+def test_match_setups():
+    assert cc.match_setups(set(ALL_CHANNELS)) == [DEFAULT]
+    assert cc.match_setups(without(6)) == [MOD_HE]
+    assert cc.match_setups(without(6, 7)) == [CEBR, NO_HE]
+    # a missing detector that no setup leaves out is closest to the default
+    assert cc.match_setups(without(3)) == [DEFAULT]
+
+
+def test_pick_inferred_setup():
+    # a census without channels 6 and 7 cannot tell CeBr3 from No_3He, the
+    # CeBr3 runs are known by name so an unlisted run is No_3He
+    assert sb_hnd.pick_inferred_setup(DEFAULT, [CEBR, NO_HE]) ==\
+        (NO_HE, None)
+    assert sb_hnd.pick_inferred_setup(CEBR, [CEBR, NO_HE]) == (CEBR, None)
+    assert sb_hnd.pick_inferred_setup(DEFAULT, [MOD_HE]) == (MOD_HE, None)
+    det, warning = sb_hnd.pick_inferred_setup(NO_HE, [MOD_HE])
+    assert det == NO_HE
+    assert warning is not None
+    det, warning = sb_hnd.pick_inferred_setup(DEFAULT, [DEFAULT, MOD_HE])
+    assert det == DEFAULT
+    assert warning is None
+    det, warning = sb_hnd.pick_inferred_setup(DEFAULT, [CEBR, MOD_HE])
+    assert det == DEFAULT
+    assert warning is not None
+
+
+def test_census_without_he_infers_no_he(tmp_path):
+    channels = sorted(without(6, 7))
+    file_list = []
+    censuses = {}
+    for seq_num in range(2):
+        path = str(tmp_path / "Oct02_2017_0000.dat.{0:04d}".format(seq_num))
+        write_data_file(path, START + datetime.timedelta(minutes=seq_num),
+                        "Oct02_2017", 0, seq_num, num_buffers=3,
+                        channels=channels)
+        fname, census = cc.census_file((path, 2))
+        assert census["samples"] == 2
+        assert set(census["counts"]) ==\
+            set(["{0:d},{1:d}".format(*pair) for pair in channels])
+        censuses[fname] = census
+        file_list.append([path, (START, "Oct02_2017", 0, seq_num, START, 0,
+                                 0)])
+    inferred = cc.infer_setups(file_list, censuses)
+    assert inferred == dict([(fdat[0], [CEBR, NO_HE]) for fdat in file_list])
+    setups = [setup[0] for _, setup, _ in
+              sb_hnd.iter_det_setup_files(file_list, inferred)]
+    assert setups == ["No_3He", "No_3He"]
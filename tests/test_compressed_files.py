@@ -0,0 +1,179 @@
+"""Checks the random access reads of compressed files against the raw bytes
+they were made from, for files with many gzip members, bzip2 streams and xz
+blocks"""
+import io
+import bz2
+import gzip
+import random
+import struct
+import subprocess
+import pytest
+import orsslib.compressed_files as cf
+import orsslib.file_verification as fv
+import orsslib.header_readers as hr
+import orsslib.orchid_format as ofmt
+
+# small enough that every file spans many chunks and restart points
+CHUNK_SIZE = 4096
+NUM_PIECES = 5
+
+
+def make_raw_data(num_words=40000):
+    """Gives raw data bytes that compress, but not to almost nothing"""
+    rng = random.Random(7)
+    return b"".join([struct.pack("<I", rng.randint(0, 1 << 20))
+                     for _ in range(num_words)])
+
+
+def split_pieces(rawdata):
+    """Splits the raw data into pieces of uneven sizes"""
+    step = len(rawdata) // NUM_PIECES
+    bounds = [0] + [ind * step + 37 * ind for ind in range(1, NUM_PIECES)]
+    bounds.append(len(rawdata))
+    return [rawdata[first:end] for first, end in zip(bounds[:-1], bounds[1:])]
+
+
+def gzip_bytes(rawdata):
+    """Compresses bytes into a single gzip member"""
+    out = io.BytesIO()
+    with gzip.GzipFile(fileobj=out, mode="wb") as gz_file:
+        gz_file.write(rawdata)
+    return out.getvalue()
+
+
+def write_file(tmp_path, name, data):
+    """Writes bytes to a file and gives its path"""
+    path = str(tmp_path / name)
+    with open(path, 'wb') as out_file:
+        out_file.write(data)
+    return path
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    """Shrinks the chunks decompressed at once"""
+    monkeypatch.setattr(cf, "CHUNK_SIZE", CHUNK_SIZE)
+
+
+def check_random_access(path, rawdata):
+    """Compares reads of a compressed file with the raw bytes"""
+    assert cf.get_data_size(path) == len(rawdata)
+    rng = random.Random(11)
+    in_file = cf.open_data_file(path)
+    try:
+        assert isinstance(in_file, cf.CompressedFile)
+        # jumps forwards and backwards, across the restart points
+        for _ in range(200):
+            offset = rng.randint(0, len(rawdata))
+            size = rng.randint(0, 3 * CHUNK_SIZE)
+            assert in_file.read_at(offset, size) ==\
+                rawdata[offset:offset + size]
+        # the header, the first buffer and the last buffer, as the scan reads
+        assert in_file.read_at(0, 100) == rawdata[:100]
+        in_file.seek(-1000, 2)
+        assert in_file.tell() == len(rawdata) - 1000
+        assert in_file.read() == rawdata[-1000:]
+        assert in_file.read(10) == b""
+        # a sequential read from the start
+        in_file.seek(0)
+        pieces = []
+        while True:
+            data = in_file.read(CHUNK_SIZE + 123)
+            if len(data) == 0:
+                break
+            pieces.append(data)
+        assert b"".join(pieces) == rawdata
+        # past the end
+        assert in_file.read_at(len(rawdata) + 5, 10) == b""
+    finally:
+        in_file.close()
+
+
+def test_multi_member_gzip(tmp_path):
+    rawdata = make_raw_data()
+    path = write_file(tmp_path, "run_0000.dat.gz", b"".join(
+        [gzip_bytes(piece) for piece in split_pieces(rawdata)]))
+    assert len(cf.get_index(path).points) == NUM_PIECES
+    check_random_access(path, rawdata)
+
+
+def test_single_member_gzip_checkpoints(tmp_path, monkeypatch):
+    monkeypatch.setattr(cf, "CHECKPOINT_SPACING", 3 * CHUNK_SIZE)
+    rawdata = make_raw_data()
+    path = write_file(tmp_path, "run_0001.dat.gz", gzip_bytes(rawdata))
+    index = cf.get_index(path)
+    assert len(index.points) == 1
+    assert len(index.checkpoints) > 1
+    check_random_access(path, rawdata)
+
+
+def test_multi_stream_bzip2(tmp_path):
+    rawdata = make_raw_data()
+    path = write_file(tmp_path, "run_0002.dat.bz2", b"".join(
+        [bz2.compress(piece) for piece in split_pieces(rawdata)]))
+    assert len(cf.get_index(path).points) == NUM_PIECES
+    check_random_access(path, rawdata)
+
+
+@pytest.mark.skipif(cf.lzma is None, reason="no lzma module")
+def test_multi_stream_xz(tmp_path):
+    rawdata = make_raw_data()
+    path = write_file(tmp_path, "run_0003.dat.xz", b"".join(
+        [cf.lzma.compress(piece) for piece in split_pieces(rawdata)]))
+    assert len(cf.get_index(path).points) == NUM_PIECES
+    check_random_access(path, rawdata)
+
+
+@pytest.mark.skipif(cf.lzma is None, reason="no lzma module")
+def test_multi_block_xz(tmp_path):
+    rawdata = make_raw_data()
+    path = write_file(tmp_path, "run_0004.dat", rawdata)
+    try:
+        subprocess.check_call(["xz", "--block-size=20000", path])
+    except OSError:
+        pytest.skip("no xz command")
+    path += ".xz"
+    assert len(cf.get_index(path).points) > 1
+    check_random_access(path, rawdata)
+
+
+def test_raw_file(tmp_path):
+    rawdata = make_raw_data(100)
+    path = write_file(tmp_path, "run_0005.dat", rawdata)
+    assert not cf.is_compressed(path)
+    assert cf.get_data_size(path) == len(rawdata)
+    with cf.open_data_file(path) as in_file:
+        assert in_file.read() == rawdata
+
+
+def make_damaged_files(tmp_path):
+    """Writes a truncated file of every codec and a gzip file with garbled
+    data, all made from a valid data file"""
+    rawdata = bytearray(ofmt.MIN_FILE_SIZE)
+    paths = []
+    compressed = [("gz", gzip_bytes(bytes(rawdata))),
+                  ("bz2", bz2.compress(bytes(rawdata)))]
+    if cf.lzma is not None:
+        compressed.append(("xz", cf.lzma.compress(bytes(rawdata))))
+    for ext, data in compressed:
+        paths.append(write_file(tmp_path, "cut_0000.dat." + ext,
+                                data[:len(data) // 2]))
+    data = bytearray(gzip_bytes(make_raw_data()))
+    for ind in range(200, 400):
+        data[ind] ^= 0x55
+    paths.append(write_file(tmp_path, "bad_0000.dat.gz", bytes(data)))
+    return paths
+
+
+def test_damaged_files_raise(tmp_path):
+    for path in make_damaged_files(tmp_path):
+        with pytest.raises(cf.DECOMPRESS_ERRORS):
+            cf.get_data_size(path)
+
+
+def test_damaged_files_are_left_out(tmp_path):
+    for path in make_damaged_files(tmp_path):
+        assert hr.get_file_header_data(path) is None
+        _, result = fv.verify_file((path, False))
+        assert not result["ok"]
+        assert result["problems"][0].startswith("unreadable file")
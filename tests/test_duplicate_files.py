@@ -0,0 +1,67 @@
+"""Checks which copies of data files are found and dropped"""
+import datetime
+import orsslib.duplicate_files as dup
+
+START = datetime.datetime(2017, 9, 1)
+
+
+def make_fdat(tmp_path, fname, seq_num, first_ts, last_ts, minutes,
+              size=100):
+    """Writes a file of a size and gives its file data"""
+    path = str(tmp_path / fname)
+    with open(path, 'wb') as out_file:
+        out_file.write(b"\x00" * size)
+    begin = START + datetime.timedelta(minutes=minutes)
+    return [path, (begin, "Sept10", 3, seq_num,
+                   begin + datetime.timedelta(minutes=10), first_ts, last_ts)]
+
+
+def test_coincide():
+    assert dup.coincide((0, 10), (0, 10))
+    assert dup.coincide((0, 10), (4, 100))
+    assert not dup.coincide((0, 10), (6, 100))
+    assert not dup.coincide((0, 10), (10, 20))
+    assert dup.coincide((5, 5), (5, 5))
+    assert not dup.coincide((5, 5), (0, 10))
+
+
+def test_identity_copies_only_by_default(tmp_path):
+    first = make_fdat(tmp_path, "a.dat.0000", 0, 0, 1000, 0)
+    second = make_fdat(tmp_path, "a.dat.0001", 1, 1000, 2000, 10, size=200)
+    # the same header copied under another name, and larger
+    copy = make_fdat(tmp_path, "b.dat.0000", 0, 0, 1000, 0, size=200)
+    # a resynced copy of the second file with another sequence number
+    resync = make_fdat(tmp_path, "c.dat.0007", 7, 1100, 2000, 11)
+    file_list = [first, copy, second, resync]
+    dropped, found = dup.find_duplicates(file_list, "largest")
+    assert dropped == found
+    assert [(drop, keep) for drop, keep, _ in dropped] ==\
+        [(first[0], copy[0])]
+    dropped, _ = dup.find_duplicates(file_list, "largest", by_overlap=True)
+    assert set([drop for drop, _, _ in dropped]) ==\
+        set([first[0], resync[0]])
+    kept = dup.drop_duplicate_files(file_list, "largest")
+    assert kept == [copy, second, resync]
+
+
+def test_keep_policy_drops_nothing(tmp_path):
+    first = make_fdat(tmp_path, "a.dat.0000", 0, 0, 1000, 0)
+    copy = make_fdat(tmp_path, "b.dat.0000", 0, 0, 1000, 0)
+    dropped, found = dup.find_duplicates([first, copy], "keep")
+    assert dropped == []
+    assert len(found) == 1
+    assert dup.drop_duplicate_files([first, copy], "keep") == [first, copy]
+
+
+def test_streamed_copies_are_dropped(tmp_path):
+    first = make_fdat(tmp_path, "a.dat.0000", 0, 0, 1000, 0)
+    copy = make_fdat(tmp_path, "b.dat.0000", 0, 0, 1000, 0, size=200)
+    # another file that starts at the same time but is not a copy
+    other = make_fdat(tmp_path, "a.dat.0005", 5, 0, 1000, 0)
+    second = make_fdat(tmp_path, "a.dat.0001", 1, 1000, 2000, 10)
+    file_list = [first, copy, other, second]
+    assert list(dup.iter_unique_files(iter(file_list), "largest")) ==\
+        dup.drop_duplicate_files(file_list, "largest") ==\
+        [copy, other, second]
+    assert list(dup.iter_unique_files(iter(file_list), "keep")) == file_list
+    assert list(dup.iter_unique_files(iter([]), "largest")) == []
@@ -0,0 +1,62 @@
+"""Checks that the external sort gives the files in the order the in memory
+sort of the file list does, across runs and merge passes"""
+import os
+import random
+import datetime
+import orchid_reader_simple_setup as orss
+import orsslib.external_plan as ep
+import orsslib.scan_cache as sc
+from orchid_files import write_data_file
+
+START = datetime.datetime(2017, 9, 10, 12, 0)
+
+
+def make_file_list(num_files=200):
+    """Gives an unsorted file list in which many files share a start time,
+    the names are not in the order of the list so that ties are not broken
+    by name"""
+    rng = random.Random(5)
+    file_list = []
+    for ind in range(num_files):
+        begin = START + datetime.timedelta(
+            minutes=rng.randint(0, 40), microseconds=rng.choice([0, 0, 250]))
+        name = "Sept10_0000.dat.{0:04d}".format((ind * 37) % num_files)
+        file_list.append(["/data/Sept10/" + name,
+                          (begin, "Sept10", 0, ind,
+                           begin + datetime.timedelta(minutes=10), ind, ind)])
+    return file_list
+
+
+def test_merge_matches_in_memory_sort(tmp_path, monkeypatch):
+    # enough runs that they are merged in several passes
+    monkeypatch.setattr(ep, "MAX_FAN_IN", 3)
+    file_list = make_file_list()
+    spill_dir = str(tmp_path / "spill")
+    sorter = ep.SpillSorter(spill_dir, 7)
+    for fname, header in file_list:
+        sorter.add(fname, sc.header_to_json(header))
+    merged = list(sorter.merge())
+    assert sorter.num_merged > 0
+    file_list.sort(key=lambda x: x[1][0])
+    assert merged == [[fname, tuple(header)] for fname, header in file_list]
+    sorter.cleanup()
+    assert not os.path.exists(spill_dir)
+
+
+def test_scan_to_runs_matches_file_list(tmp_path):
+    indir = str(tmp_path / "Sept10")
+    os.makedirs(indir)
+    for ind in range(12):
+        fname = os.path.join(indir, "Sept10_0000.dat.{0:04d}".format(ind))
+        write_data_file(fname, START + datetime.timedelta(
+            minutes=(ind * 7) % 5), "Sept10", 0, ind)
+    # too short to have a header, it is left out by both
+    with open(os.path.join(indir, "Sept10_0000.dat.0012"), 'wb') as out_file:
+        out_file.write(b"\x00" * 10)
+    sorter = ep.SpillSorter(str(tmp_path / "spill"), 5)
+    orss.scan_to_runs(indir, sc.ScanCache(str(tmp_path / "a.json")), sorter)
+    merged = list(sorter.merge())
+    file_list = orss.get_and_sort_file_list(
+        indir, sc.ScanCache(str(tmp_path / "b.json")))
+    assert len(merged) == 12
+    assert merged == [[fname, tuple(header)] for fname, header in file_list]
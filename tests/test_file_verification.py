@@ -0,0 +1,74 @@
+"""Checks that damaged files are caught by the header read and by --verify"""
+import struct
+import datetime
+import orsslib.orchid_format as ofmt
+import orsslib.header_readers as hr
+import orsslib.file_verification as fv
+from orchid_files import write_data_file
+
+START = datetime.datetime(2017, 6, 1, 0, 0, 0, 123456)
+
+
+def write_good_file(tmp_path, name="Jun01_2017_0000.dat.0000"):
+    path = str(tmp_path / name)
+    write_data_file(path, START, "Jun01_2017", 0, 0, num_buffers=2)
+    return path
+
+
+def patch(path, offset, data):
+    with open(path, 'r+b') as out_file:
+        out_file.seek(offset)
+        out_file.write(data)
+
+
+def test_good_file(tmp_path):
+    path = write_good_file(tmp_path)
+    header = hr.get_file_header_data(path)
+    assert header[:4] == (START, "Jun01_2017", 0, 0)
+    assert header[5] == 1000
+    _, result = fv.verify_file((path, True))
+    assert result["ok"]
+    assert result["num_buffers"] == 2
+    assert result["checksum"] is not None
+
+
+def test_garbled_date_is_left_out(tmp_path):
+    path = write_good_file(tmp_path)
+    patch(path, 26, b"XXXX")
+    assert hr.get_file_header_data(path) is None
+    _, result = fv.verify_file((path, False))
+    assert not result["ok"]
+    assert "unreadable file header" in result["problems"]
+
+
+def test_short_file_is_left_out(tmp_path):
+    path = str(tmp_path / "Jun01_2017_0000.dat.0001")
+    with open(path, 'wb') as out_file:
+        out_file.write(b"\x00" * 3000)
+    assert hr.get_file_header_data(path) is None
+    _, result = fv.verify_file((path, False))
+    assert not result["ok"]
+
+
+def test_garbled_event_word_fails(tmp_path):
+    path = write_good_file(tmp_path)
+    # the sixth event of the second buffer
+    offset = (ofmt.FILE_HEADER_SIZE + ofmt.BUFFER_SIZE +
+              ofmt.BUFFER_HEADER_SIZE + 5 * ofmt.DPP_PSD_EVENT.size)
+    patch(path, offset, struct.pack("<H", 60000))
+    _, result = fv.verify_file((path, False))
+    assert not result["ok"]
+    assert result["bad_buffers"] == [1]
+
+
+def test_missing_file_fails(tmp_path):
+    _, result = fv.verify_file((str(tmp_path / "gone.dat.0000"), False))
+    assert not result["ok"]
+    assert result["problems"][0].startswith("unreadable file")
+
+
+def test_event_sizes():
+    assert ofmt.get_event_size(ofmt.DPP_PSD_TYPE) == ofmt.DPP_PSD_EVENT.size
+    assert ofmt.get_event_size(ofmt.END_OF_EVENTS) == 0
+    assert ofmt.get_event_size(60000) is None
+    assert ofmt.get_event_size(ofmt.DPP_PSD_EVENT.size) is None
@@ -0,0 +1,65 @@
+"""Checks that the files generated for a synthetic input directory are byte
+for byte the ones in golden_setup, the same expected bytes are checked under
+Python 2 and Python 3"""
+import os
+import time
+import datetime
+import pytest
+import orchid_reader_simple_setup as orss
+import orsslib.scan_cache as sc
+from orchid_files import write_data_file
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "golden_setup")
+
+# the files of each sub batch that OrchidReader reads
+GENERATED = ["batch_cfg", "detector_setup", "input_file_list"]
+
+
+@pytest.fixture
+def utc(monkeypatch):
+    """Makes the local time UTC, so the buffer end times written and read do
+    not depend on the timezone of the machine"""
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def make_input_dir(indir):
+    """Writes a run matched by a detector setup pattern, followed months
+    later by two files of a run with the default setup"""
+    os.makedirs(indir)
+    write_data_file(os.path.join(indir, "Jun05_2017_0001.dat.0000"),
+                    datetime.datetime(2017, 6, 5, 10, 0, 0, 250000),
+                    "Jun05_2017", 1, 0, num_buffers=2)
+    last_ts = write_data_file(os.path.join(indir, "Sept10_0000.dat.0000"),
+                              datetime.datetime(2017, 9, 10, 12, 0),
+                              "Sept10", 0, 0, num_buffers=2)
+    write_data_file(os.path.join(indir, "Sept10_0000.dat.0001"),
+                    datetime.datetime(2017, 9, 10, 12, 2), "Sept10", 0, 1,
+                    num_buffers=2, first_ts=last_ts + 1000)
+
+
+def test_generated_files_match_golden(tmp_path, utc):
+    base = str(tmp_path)
+    indir = os.path.join(base, "Sept10")
+    outdir = os.path.join(base, "out")
+    make_input_dir(indir)
+    cache = sc.ScanCache(sc.get_cache_path(outdir, "Sept10"))
+    file_list = orss.get_and_sort_file_list(indir, cache)
+    sub_batches = orss.get_proc_folders(
+        outdir, orss.split_into_subbatches(file_list), "Sept10")
+    orss.build_batch_scripts(sub_batches, email="me@x.org")
+    sub_names = sorted(os.listdir(GOLDEN_DIR))
+    assert [folder[0] for _, _, _, _, folder in sub_batches] == sub_names
+    for sub_name in sub_names:
+        for name in GENERATED:
+            with open(os.path.join(outdir, sub_name, name), 'rb') as in_file:
+                generated = in_file.read()
+            with open(os.path.join(GOLDEN_DIR, sub_name, name), 'rb') as\
+                    in_file:
+                expected = in_file.read()
+            assert generated == expected.replace(b"<TMP>",
+                                                 base.encode("utf-8"))
@@ -0,0 +1,51 @@
+"""Checks the rate the token bucket of the I/O budget lets through"""
+import pytest
+import orsslib.io_budget as iob
+
+
+class FakeClock(object):
+    """A clock that only moves when told to"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(iob.time, "time", fake)
+    return fake
+
+
+def test_starts_empty(clock):
+    bucket = iob.TokenBucket(100.0)
+    assert bucket.take(50) == pytest.approx(0.5)
+
+
+def test_refills_up_to_one_second(clock):
+    bucket = iob.TokenBucket(100.0)
+    clock.now += 0.5
+    assert bucket.take(50) == 0.0
+    # ten idle seconds only fill the bucket to one second of tokens
+    clock.now += 10.0
+    assert bucket.take(100) == 0.0
+    assert bucket.take(100) == pytest.approx(1.0)
+
+
+def test_large_request_leaves_debt(clock):
+    bucket = iob.TokenBucket(100.0)
+    clock.now += 1.0
+    assert bucket.take(300) == pytest.approx(2.0)
+    clock.now += 2.0
+    assert bucket.take(100) == pytest.approx(1.0)
+
+
+def test_budget_counts_reads(clock):
+    budget = iob.IoBudget()
+    budget.acquire(4096)
+    budget.acquire(100)
+    assert budget.num_bytes == 4196
+    assert budget.num_reads == 2
+    assert budget.waited == 0.0
@@ -0,0 +1,122 @@
+"""Checks the run catalog parts and the queries on the catalog"""
+import os
+import gzip
+import datetime
+import orsslib.run_catalog as rc
+
+START = datetime.datetime(2017, 9, 1)
+
+
+def make_sub_batch(paths, minutes):
+    """Gives a sub batch tuple holding files that start at the given minutes
+    and each last ten minutes"""
+    files = []
+    for seq_num, (path, minute) in enumerate(zip(paths, minutes)):
+        begin = START + datetime.timedelta(minutes=minute)
+        files.append([path, begin, "Sept10", 3, seq_num,
+                      begin + datetime.timedelta(minutes=10), 0, 100])
+    return (files, ("NaI",), None, ("Pos1", (1.0, 2.0)),
+            ("Sept10", "Sept10_sub0"))
+
+
+def write_part(outdir, batch_name, part, paths, minutes):
+    """Writes a catalog part of a batch and gives its path"""
+    part_path = rc.get_part_path(outdir, batch_name, part)
+    rc.write_part(part_path, rc.build_columns(
+        [make_sub_batch(paths, minutes)]), batch_name)
+    return part_path
+
+
+def test_size_is_uncompressed(tmp_path):
+    raw_path = str(tmp_path / "run.dat.0000")
+    with open(raw_path, 'wb') as out_file:
+        out_file.write(b"\x01\x02" * 50000)
+    gz_path = str(tmp_path / "run.dat.0001.gz")
+    with gzip.open(gz_path, 'wb') as out_file:
+        out_file.write(b"\x01\x02" * 50000)
+    columns = rc.build_columns([make_sub_batch([raw_path, gz_path], [0, 10])])
+    assert list(columns["size"]) == [100000, 100000]
+
+
+def test_stale_parts_of_other_batches_are_kept(tmp_path):
+    outdir = str(tmp_path)
+    paths = [str(tmp_path / "run.dat.0000")]
+    with open(paths[0], 'wb') as out_file:
+        out_file.write(b"\x00" * 100)
+    # the single part of batch run.1 has the name of part 1 of batch run
+    other = write_part(outdir, "run.1", None, paths, [0])
+    mine = [write_part(outdir, "run", part, paths, [0]) for part in [0, 2]]
+    assert other == rc.get_part_path(outdir, "run", 1)
+    run_10 = write_part(outdir, "run10", None, paths, [0])
+    stale = write_part(outdir, "run", None, paths, [0])
+    rc.remove_stale_parts(outdir, "run", mine)
+    assert not os.path.exists(stale)
+    assert all([os.path.exists(path) for path in mine + [other, run_10]])
+    rc.remove_stale_parts(outdir, "run.1", [])
+    assert not os.path.exists(other)
+    assert all([os.path.exists(path) for path in mine + [run_10]])
+
+
+def make_catalog(tmp_path):
+    """Writes two batches and gives the loaded catalog, the files of the first
+    batch start at minutes 0, 10 and 30 and last ten minutes each, the second
+    batch has a long file from minute 5 to 45 and a file at minute 50"""
+    outdir = str(tmp_path)
+    paths = []
+    for ind in range(5):
+        paths.append(str(tmp_path / "run.dat.{0:04d}".format(ind)))
+        with open(paths[-1], 'wb') as out_file:
+            out_file.write(b"\x00" * 100)
+    write_part(outdir, "a", None, paths[:3], [0, 10, 30])
+    part_path = rc.get_part_path(outdir, "b", None)
+    columns = rc.build_columns([make_sub_batch(paths[3:], [5, 50])])
+    # the file starting at minute 5 runs until minute 45
+    columns["end"][0] = rc.to_datetime64(START + datetime.timedelta(
+        minutes=45))
+    rc.write_part(part_path, columns, "b")
+    return rc.load_catalog(outdir)
+
+
+def minutes(minute):
+    """Gives the time a number of minutes after the start"""
+    return START + datetime.timedelta(minutes=minute)
+
+
+def query_starts(catalog, start, end):
+    """Gives the start minutes of the files that overlap a range"""
+    rows = rc.query_time_range(catalog, minutes(start), minutes(end))
+    return [int((rc.to_datetime(catalog["start"][row]) -
+                 START).total_seconds()) // 60 for row in rows]
+
+
+def test_catalog_is_sorted_across_parts(tmp_path):
+    catalog = make_catalog(tmp_path)
+    assert query_starts(catalog, -100, 100) == [0, 5, 10, 30, 50]
+    assert [rc.to_datetime(end) for end in catalog["end_max"]] == [
+        minutes(10), minutes(45), minutes(45), minutes(45), minutes(60)]
+
+
+def test_time_ranges_are_half_open(tmp_path):
+    catalog = make_catalog(tmp_path)
+    # a file that ends when the range starts is left out
+    assert query_starts(catalog, 10, 11) == [5, 10]
+    assert query_starts(catalog, 39, 40) == [5, 30]
+    assert query_starts(catalog, 40, 45) == [5]
+    assert query_starts(catalog, 45, 50) == []
+    # a file that starts when the range ends is left out
+    assert query_starts(catalog, 20, 30) == [5]
+    assert query_starts(catalog, 49, 51) == [50]
+    # the long file is found though files that end earlier start after it
+    assert query_starts(catalog, 20, 21) == [5]
+    assert query_starts(catalog, 100, 200) == []
+    assert query_starts(catalog, -20, -10) == []
+
+
+def test_time_lookup(tmp_path):
+    catalog = make_catalog(tmp_path)
+    assert rc.query_time(catalog, minutes(-1)) is None
+    assert rc.query_time(catalog, minutes(0)) == 0
+    assert rc.query_time(catalog, minutes(7)) == 1
+    assert rc.query_time(catalog, minutes(25)) == 2
+    assert rc.query_time(catalog, minutes(30)) == 3
+    assert rc.query_time(catalog, minutes(1000)) == 4
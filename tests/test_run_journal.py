@@ -0,0 +1,102 @@
+"""Checks that a resumed run journal gives back the recorded steps, including
+when the last line of its log was cut short by an interrupted run"""
+import copy
+import datetime
+import orsslib.run_journal as rj
+import orsslib.setup_changes as setc
+
+START = datetime.datetime(2017, 9, 10, 12, 0, 0, 500000)
+
+
+def make_file_list(num_files=4):
+    """Gives a file list of contiguous ten minute files"""
+    file_list = []
+    for ind in range(num_files):
+        begin = START + datetime.timedelta(minutes=10 * ind)
+        file_list.append(["/data/Sept10/Sept10_0000.dat.{0:04d}".format(ind),
+                          (begin, "Sept10", 0, ind,
+                           begin + datetime.timedelta(minutes=10),
+                           1000 * ind, 1000 * ind + 999)])
+    return file_list
+
+
+def make_split(file_list):
+    """Splits the files into two sub batches with the default setup"""
+    setup = (setc.EXCEPTION_NAME[0], setc.EXCEPTION_DATA[0])
+    sub_batches = []
+    for files in [file_list[:2], file_list[2:]]:
+        fdats = [(fname,) + tuple(header) for fname, header in files]
+        sub_batches.append((fdats, setup, (fdats[0][1], fdats[-1][5]),
+                            ["Pos1", [142.0, 74.0]]))
+    return sub_batches
+
+
+def start_journal(tmp_path):
+    """Records the scan and split of a new run and gives the journal path and
+    the recorded file list and sub batches"""
+    journal_path = rj.get_journal_path(str(tmp_path), "Sept10")
+    journal = rj.RunJournal(journal_path)
+    file_list = make_file_list()
+    sub_batches = make_split(file_list)
+    journal.record_scan(file_list, {file_list[0][0]: [0]})
+    journal.record_split(sub_batches)
+    return journal, file_list, sub_batches
+
+
+def test_scan_and_split_are_replayed(tmp_path):
+    journal, file_list, sub_batches = start_journal(tmp_path)
+    resumed = rj.RunJournal(journal.journal_path, resume=True)
+    assert resumed.has_step("scan") and resumed.has_step("split")
+    scan, inferred = resumed.get_scan()
+    assert scan == [[fname, tuple(header)] for fname, header in file_list]
+    assert inferred == {file_list[0][0]: [0]}
+    split = resumed.get_split(scan)
+    assert [batch[0] for batch in split] == [batch[0] for batch in sub_batches]
+    assert [batch[1][0] for batch in split] == [setc.EXCEPTION_NAME[0]] * 2
+    assert [batch[2] for batch in split] == [batch[2] for batch in sub_batches]
+    assert split[1][3] == ["Pos1", [142.0, 74.0]]
+
+
+def test_new_run_clears_the_journal(tmp_path):
+    journal, _, _ = start_journal(tmp_path)
+    journal.record_written("/out/Sept10_0")
+    assert not rj.RunJournal(journal.journal_path).has_step("scan")
+    assert not rj.RunJournal(journal.journal_path, resume=True).has_step(
+        "scan")
+
+
+def test_truncated_last_record_is_dropped(tmp_path):
+    journal, _, sub_batches = start_journal(tmp_path)
+    setup = (sub_batches[0][1][0], copy.deepcopy(sub_batches[0][1][1]))
+    journal.record_review(0, setup, ["Pos1", [10.0, 20.0]])
+    journal.start_writing("me@x.org", {"stage_in": None})
+    journal.record_written("/out/Sept10_0")
+    # the run is cut off part way through writing the next record
+    with open(journal.log_path, 'a') as out_file:
+        out_file.write('["written", "/out/Sep')
+    resumed = rj.RunJournal(journal.journal_path, resume=True)
+    pos = ["Pos1", [142.0, 74.0]]
+    assert resumed.apply_review(0, copy.deepcopy(setup), pos)
+    assert pos[1] == [10.0, 20.0]
+    assert not resumed.apply_review(1, copy.deepcopy(setup), pos)
+    assert resumed.get_email() == "me@x.org"
+    assert resumed.steps["written"] == {"/out/Sept10_0": True}
+    # the cut short record is gone, so what the resumed run appends is read
+    # by the next resume
+    resumed.record_written("/out/Sept10_1", False)
+    again = rj.RunJournal(journal.journal_path, resume=True)
+    assert again.steps["written"] == {"/out/Sept10_0": True,
+                                      "/out/Sept10_1": False}
+    assert not again.was_changed("/out/Sept10_1")
+
+
+def test_new_write_options_write_batches_again(tmp_path):
+    journal, _, _ = start_journal(tmp_path)
+    journal.start_writing("me@x.org", {"stage_in": None})
+    journal.record_written("/out/Sept10_0")
+    resumed = rj.RunJournal(journal.journal_path, resume=True)
+    resumed.start_writing("me@x.org", {"stage_in": [4, 0, "/slots"]})
+    assert resumed.steps["written"] == {}
+    again = rj.RunJournal(journal.journal_path, resume=True)
+    assert again.steps["written"] == {}
+    assert again.steps["write_opts"] == {"stage_in": [4, 0, "/slots"]}
@@ -0,0 +1,90 @@
+"""Checks the split of the files into shards and that the fragments scanned by
+the local executor merge into the file list a direct scan gives"""
+import os
+import gzip
+import datetime
+import orchid_reader_simple_setup as orss
+import orsslib.scan_cache as sc
+import orsslib.sharded_scan as ss
+from orchid_files import write_data_file
+
+START = datetime.datetime(2017, 9, 10, 12, 0)
+
+
+def read_shards(shard_dir, num_shards):
+    """Gives the file lists of the shards"""
+    shards = []
+    for index in range(num_shards):
+        with open(ss.get_list_path(shard_dir, index), 'r') as in_file:
+            shards.append(in_file.read().split())
+    return shards
+
+
+def test_shards_split_the_files_evenly(tmp_path):
+    shard_dir = str(tmp_path / "shards")
+    fnames = ["/data/f{0:d}".format(ind) for ind in range(10)]
+    assert ss.write_shards(shard_dir, fnames, 3) == 3
+    shards = read_shards(shard_dir, 3)
+    assert [len(shard) for shard in shards] == [3, 3, 4]
+    assert sum(shards, []) == fnames
+    # an earlier scan's shards are removed
+    assert ss.write_shards(shard_dir, fnames[:2], 3) == 2
+    assert sorted(os.listdir(shard_dir)) == sorted(
+        [os.path.basename(ss.get_list_path(shard_dir, index))
+         for index in range(2)])
+
+
+def make_input_dir(indir):
+    """Writes data files, one of them compressed and one too short to read,
+    and gives the number of files with a header"""
+    os.makedirs(indir)
+    for ind in range(7):
+        write_data_file(os.path.join(indir, "Sept10_0000.dat.{0:04d}".format(
+            ind)), START + datetime.timedelta(minutes=ind), "Sept10", 0, ind)
+    with open(os.path.join(indir, "Sept10_0000.dat.0006"), 'rb') as in_file:
+        rawdata = in_file.read()
+    os.remove(os.path.join(indir, "Sept10_0000.dat.0006"))
+    with gzip.open(os.path.join(indir, "Sept10_0000.dat.0006.gz"),
+                   'wb') as out_file:
+        out_file.write(rawdata)
+    with open(os.path.join(indir, "Sept10_0000.dat.0007"), 'wb') as out_file:
+        out_file.write(b"\x00" * 10)
+    return 7
+
+
+class BreakingExecutor(ss.LocalExecutor):
+    """Runs the shards like LocalExecutor after removing the file list of the
+    second shard, so that its scan fails"""
+    def run(self, shard_dir, num_shards):
+        os.remove(ss.get_list_path(shard_dir, 1))
+        return ss.LocalExecutor.run(self, shard_dir, num_shards)
+
+
+def check_sharded_scan(tmp_path, executor, expected_read):
+    """Scans a synthetic directory in shards and compares the file list built
+    from the merged fragments with that of a direct scan"""
+    indir = str(tmp_path / "Sept10")
+    num_files = make_input_dir(indir)
+    cache = sc.ScanCache(str(tmp_path / "cache.json"))
+    shard_dir = str(tmp_path / "shards")
+    num_read = ss.scan_sharded(sorted(orss.get_data_files(indir)), cache,
+                               shard_dir, 3, executor)
+    assert num_read == expected_read
+    assert not os.path.exists(shard_dir)
+    # the seek index the shard built goes with the compressed file
+    assert cache.lookup(os.path.join(indir, "Sept10_0000.dat.0006.gz"),
+                        "seek_index") is not None
+    file_list = orss.get_and_sort_file_list(indir, cache)
+    assert len(file_list) == num_files
+    assert file_list == orss.get_and_sort_file_list(
+        indir, sc.ScanCache(str(tmp_path / "direct.json")))
+
+
+def test_fragments_merge_into_the_file_list(tmp_path):
+    check_sharded_scan(tmp_path, ss.LocalExecutor(2), 7)
+
+
+def test_files_of_failed_shards_are_read_here(tmp_path):
+    # the shards of the 8 files hold 2, 3 and 3 of them in name order, the
+    # short file is in the last shard
+    check_sharded_scan(tmp_path, BreakingExecutor(2), 4)
@@ -0,0 +1,65 @@
+"""Checks that the split sweep gives the same sub batches as splitting the
+file list for every setting of the thresholds"""
+import random
+import datetime
+import itertools
+import orchid_reader_simple_setup as orss
+import orsslib.split_sweep as ss
+import orsslib.sub_batch_handling as sb_hnd
+
+START = datetime.datetime(2017, 9, 1)
+
+
+def make_file_list(num_files=400):
+    """Gives a sorted file list with gaps of many lengths, misordered and
+    rolled over timestamps and runs that match setup and position patterns"""
+    rng = random.Random(3)
+    names = ["Sept10_0000.dat", "Sept28_0001.dat", "Sept29_0000.dat",
+             "Jan12_2017_pastRxWall_0000.dat", "Sept11_0002.dat"]
+    file_list = []
+    begin = START
+    last_ts = 0
+    for ind in range(num_files):
+        run_name = names[min(ind // 80, len(names) - 1)]
+        begin += datetime.timedelta(seconds=rng.choice([1, 5, 50, 200, 900,
+                                                        4000]))
+        end = begin + datetime.timedelta(seconds=rng.randint(60, 600))
+        kind = rng.random()
+        if kind < 0.05:
+            # a rollover of the timestamp clock
+            last_ts = sb_hnd.MAX_TS_THRESH + 10
+            first_ts = rng.randint(0, sb_hnd.MIN_TS_THRESH - 1)
+        elif kind < 0.15:
+            first_ts = max(last_ts - rng.choice([10, 10000, 10 ** 10]), 0)
+        else:
+            first_ts = last_ts + rng.randint(1, 10 ** 9)
+        last_ts = first_ts + rng.randint(1, 10 ** 11)
+        fname = "/data/{0:s}.{1:04d}".format(run_name, ind)
+        file_list.append([fname, (begin, run_name, ind // 80, ind % 80, end,
+                                  first_ts, last_ts)])
+        begin = end
+    return file_list
+
+
+def test_sweep_matches_split():
+    file_list = make_file_list()
+    fixed = ss.get_boundaries(orss.split_into_subbatches(
+        file_list, None, (float("inf"), float("inf"), None, None)))
+    assert len(fixed) > 0
+    sweep = ss.SplitSweep(file_list, fixed)
+    grid = itertools.product(
+        [0.0, 50.0, 300.0, 900.0, orss.BATCH_SPLIT_TIME_DIFF],
+        [0, 1000, sb_hnd.TS_MISORDER_THRESH],
+        [sb_hnd.MIN_TS_THRESH, 0],
+        [sb_hnd.MAX_TS_THRESH, 2 ** 62])
+    num_sizes = set()
+    for thresholds in grid:
+        expected = ss.get_boundaries(orss.split_into_subbatches(
+            file_list, None, thresholds))
+        bounds = sweep.evaluate(*thresholds)
+        assert bounds == expected, thresholds
+        sizes = sweep.get_batch_sizes(bounds)
+        assert sum([size[0] for size in sizes]) == len(file_list)
+        num_sizes.add(len(sizes))
+    # the grid has to give different splits for the check to mean much
+    assert len(num_sizes) > 3